@@ -0,0 +1,240 @@
+"""
+Database micro-benchmark and query-count regression check.
+
+Runs every helper in utils.database against a temporary SQLite file seeded
+to a realistic size, counting the SQL statements and commits each call
+issues. Any helper that goes over its budget in QUERY_BUDGETS makes the run
+exit non-zero, so nested sessions or N+1 patterns fail loudly.
+
+Usage (from the repository root):
+    python -m benchmarks.db_benchmark [--users 5000] [--iterations 200] [--database-url URL]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import config
+
+# (max SQL statements, max commits) a single call to each helper may issue.
+QUERY_BUDGETS = {
+    'increment_message_count': (1, 1),
+    'increment_message_counts (10 users)': (10, 1),
+    'get_window_counts (7 days)': (1, 1),
+    'get_or_create_tomato_stats': (1, 1),
+    'get_or_create_tomato_stats (new user)': (2, 1),
+    'increment_tomato_stat': (1, 1),
+    'process_daily_claim': (2, 1),
+    'claim_starter_tomatoes': (2, 1),
+    'get_leaderboard': (1, 1),
+    'get_inventory': (1, 1),
+    'get_item_from_inventory': (1, 1),
+    'add_to_inventory': (1, 1),
+    'remove_from_inventory': (2, 1),
+    'add_channel_warning': (1, 1),
+    'add_to_graduation_queue': (2, 1),
+    'get_and_clear_graduation_queue': (2, 1),
+    'lootbox transaction': (2, 1),
+    'tomato throw transaction': (3, 1),
+    'tomato hit transaction': (2, 1),
+    'get_activity_milestone': (1, 1),
+    'flush_activity_milestones (10 users)': (20, 1),
+    'resolve_pending_throws (10 throws)': (21, 1),
+}
+
+ITEM_NAMES = ['Regular Tomato', 'Rotten Tomato', 'Golden Tomato']
+
+
+class QueryCounter:
+    """Counts statements and commits issued through an engine."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.queries = 0
+        self.commits = 0
+        event.listen(engine, 'before_cursor_execute', self._on_execute)
+        event.listen(engine, 'commit', self._on_commit)
+
+    def _on_execute(self, *args, **kwargs):
+        self.queries += 1
+
+    def _on_commit(self, *args, **kwargs):
+        self.commits += 1
+
+    def reset(self):
+        self.queries = 0
+        self.commits = 0
+
+
+def seed(db, users: int):
+    """Fill the tables to a realistic size with bulk inserts."""
+    rng = random.Random(0)
+    with db.engine.begin() as conn:
+        conn.execute(db.Activity.__table__.insert(), [
+            {'user_id': uid, 'message_count': rng.randint(0, 500)} for uid in range(1, users + 1)
+        ])
+        today = db.activity_day()
+        conn.execute(db.ActivityDay.__table__.insert(), [
+            {'user_id': uid, 'day': today - age, 'message_count': rng.randint(1, 50)}
+            for uid in range(1, users + 1) for age in range(0, 30, 3)
+        ])
+        conn.execute(db.TomatoStats.__table__.insert(), [
+            {
+                'user_id': uid,
+                'tomatoes_thrown': rng.randint(0, 200),
+                'tomatoes_landed': rng.randint(0, 100),
+                'tomatoes_dodged': rng.randint(0, 100),
+                'times_hit': rng.randint(0, 100),
+                'claimed_starter': False,
+                'coins': rng.randint(0, 1000),
+                'message_count': rng.randint(0, 500),
+            }
+            for uid in range(1, users + 1)
+        ])
+        conn.execute(db.TomatoInventory.__table__.insert(), [
+            {'user_id': uid, 'item_id': db.item_catalog.id_for(name), 'quantity': 1000}
+            for uid in range(1, users + 1) for name in ITEM_NAMES
+        ])
+        conn.execute(db.Warning.__table__.insert(), [
+            {
+                'guild_id': 1,
+                'moderator_id': 1,
+                'channel_id': rng.randint(1, 200),
+                'reason': 'seed',
+                'warning_type': rng.choice(['yellow', 'red']),
+            }
+            for _ in range(users)
+        ])
+
+
+def build_operations(db, users: int, counter):
+    """
+    Return (name, callable) pairs; each callable takes the iteration index.
+    Operations that need setup reset the counter themselves once it is done.
+    """
+    new_user_base = users + 1
+
+    def lootbox(i):
+        with db.tomato_transaction() as tx:
+            if tx.spend_coins(i + 1, 1):
+                tx.give_item(i + 1, 'Golden Tomato')
+
+    def throw(i):
+        with db.tomato_transaction() as tx:
+            if tx.take_item(i + 1, 'Rotten Tomato'):
+                tx.add_stats(i + 1, tomatoes_thrown=1)
+
+    def hit(i):
+        with db.tomato_transaction() as tx:
+            tx.add_stats(i + 1, tomatoes_landed=1, coins=25)
+            tx.add_stats(users - i, times_hit=1)
+
+    def flush_messages(i):
+        batch = range(i * 10 % users + 1, i * 10 % users + 11)
+        db.increment_message_counts({uid: 3 for uid in batch})
+
+    def flush_activity(i):
+        batch = range(i * 10 % users + 1, i * 10 % users + 11)
+        db.flush_activity_milestones({uid: 3 for uid in batch}, {uid: 100 for uid in batch})
+
+    def resolve_throws(i):
+        with db.tomato_transaction() as tx:
+            throws = [
+                tx.add_pending_throw(uid, users - uid + 1, 'Regular Tomato', 1, datetime.utcnow())
+                for uid in range(i * 10 % users + 1, i * 10 % users + 11)
+            ]
+        counter.reset()
+        db.resolve_pending_throws(
+            [throw.id for throw in throws],
+            {uid: {'tomatoes_landed': 1, 'times_hit': 1} for throw in throws for uid in (throw.thrower_id, throw.target_id)},
+        )
+
+    return [
+        ('increment_message_count', lambda i: db.increment_message_count(i + 1)),
+        ('increment_message_counts (10 users)', flush_messages),
+        ('get_window_counts (7 days)', lambda i: db.get_window_counts(7)),
+        ('get_or_create_tomato_stats', lambda i: db.get_or_create_tomato_stats(i + 1)),
+        ('get_or_create_tomato_stats (new user)', lambda i: db.get_or_create_tomato_stats(new_user_base + i)),
+        ('increment_tomato_stat', lambda i: db.increment_tomato_stat(i + 1, 'coins', 1)),
+        ('process_daily_claim', lambda i: db.process_daily_claim(i + 1)),
+        ('claim_starter_tomatoes', lambda i: db.claim_starter_tomatoes(i + 1)),
+        ('get_leaderboard', lambda i: db.get_leaderboard('tomatoes_thrown', limit=10)),
+        ('get_inventory', lambda i: db.get_inventory(i + 1)),
+        ('get_item_from_inventory', lambda i: db.get_item_from_inventory(i + 1, 'Rotten Tomato')),
+        ('add_to_inventory', lambda i: db.add_to_inventory(i + 1, 'Golden Tomato')),
+        ('remove_from_inventory', lambda i: db.remove_from_inventory(i + 1, 'Regular Tomato')),
+        ('add_channel_warning', lambda i: db.add_channel_warning(i % 200, 1, 1, 'bench', 'yellow')),
+        ('add_to_graduation_queue', lambda i: db.add_to_graduation_queue(i + 1)),
+        ('get_and_clear_graduation_queue', lambda i: db.get_and_clear_graduation_queue()),
+        ('lootbox transaction', lootbox),
+        ('tomato throw transaction', throw),
+        ('tomato hit transaction', hit),
+        ('get_activity_milestone', lambda i: db.get_activity_milestone(i + 1)),
+        ('flush_activity_milestones (10 users)', flush_activity),
+        ('resolve_pending_throws (10 throws)', resolve_throws),
+    ]
+
+
+def run(users: int, iterations: int, database_url: str) -> int:
+    # Point the database module at the scratch database before it is imported.
+    config.DATABASE_URL = database_url
+    from utils import database as db
+
+    db.init_database()
+    db.item_catalog.load()
+    seed(db, users)
+    counter = QueryCounter(db.engine)
+    failures = []
+
+    print(f'{"operation":<40} {"queries":>7} {"budget":>6} {"commits":>7} {"mean ms":>8} {"p95 ms":>8}')
+    for name, operation in build_operations(db, users, counter):
+        max_queries = max_commits = 0
+        timings = []
+        for i in range(min(iterations, users)):
+            counter.reset()
+            start = time.perf_counter()
+            operation(i)
+            timings.append((time.perf_counter() - start) * 1000)
+            max_queries = max(max_queries, counter.queries)
+            max_commits = max(max_commits, counter.commits)
+
+        budget, commit_budget = QUERY_BUDGETS[name]
+        p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+        print(f'{name:<40} {max_queries:>7} {budget:>6} {max_commits:>7} {statistics.mean(timings):>8.3f} {p95:>8.3f}')
+
+        if max_queries > budget:
+            failures.append(f'{name}: {max_queries} queries (budget {budget})')
+        if max_commits > commit_budget:
+            failures.append(f'{name}: {max_commits} commits (budget {commit_budget})')
+
+    db.engine.dispose()
+    if failures:
+        print('\nQuery budget exceeded:', file=sys.stderr)
+        for failure in failures:
+            print(f'  - {failure}', file=sys.stderr)
+        return 1
+    print('\nAll operations within budget.')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--users', type=int, default=5000, help='Number of seeded users.')
+    parser.add_argument('--iterations', type=int, default=200, help='Calls per operation.')
+    parser.add_argument('--database-url', help='Run against an empty scratch database (e.g. a local Postgres) '
+                                               'instead of a temporary SQLite file.')
+    args = parser.parse_args()
+
+    if args.database_url:
+        sys.exit(run(args.users, args.iterations, args.database_url))
+    with tempfile.TemporaryDirectory() as tmp:
+        sys.exit(run(args.users, args.iterations, f'sqlite:///{os.path.join(tmp, "bench.db")}'))
+
+
+if __name__ == '__main__':
+    main()
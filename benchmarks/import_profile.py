@@ -0,0 +1,58 @@
+"""
+Import-time profile of the bot's startup path.
+
+Runs `python -X importtime -c "import <module>"` in a fresh interpreter and
+reports the total import time plus the slowest packages, so heavy imports that
+creep back onto the path to gateway connect are easy to spot.
+
+Usage (from the repository root):
+    python -m benchmarks.import_profile [--module bot] [--top 15]
+"""
+import argparse
+import subprocess
+import sys
+
+
+def profile(module: str):
+    """Return [(name, self_us, cumulative_us)] for every import made by module."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f'Importing {module} failed:\n{result.stderr}')
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line.split(':', 1)[1].split('|')
+        entries.append((name.strip(), int(self_us), int(cumulative_us)))
+    return entries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='bot', help='Module to import.')
+    parser.add_argument('--top', type=int, default=15, help='Number of packages to list.')
+    args = parser.parse_args()
+
+    entries = profile(args.module)
+    total = next((cumulative for name, _, cumulative in entries if name == args.module), 0)
+    print(f'Importing {args.module} took {total / 1000:.1f} ms ({len(entries)} modules)\n')
+
+    # Top-level packages imported on the way, by cumulative time
+    packages = {}
+    for name, _, cumulative in entries:
+        root = name.split('.')[0]
+        if root != args.module and cumulative > packages.get(root, 0):
+            packages[root] = cumulative
+
+    print(f'{"package":<30} {"cumulative ms":>14}')
+    for name, cumulative in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]:
+        print(f'{name:<30} {cumulative / 1000:>14.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""
+Simulates the per-shard scheduling of periodic tasks against a fake gateway.
+
+Builds an AutoShardedClient whose shards and guilds are in-memory fakes (no
+connection to Discord), runs utils.shards.staggered_guilds over it, and reports
+when each shard's work started plus the shard health shown by /about and
+/api/status. Exits non-zero if a disconnected shard was processed or the shards
+were not staggered.
+
+Usage (from the repository root):
+    python -m benchmarks.shard_schedule [--shards 4] [--guilds 200] [--spread 2] [--down 1]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+from types import SimpleNamespace
+
+import discord
+
+from utils.shards import shard_health, staggered_guilds
+
+
+class FakeGatewayBot(discord.AutoShardedClient):
+    """An AutoShardedClient with canned shards and guilds instead of gateway connections."""
+
+    def __init__(self, shard_count: int, guild_count: int, down: set):
+        super().__init__(intents=discord.Intents.none(), shard_count=shard_count)
+        self._fake_shards = {
+            shard_id: SimpleNamespace(
+                id=shard_id,
+                latency=random.uniform(0.03, 0.2),
+                is_closed=lambda closed=shard_id in down: closed,
+                is_ws_ratelimited=lambda: False,
+            )
+            for shard_id in range(shard_count)
+        }
+        self._fake_guilds = []
+        for index in range(guild_count):
+            guild_id = random.getrandbits(63)
+            self._fake_guilds.append(SimpleNamespace(
+                id=guild_id, name=f'guild-{index}', shard_id=(guild_id >> 22) % shard_count,
+            ))
+
+    @property
+    def shards(self):
+        return self._fake_shards
+
+    def get_shard(self, shard_id):
+        return self._fake_shards.get(shard_id)
+
+    @property
+    def guilds(self):
+        return self._fake_guilds
+
+    @property
+    def latency(self):
+        return sum(shard.latency for shard in self._fake_shards.values()) / len(self._fake_shards)
+
+
+async def simulate(shards: int, guilds: int, spread: float, down: set) -> bool:
+    bot = FakeGatewayBot(shards, guilds, down)
+    start = time.perf_counter()
+    started, processed = {}, {}
+    async for guild in staggered_guilds(bot, spread):
+        started.setdefault(guild.shard_id, time.perf_counter() - start)
+        processed[guild.shard_id] = processed.get(guild.shard_id, 0) + 1
+
+    print(f'{"shard":>5} {"latency ms":>11} {"connected":>10} {"guilds":>7} {"processed":>10} {"started s":>10}')
+    for shard in shard_health(bot):
+        started_at = started.get(shard['id'])
+        started_at = '-' if started_at is None else f'{started_at:.2f}'
+        print(f'{shard["id"]:>5} {shard["latency_ms"]:>11} {str(shard["connected"]):>10} {shard["guilds"]:>7} '
+              f'{processed.get(shard["id"], 0):>10} {started_at:>10}')
+
+    ok = True
+    if down & set(processed):
+        print('\nFAIL: disconnected shards were processed.')
+        ok = False
+    gap = spread / shards
+    times = [started[shard_id] for shard_id in sorted(started)]
+    if any(later - earlier < gap * 0.9 for earlier, later in zip(times, times[1:])):
+        print(f'\nFAIL: shards started less than {gap:.2f}s apart.')
+        ok = False
+    if ok:
+        print(f'\nShards were processed {gap:.2f}s apart; disconnected shards were skipped.')
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--shards', type=int, default=4, help='Number of fake shards.')
+    parser.add_argument('--guilds', type=int, default=200, help='Number of fake guilds.')
+    parser.add_argument('--spread', type=float, default=2.0, help='Seconds to spread one run over.')
+    parser.add_argument('--down', type=int, nargs='*', default=[1], help='Shard IDs to report as disconnected.')
+    args = parser.parse_args()
+
+    if not asyncio.run(simulate(args.shards, args.guilds, args.spread, set(args.down))):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,52 +1,68 @@
 import asyncio
+import contextlib
+import hashlib
+import json
 import logging
-import logging.handlers
 import os
+import signal
 import sys
+import time
 from pathlib import Path
 
 import discord
+from discord import app_commands
 from discord.ext import commands
-import uvicorn
 
-from config import BOT_TOKEN, BOT_PREFIX, BOT_OWNER_IDS, LOG_LEVEL, LOG_FILE, MODULES
-from dashboard import api as dashboard_api
-from utils.sheets_client import init_gsheet_client
+from config import (
+    BOT_TOKEN, BOT_PREFIX, BOT_OWNER_IDS, GUILD_ID, LOG_LEVEL, LOG_FILE, LOG_FORMAT, LOG_SAMPLING, MODULES,
+    COMMAND_SYNC_SCOPE, COMMAND_TREE_HASH_FILE, DASHBOARD_ENABLED, DASHBOARD_HOST, DASHBOARD_PORT,
+    DASHBOARD_MODE, BOT_SHARDING, BOT_SHARD_COUNT, INTENTS_PRESENCES, MEMBER_CHUNK_AT_STARTUP,
+    MESSAGE_CACHE_SIZE, SHUTDOWN_DRAIN_SECONDS
+)
 from utils.config_validator import validate_config
+from utils.lifecycle import Lifecycle
+from utils.tracing import command_stats, instrument_http
+from utils.log import setup_logging
 
-# Set up logging
+# Set up logging; records are written by a background thread via a queue
 os.makedirs('data', exist_ok=True)
+log_listener = setup_logging(LOG_LEVEL, LOG_FILE, LOG_FORMAT, LOG_SAMPLING)
 logger = logging.getLogger('discord')
-logger.setLevel(getattr(logging, LOG_LEVEL))
-
-# File handler
-file_handler = logging.handlers.RotatingFileHandler(
-    filename=LOG_FILE,
-    encoding='utf-8',
-    maxBytes=32 * 1024 * 1024,  # 32 MiB
-    backupCount=5,
-)
-dtf = '%Y-%m-%d %H:%M:%S'
-formatter = logging.Formatter('[{asctime}] [{levelname:<8}] {name}: {message}', dtf, style='{')
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
-
-# Console handler
-console_handler = logging.StreamHandler(sys.stdout)
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
 
 # Initialize bot with intents
 intents = discord.Intents.default()
 intents.members = True
 intents.message_content = True
-intents.presences = True
+intents.presences = INTENTS_PRESENCES
+
+# One gateway connection per shard when sharding is enabled
+_BotBase = commands.AutoShardedBot if BOT_SHARDING else commands.Bot
+
+class WLMCommandTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.type is not discord.InteractionType.application_command:
+            return True  # Autocomplete
+        if interaction.client.lifecycle.stopping:
+            await interaction.response.send_message('The bot is restarting; please try again in a moment.', ephemeral=True)
+            return False
+        command_stats.start(interaction)
+        return True
 
-class WLMBot(commands.Bot):
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        command_stats.finish(interaction, failed=True)
+        await super().on_error(interaction, error)
+
+class WLMBot(_BotBase):
     def __init__(self, missing_config: list):
+        shard_options = {'shard_count': BOT_SHARD_COUNT} if BOT_SHARDING else {}
         super().__init__(
+            **shard_options,
             command_prefix=BOT_PREFIX,
             intents=intents,
+            tree_cls=WLMCommandTree,
+            member_cache_flags=discord.MemberCacheFlags.from_intents(intents),
+            chunk_guilds_at_startup=MEMBER_CHUNK_AT_STARTUP,
+            max_messages=MESSAGE_CACHE_SIZE,
             owner_ids=set(BOT_OWNER_IDS),
             case_insensitive=True,
             allowed_mentions=discord.AllowedMentions(
@@ -57,22 +73,107 @@ class WLMBot(commands.Bot):
         self.initial_extensions = MODULES
         self.synced = False
         self.missing_config = missing_config
+        self.state_publisher = None
+        self.web_server = None
+        self.lifecycle = Lifecycle()
+        self.shutdown_task = None
+        instrument_http(self.http)
 
     async def setup_hook(self):
         """Load all modules on startup."""
+        timings = {}
+        start = time.perf_counter()
+        # Imported here so SQLAlchemy is only loaded once the bot is actually starting
+        from utils.database import init_database, guild_settings
+        await asyncio.to_thread(init_database)
+        await asyncio.to_thread(guild_settings.load)
+        timings['database'] = time.perf_counter() - start
+
+        if DASHBOARD_ENABLED and DASHBOARD_MODE == 'separate':
+            # The dashboard runs in its own process and reads state from the database
+            from dashboard.state import StatePublisher
+            self.state_publisher = StatePublisher(self)
+            self.state_publisher.start()
+
         if self.missing_config:
             self.logger.warning("Skipping module loading due to missing configuration.")
             return
 
-        for extension in self.initial_extensions:
-            try:
-                await self.load_extension(extension)
-                self.logger.info(f'Successfully loaded extension {extension}')
-            except Exception as e:
-                self.logger.error(f'Failed to load extension {extension}: {e}')
-        
-        await self.tree.sync()
-        self.logger.info('Synced application commands')
+        start = time.perf_counter()
+        extension_timings = await asyncio.gather(*(self._load_timed(ext) for ext in self.initial_extensions))
+        timings['extensions'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        synced = await self.sync_commands()
+        timings['command sync' if synced else 'command sync (skipped)'] = time.perf_counter() - start
+
+        breakdown = ', '.join(f'{name} {seconds:.2f}s' for name, seconds in timings.items())
+        per_extension = ', '.join(f'{ext.rsplit(".", 1)[-1]} {seconds:.2f}s' for ext, seconds in extension_timings)
+        self.logger.info(f'Startup timings: {breakdown} [{per_extension}]')
+
+    async def _load_timed(self, extension: str):
+        start = time.perf_counter()
+        try:
+            await self.load_extension(extension)
+            self.logger.info(f'Successfully loaded extension {extension}')
+        except Exception as e:
+            self.logger.error(f'Failed to load extension {extension}: {e}')
+        return extension, time.perf_counter() - start
+
+    @staticmethod
+    def _sync_scope(guild) -> str:
+        return f'guild:{guild.id}' if guild else 'global'
+
+    def _command_tree_hash(self, guild) -> str:
+        """Hash the command payloads that a sync would upload."""
+        payload = [command.to_dict(self.tree) for command in self.tree.get_commands(guild=guild)]
+        payload.sort(key=lambda command: (command.get('type', 1), command['name']))
+        blob = json.dumps({'scope': self._sync_scope(guild), 'commands': payload}, sort_keys=True, default=str)
+        return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+    async def _clear_synced_commands(self, scope: str):
+        """Remove the commands registered with Discord under a scope this bot no longer syncs to."""
+        guild = None if scope == 'global' else discord.Object(id=int(scope.split(':', 1)[1]))
+        commands = self.tree.get_commands(guild=guild)
+        self.tree.clear_commands(guild=guild)
+        try:
+            await self.tree.sync(guild=guild)
+        finally:
+            for command in commands:
+                self.tree.add_command(command, guild=guild)
+        self.logger.info(f'Cleared application commands previously synced to {scope}')
+
+    async def sync_commands(self, force: bool = False) -> bool:
+        """Sync application commands if they changed since the last sync. Returns True if a sync ran."""
+        guild = None
+        if COMMAND_SYNC_SCOPE == 'guild':
+            guild = discord.Object(id=GUILD_ID)
+            self.tree.copy_global_to(guild=guild)
+
+        # The file holds the scope of the last sync on its first line and the tree hash on its second
+        scope = self._sync_scope(guild)
+        tree_hash = self._command_tree_hash(guild)
+        last_scope = last_hash = None
+        if os.path.exists(COMMAND_TREE_HASH_FILE):
+            with open(COMMAND_TREE_HASH_FILE, encoding='utf-8') as f:
+                lines = f.read().split()
+            if len(lines) == 2:
+                last_scope, last_hash = lines
+        if not force and (last_scope, last_hash) == (scope, tree_hash):
+            self.logger.info('Application commands unchanged, skipping sync')
+            return False
+
+        # Commands left under the previous scope would show up twice; before the scope
+        # was recorded, syncs were global
+        stale_scope = last_scope or ('global' if guild else None)
+        if stale_scope and stale_scope != scope:
+            await self._clear_synced_commands(stale_scope)
+
+        await self.tree.sync(guild=guild)
+        with open(COMMAND_TREE_HASH_FILE, 'w', encoding='utf-8') as f:
+            f.write(f'{scope}\n{tree_hash}\n')
+        self.logger.info(f'Synced application commands ({COMMAND_SYNC_SCOPE})')
+        return True
 
     async def on_ready(self):
         """Called when the bot is ready."""
@@ -84,46 +185,119 @@ class WLMBot(commands.Bot):
         )
         await self.change_presence(activity=activity)
 
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        command_stats.finish(interaction)
+
     async def on_disconnect(self):
         logger.info("Bot disconnected. Attempting to reconnect...")
 
+    async def process_commands(self, message: discord.Message):
+        # Prefix commands are ignored once shutdown has started
+        if not self.lifecycle.stopping:
+            await super().process_commands(message)
+
+    def request_shutdown(self):
+        """Starts shutdown once; safe to call from a signal handler."""
+        if self.shutdown_task is None:
+            self.shutdown_task = asyncio.create_task(self.shutdown())
+
+    async def shutdown(self):
+        """
+        Stops in order: refuse new commands and web requests, let running background
+        work finish (up to SHUTDOWN_DRAIN_SECONDS), unload modules so they flush their
+        buffers, then disconnect from Discord. The database engine is disposed by main().
+        """
+        if self.lifecycle.stopping:
+            return
+        self.logger.info('Shutting down: waiting for background work to finish...')
+        if self.web_server:
+            self.web_server.should_exit = True  # Finishes in-flight requests, accepts no new ones
+        await self.lifecycle.drain(SHUTDOWN_DRAIN_SECONDS)
+
+        # Unload in reverse of the configured order (loading is concurrent, so load order isn't
+        # fixed) so modules others depend on go last; extensions loaded at runtime go first
+        runtime = [ext for ext in self.extensions if ext not in self.initial_extensions]
+        configured = [ext for ext in reversed(self.initial_extensions) if ext in self.extensions]
+        for extension in runtime + configured:
+            try:
+                await self.unload_extension(extension)
+            except Exception as e:
+                self.logger.error(f'Failed to unload extension {extension} during shutdown: {e}', exc_info=True)
+        await self.close()
+
+    async def close(self):
+        if self.state_publisher:
+            self.state_publisher.stop()
+        await super().close()
+
     async def on_resumed(self):
         logger.info("Bot has reconnected and resumed session.")
 
+    async def on_shard_ready(self, shard_id: int):
+        logger.info(f"Shard {shard_id} is ready.")
+
+    async def on_shard_disconnect(self, shard_id: int):
+        logger.warning(f"Shard {shard_id} disconnected.")
+
 async def run_web_server(bot_instance):
     """Runs the FastAPI web server as a background task."""
     try:
+        # FastAPI and uvicorn are slow to import; do it off the event loop so the
+        # gateway connection is not held up
+        dashboard_api, uvicorn = await asyncio.to_thread(_import_web_server)
         dashboard_api.setup_api(bot_instance)
-        config = uvicorn.Config(dashboard_api.app, host="0.0.0.0", port=8080, log_level="info")
+        config = uvicorn.Config(dashboard_api.app, host=DASHBOARD_HOST, port=DASHBOARD_PORT, log_level="info")
         server = uvicorn.Server(config)
+        # Signals are handled by main(); the bot stops the server as part of its shutdown
+        server.capture_signals = contextlib.nullcontext
+        bot_instance.web_server = server
         await server.serve()
     except asyncio.CancelledError:
         logger.info("Web server task cancelled.")
     except Exception as e:
         logger.error(f"Web server crashed: {e}", exc_info=True)
 
+def _import_web_server():
+    import uvicorn
+    from dashboard import api as dashboard_api
+    return dashboard_api, uvicorn
+
 async def main():
     """Main entry point for the bot."""
     missing_keys = validate_config()
     bot = WLMBot(missing_config=missing_keys)
-    
-    web_server_task = asyncio.create_task(run_web_server(bot))
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(sig, bot.request_shutdown)
+        except NotImplementedError:
+            pass  # Windows: Ctrl+C still raises KeyboardInterrupt
+
+    serve_dashboard = DASHBOARD_ENABLED and DASHBOARD_MODE == 'embedded'
+    tasks = []
+    if serve_dashboard:
+        tasks.append(asyncio.create_task(run_web_server(bot)))
 
     if 'DISCORD_BOT_TOKEN (in .env file)' in missing_keys:
         logger.error("Discord bot token is missing. The bot will not start.")
         if len(missing_keys) > 1:
             other_keys = ", ".join([k for k in missing_keys if k != 'DISCORD_BOT_TOKEN (in .env file)'])
             logger.error(f"Other missing config: {other_keys}")
-        await web_server_task
     else:
-        logger.info("Starting bot and web server.")
-        await asyncio.gather(
-            web_server_task,
-            bot.start(BOT_TOKEN)
-        )
+        logger.info("Starting bot and web server." if serve_dashboard else "Starting bot.")
+        tasks.append(bot.start(BOT_TOKEN))
+
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        # Close the database last, once nothing can write to it any more
+        database = sys.modules.get('utils.database')
+        if database is not None:
+            database.engine.dispose()
+        logger.info('Shutdown complete.')
 
 if __name__ == '__main__':
-    init_gsheet_client()
     try:
         asyncio.run(main())
     except KeyboardInterrupt:
@@ -131,3 +305,5 @@ if __name__ == '__main__':
     except Exception as e:
         logger.critical(f'Fatal error: {e}', exc_info=True)
         sys.exit(1)
+    finally:
+        log_listener.stop()
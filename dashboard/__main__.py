@@ -0,0 +1,27 @@
+"""
+Runs the dashboard API in its own process (DASHBOARD_MODE = 'separate').
+
+The bot publishes its state to the database and picks up commands from it, so
+this process never touches the Discord gateway and can be restarted or scaled
+with several workers independently of the bot.
+
+Usage (from the repository root):
+    python -m dashboard
+"""
+import logging
+
+import uvicorn
+
+from config import DASHBOARD_HOST, DASHBOARD_PORT, DASHBOARD_WORKERS
+from utils.database import init_database
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    init_database()
+    uvicorn.run("dashboard.api:app", host=DASHBOARD_HOST, port=DASHBOARD_PORT,
+                workers=DASHBOARD_WORKERS, log_level="info")
+
+
+if __name__ == '__main__':
+    main()
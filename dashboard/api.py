@@ -1,11 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import secrets
+from datetime import datetime, timedelta
+
+from fastapi import Depends, FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from pydantic import BaseModel, ConfigDict, Field
 import discord
-from typing import List, Optional
+from typing import Annotated, List, Optional
 
 import config
+from dashboard import state
+from utils.database import get_shared_state, add_to_graduation_queue, guild_settings, GUILD_SETTING_FIELDS
 
-# This will be set by the bot process on startup
+# This will be set by the bot process on startup. It stays None when the
+# dashboard runs in its own process, and data comes from shared state instead.
 bot_instance: Optional[discord.Client] = None
 
 app = FastAPI()
@@ -24,42 +32,93 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Dependency to get the bot instance
-def get_bot() -> discord.Client:
-    if bot_instance is None:
+Snowflake = Annotated[int, Field(gt=0)]
+
+class GuildSettingsUpdate(BaseModel):
+    """A partial update of a guild's settings. null clears a setting back to its default."""
+    model_config = ConfigDict(extra='forbid')
+
+    mod_log_channel: Optional[Snowflake] = None
+    welcome_channel: Optional[Snowflake] = None
+    welcome_message: Optional[Annotated[str, Field(max_length=2000)]] = None
+    mod_role: Optional[Snowflake] = None
+    admin_role: Optional[Snowflake] = None
+    waiting_room_channel: Optional[Snowflake] = None
+    unapproved_role: Optional[Snowflake] = None
+    member_role: Optional[Snowflake] = None
+    new_in_town_role: Optional[Snowflake] = None
+    welcome_wagon_role: Optional[Snowflake] = None
+    graduation_threshold: Optional[Annotated[int, Field(ge=1)]] = None
+    graduation_report_channel: Optional[Snowflake] = None
+    flag_moderator_roles: Optional[List[Snowflake]] = None
+    flag_notify_users: Optional[List[Snowflake]] = None
+
+if set(GuildSettingsUpdate.model_fields) != set(GUILD_SETTING_FIELDS):
+    raise RuntimeError('GuildSettingsUpdate is out of date with GUILD_SETTING_FIELDS.')
+
+_LOOPBACK_HOSTS = {'127.0.0.1', '::1'}
+
+async def require_admin(request: Request, authorization: Optional[str] = Header(default=None)):
+    """
+    Guards endpoints that change how the bot behaves. With DASHBOARD_API_TOKEN set the
+    request needs 'Authorization: Bearer <token>'; without one, only local requests are allowed.
+    """
+    if config.DASHBOARD_API_TOKEN:
+        expected = f'Bearer {config.DASHBOARD_API_TOKEN}'.encode()
+        if not secrets.compare_digest((authorization or '').encode(), expected):
+            raise HTTPException(status_code=401, detail="Missing or invalid API token.", headers={"WWW-Authenticate": "Bearer"})
+    elif request.client is None or request.client.host not in _LOOPBACK_HOSTS:
+        raise HTTPException(status_code=403, detail="Set DASHBOARD_API_TOKEN to change settings from another host.")
+
+def _read_shared(key: str):
+    """Reads a snapshot published by the bot process."""
+    value, updated_at = get_shared_state(key)
+    if value is None:
         raise HTTPException(status_code=503, detail="Bot is not ready yet.")
-    return bot_instance
+    return value, updated_at
 
 @app.get("/api/status")
-async def get_status(bot: discord.Client = Depends(get_bot)):
-    return {
-        "logged_in": bot.is_ready(),
-        "missing_config": getattr(bot, 'missing_config', []),
-    }
+async def get_status():
+    if bot_instance is not None:
+        return state.build_status(bot_instance)
+
+    status, updated_at = _read_shared(state.STATUS_KEY)
+    # A snapshot that stopped updating means the bot process is down
+    if datetime.utcnow() - updated_at > timedelta(seconds=config.DASHBOARD_STATE_INTERVAL * 3):
+        status["logged_in"] = False
+    return {**status, "updated_at": updated_at.isoformat()}
 
 @app.get("/api/welcome-wagon/new-members")
-async def get_new_members(bot: discord.Client = Depends(get_bot)):
-    guild = bot.get_guild(config.GUILD_ID)
-    if not guild:
-        raise HTTPException(status_code=404, detail="Guild not found.")
-
-    new_in_town_role = guild.get_role(config.WELCOME_NEW_IN_TOWN_ROLE_ID)
-    if not new_in_town_role:
-        raise HTTPException(status_code=404, detail="'New In Town' role not found.")
-
-    new_members = []
-    for member in new_in_town_role.members:
-        new_members.append({
-            "id": member.id,
-            "name": member.name,
-            "discriminator": member.discriminator,
-            "display_name": member.display_name,
-            "avatar_url": str(member.avatar.url) if member.avatar else None,
-            "joined_at": member.joined_at.isoformat() if member.joined_at else None,
-        })
+async def get_new_members():
+    if bot_instance is not None:
+        try:
+            return await state.build_new_members(bot_instance)
+        except LookupError as e:
+            raise HTTPException(status_code=404, detail=str(e))
 
+    new_members, _ = _read_shared(state.NEW_MEMBERS_KEY)
+    if isinstance(new_members, dict) and "error" in new_members:
+        raise HTTPException(status_code=404, detail=new_members["error"])
     return new_members
 
+@app.post("/api/welcome-wagon/graduate/{user_id}")
+async def graduate_member(user_id: int):
+    """Queues a member for graduation; the bot processes the queue every 30 seconds."""
+    queued = await asyncio.to_thread(add_to_graduation_queue, user_id)
+    return {"queued": queued}
+
+@app.get("/api/guilds/{guild_id}/settings")
+async def get_guild_settings(guild_id: int):
+    if bot_instance is None:
+        # Other dashboard workers may have saved changes since this one last looked
+        await asyncio.to_thread(guild_settings.load)
+    return guild_settings.all(guild_id)
+
+@app.patch("/api/guilds/{guild_id}/settings", dependencies=[Depends(require_admin)])
+async def update_guild_settings(guild_id: int, values: GuildSettingsUpdate):
+    """Saves the given settings; the bot sees them immediately, or within DASHBOARD_STATE_INTERVAL in separate mode."""
+    return await asyncio.to_thread(guild_settings.update, guild_id, **values.model_dump(exclude_unset=True))
+
 def setup_api(bot: discord.Client):
     """Initializes the API with the bot instance."""
     global bot_instance
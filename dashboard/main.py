@@ -1,11 +1,13 @@
+import asyncio
 import logging
 from fastapi import FastAPI, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
 from discord.ext import commands
 
-from config import GUILD_ID, WELCOME_NEW_IN_TOWN_ROLE_ID
-from utils.database import get_or_create_activity, add_to_graduation_queue
+from config import GUILD_ID
+from utils.database import get_message_counts, add_to_graduation_queue, guild_settings
+from utils.helpers import ensure_chunked
 
 logger = logging.getLogger(__name__)
 
@@ -21,20 +23,21 @@ def create_app(bot: commands.Bot) -> FastAPI:
         if not guild:
             return templates.TemplateResponse("error.html", {"request": request, "error": "Bot is not in the configured guild."}, status_code=500)
 
-        new_in_town_role = guild.get_role(WELCOME_NEW_IN_TOWN_ROLE_ID)
+        new_in_town_role = guild.get_role(guild_settings.get(guild.id, 'new_in_town_role'))
         if not new_in_town_role:
             return templates.TemplateResponse("error.html", {"request": request, "error": "'New In Town' role not found."}, status_code=500)
 
-        new_members = [m for m in guild.members if new_in_town_role in m.roles]
+        await ensure_chunked(guild)
+        new_members = new_in_town_role.members
+        message_counts = await asyncio.to_thread(get_message_counts)
         
         member_data = []
         for member in new_members:
-            activity = get_or_create_activity(member.id)
             member_data.append({
                 "id": member.id,
                 "name": member.display_name,
                 "avatar_url": member.display_avatar.url,
-                "message_count": activity.message_count
+                "message_count": message_counts.get(member.id, 0)
             })
 
         return templates.TemplateResponse("welcome_wagon.html", {"request": request, "members": member_data})
@@ -0,0 +1,96 @@
+"""
+State shared between the bot and the dashboard.
+
+When the dashboard runs in the bot's process it builds responses straight from
+the live client. When it runs in its own process (DASHBOARD_MODE = 'separate'),
+the bot publishes the same payloads to the shared_state table every
+DASHBOARD_STATE_INTERVAL seconds and the dashboard reads them from there.
+Commands such as graduation already go the other way through GraduationQueue,
+and guild settings saved by the dashboard are picked up when the bot refreshes
+its settings cache on the same interval.
+"""
+import asyncio
+import logging
+
+import discord
+from discord.ext import tasks
+
+import config
+from utils.activity import activity_window
+from utils.database import set_shared_state, guild_settings
+from utils.helpers import ensure_chunked
+from utils.members import member_store
+from utils.memory import cache_stats
+from utils.shards import shard_health
+from utils.tracing import command_stats
+
+logger = logging.getLogger(__name__)
+
+STATUS_KEY = 'status'
+NEW_MEMBERS_KEY = 'welcome_wagon.new_members'
+
+
+def build_status(bot: discord.Client) -> dict:
+    return {
+        "logged_in": bot.is_ready(),
+        "missing_config": getattr(bot, 'missing_config', []),
+        "shards": shard_health(bot),
+        "cache": cache_stats(bot),
+        "slowest_commands": command_stats.summary(),
+    }
+
+
+async def build_new_members(bot: discord.Client) -> list:
+    """
+    Reads from the member snapshot store, so it can answer straight after a
+    restart, before the gateway is ready. recent_message_count covers the last
+    ACTIVITY_REPORT_WINDOW_DAYS days. Raises LookupError if the guild or role
+    can't be found.
+    """
+    role_id = guild_settings.get(config.GUILD_ID, 'new_in_town_role')
+    guild = bot.get_guild(config.GUILD_ID)
+    if guild:
+        await ensure_chunked(guild)
+        if not guild.get_role(role_id):
+            raise LookupError("'New In Town' role not found.")
+
+    try:
+        members = member_store.members_with_role(config.GUILD_ID, role_id)
+    except LookupError:
+        raise LookupError("Guild not found.")
+    for member in members:
+        member["recent_message_count"] = activity_window.messages_in(member["id"], config.ACTIVITY_REPORT_WINDOW_DAYS)
+    return members
+
+
+class StatePublisher:
+    """Periodically writes dashboard snapshots from the bot process."""
+
+    def __init__(self, bot: discord.Client):
+        self.bot = bot
+        self.publish.change_interval(seconds=config.DASHBOARD_STATE_INTERVAL)
+
+    def start(self):
+        self.publish.start()
+
+    def stop(self):
+        self.publish.cancel()
+
+    @tasks.loop(seconds=30)
+    async def publish(self):
+        try:
+            # Pick up settings the dashboard process changed
+            await asyncio.to_thread(guild_settings.load)
+        except Exception as e:
+            logger.error(f'Failed to refresh guild settings: {e}')
+
+        snapshots = {STATUS_KEY: build_status(self.bot)}
+        try:
+            snapshots[NEW_MEMBERS_KEY] = await build_new_members(self.bot)
+        except LookupError as e:
+            snapshots[NEW_MEMBERS_KEY] = {"error": str(e)}
+        try:
+            async with self.bot.lifecycle.work():
+                await asyncio.to_thread(set_shared_state, snapshots)
+        except Exception as e:
+            logger.error(f'Failed to publish dashboard state: {e}')
@@ -0,0 +1,141 @@
+"""initial schema
+
+The schema the original create_all() setup made, before the tomato item
+catalog, persisted activity milestones and pending throws. Databases created
+by that setup are stamped with this revision.
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('activity',
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_activity_user_id'), ['user_id'], unique=True)
+
+    op.create_table('graduation_queue',
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('added_at', sa.DateTime(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('user_id', 'id')
+    )
+
+    op.create_table('guild_settings',
+    sa.Column('guild_id', sa.BigInteger(), nullable=False),
+    sa.Column('mod_log_channel', sa.BigInteger(), nullable=True),
+    sa.Column('welcome_channel', sa.BigInteger(), nullable=True),
+    sa.Column('welcome_message', sa.Text(), nullable=True),
+    sa.Column('mod_role', sa.BigInteger(), nullable=True),
+    sa.Column('admin_role', sa.BigInteger(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('guild_settings', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_guild_settings_guild_id'), ['guild_id'], unique=True)
+
+    op.create_table('tomato_stats',
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('tomatoes_thrown', sa.Integer(), nullable=True),
+    sa.Column('tomatoes_landed', sa.Integer(), nullable=True),
+    sa.Column('tomatoes_dodged', sa.Integer(), nullable=True),
+    sa.Column('times_hit', sa.Integer(), nullable=True),
+    sa.Column('claimed_starter', sa.Boolean(), nullable=True),
+    sa.Column('coins', sa.Integer(), nullable=True),
+    sa.Column('last_daily_claim', sa.DateTime(), nullable=True),
+    sa.Column('message_count', sa.Integer(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('user_id', 'id')
+    )
+
+    op.create_table('users',
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('guild_id', sa.BigInteger(), nullable=False),
+    sa.Column('xp', sa.Integer(), nullable=True),
+    sa.Column('level', sa.Integer(), nullable=True),
+    sa.Column('warnings', sa.Integer(), nullable=True),
+    sa.Column('is_approved', sa.Boolean(), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_users_guild_id'), ['guild_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_users_user_id'), ['user_id'], unique=True)
+
+    op.create_table('tomato_inventory',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('item_name', sa.String(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    op.create_table('warnings',
+    sa.Column('user_id', sa.BigInteger(), nullable=True),
+    sa.Column('guild_id', sa.BigInteger(), nullable=False),
+    sa.Column('moderator_id', sa.BigInteger(), nullable=False),
+    sa.Column('reason', sa.Text(), nullable=False),
+    sa.Column('warning_type', sa.String(length=20), nullable=True),
+    sa.Column('channel_id', sa.BigInteger(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('warnings', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_warnings_channel_id'), ['channel_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_warnings_guild_id'), ['guild_id'], unique=False)
+
+
+
+def downgrade():
+    with op.batch_alter_table('warnings', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_warnings_guild_id'))
+        batch_op.drop_index(batch_op.f('ix_warnings_channel_id'))
+
+    op.drop_table('warnings')
+    op.drop_table('tomato_inventory')
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_users_user_id'))
+        batch_op.drop_index(batch_op.f('ix_users_guild_id'))
+
+    op.drop_table('users')
+    op.drop_table('tomato_stats')
+    with op.batch_alter_table('guild_settings', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_guild_settings_guild_id'))
+
+    op.drop_table('guild_settings')
+    op.drop_table('graduation_queue')
+    with op.batch_alter_table('activity', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_activity_user_id'))
+
+    op.drop_table('activity')
@@ -0,0 +1,208 @@
+"""tomato game schema
+
+Converts the tomato game tables of the original create_all() schema to the
+current ones, keeping their data:
+- tomato_items is created and seeded, and tomato_inventory rows move from a
+  free-text item_name to an item_id, merging duplicate rows per user and item.
+  Names not in the catalog are added to it with no loot weight.
+- tomato_stats and graduation_queue are rebuilt with id as the primary key and
+  a unique user_id, merging duplicate rows per user.
+- tomato_stats gains next_reward_at, and pending_throws is created.
+
+Steps whose table already has its new shape are skipped, so databases made by
+create_all() at any point before migrations were introduced upgrade too.
+
+Revision ID: 0001a
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0001a'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# The catalog as of this revision; items added to config.TOMATO_ITEMS later are seeded at startup
+ITEMS = {
+    'Regular Tomato': 0.70,
+    'Rotten Tomato': 0.25,
+    'Golden Tomato': 0.05,
+}
+
+STATS_COUNTERS = ['tomatoes_thrown', 'tomatoes_landed', 'tomatoes_dodged', 'times_hit', 'coins', 'message_count']
+
+
+def _base_columns():
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    ]
+
+
+def _stats_columns():
+    return [
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('tomatoes_thrown', sa.Integer(), nullable=True),
+        sa.Column('tomatoes_landed', sa.Integer(), nullable=True),
+        sa.Column('tomatoes_dodged', sa.Integer(), nullable=True),
+        sa.Column('times_hit', sa.Integer(), nullable=True),
+        sa.Column('claimed_starter', sa.Boolean(), nullable=True),
+        sa.Column('coins', sa.Integer(), nullable=True),
+        sa.Column('last_daily_claim', sa.DateTime(), nullable=True),
+        sa.Column('message_count', sa.Integer(), nullable=True),
+        *_base_columns(),
+    ]
+
+
+def _queue_columns():
+    return [
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('added_at', sa.DateTime(), nullable=True),
+        *_base_columns(),
+    ]
+
+
+def _rebuild(table_name, columns, rows):
+    """
+    Replaces a table with one made of `columns`, filled by the select that
+    rows(old_table) returns; its column labels name the columns they fill.
+    """
+    bind = op.get_bind()
+    old = sa.Table(table_name, sa.MetaData(), autoload_with=bind)
+    new = op.create_table(f'{table_name}_new', *columns)
+    query = rows(old)
+    bind.execute(new.insert().from_select([column.name for column in query.selected_columns], query))
+    op.drop_table(table_name)
+    op.rename_table(f'{table_name}_new', table_name)
+
+
+def _merged_stats(old):
+    return sa.select(
+        old.c.user_id,
+        *[sa.func.sum(old.c[name]).label(name) for name in STATS_COUNTERS],
+        (sa.func.max(sa.case((old.c.claimed_starter, 1), else_=0)) == 1).label('claimed_starter'),
+        sa.func.max(old.c.last_daily_claim).label('last_daily_claim'),
+        sa.func.min(old.c.created_at).label('created_at'),
+        sa.func.max(old.c.updated_at).label('updated_at'),
+    ).group_by(old.c.user_id)
+
+
+def _merged_queue(old):
+    return sa.select(
+        old.c.user_id,
+        sa.func.min(old.c.added_at).label('added_at'),
+        sa.func.min(old.c.created_at).label('created_at'),
+        sa.func.max(old.c.updated_at).label('updated_at'),
+    ).group_by(old.c.user_id)
+
+
+def _keyed_by_user_id(inspector, table_name):
+    return 'user_id' in inspector.get_pk_constraint(table_name)['constrained_columns']
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if not inspector.has_table('tomato_items'):
+        items = op.create_table('tomato_items',
+        sa.Column('name', sa.String(length=50), nullable=False),
+        sa.Column('loot_weight', sa.Float(), nullable=True),
+        *_base_columns(),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('name')
+        )
+        op.bulk_insert(items, [{'name': name, 'loot_weight': weight} for name, weight in ITEMS.items()])
+
+    if 'item_name' in {column['name'] for column in inspector.get_columns('tomato_inventory')}:
+        items = sa.Table('tomato_items', sa.MetaData(), autoload_with=bind)
+        inventory = sa.Table('tomato_inventory', sa.MetaData(), autoload_with=bind)
+        known = set(bind.execute(sa.select(items.c.name)).scalars())
+        unknown = set(bind.execute(sa.select(inventory.c.item_name).distinct()).scalars()) - known
+        if unknown:
+            op.bulk_insert(items, [{'name': name, 'loot_weight': 0.0} for name in sorted(unknown)])
+
+        _rebuild('tomato_inventory', [
+            sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+            sa.Column('user_id', sa.BigInteger(), nullable=False),
+            sa.Column('item_id', sa.Integer(), nullable=False),
+            sa.Column('quantity', sa.Integer(), nullable=True),
+            sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+            sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+            sa.ForeignKeyConstraint(['item_id'], ['tomato_items.id'], ),
+            sa.PrimaryKeyConstraint('id'),
+        ], lambda old: (
+            sa.select(
+                old.c.user_id,
+                items.c.id.label('item_id'),
+                sa.func.sum(old.c.quantity).label('quantity'),
+                sa.func.min(old.c.created_at).label('created_at'),
+                sa.func.max(old.c.updated_at).label('updated_at'),
+            )
+            .join_from(old, items, old.c.item_name == items.c.name)
+            .group_by(old.c.user_id, items.c.id)
+            .having(sa.func.sum(old.c.quantity) > 0)
+        ))
+        with op.batch_alter_table('tomato_inventory', schema=None) as batch_op:
+            batch_op.create_index('ix_tomato_inventory_user_item', ['user_id', 'item_id'], unique=True)
+
+    if _keyed_by_user_id(inspector, 'tomato_stats'):
+        _rebuild('tomato_stats', [*_stats_columns(), sa.PrimaryKeyConstraint('id')], _merged_stats)
+        with op.batch_alter_table('tomato_stats', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_tomato_stats_user_id'), ['user_id'], unique=True)
+
+    if 'next_reward_at' not in {column['name'] for column in sa.inspect(bind).get_columns('tomato_stats')}:
+        with op.batch_alter_table('tomato_stats', schema=None) as batch_op:
+            batch_op.add_column(sa.Column('next_reward_at', sa.Integer(), nullable=True))
+
+    if _keyed_by_user_id(inspector, 'graduation_queue'):
+        _rebuild('graduation_queue', [*_queue_columns(), sa.PrimaryKeyConstraint('id')], _merged_queue)
+        with op.batch_alter_table('graduation_queue', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_graduation_queue_user_id'), ['user_id'], unique=True)
+
+    if not inspector.has_table('pending_throws'):
+        op.create_table('pending_throws',
+        sa.Column('thrower_id', sa.BigInteger(), nullable=False),
+        sa.Column('target_id', sa.BigInteger(), nullable=False),
+        sa.Column('item_name', sa.String(length=50), nullable=False),
+        sa.Column('channel_id', sa.BigInteger(), nullable=False),
+        sa.Column('message_id', sa.BigInteger(), nullable=True),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        *_base_columns(),
+        sa.PrimaryKeyConstraint('id')
+        )
+        with op.batch_alter_table('pending_throws', schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_pending_throws_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    bind = op.get_bind()
+
+    with op.batch_alter_table('pending_throws', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_pending_throws_expires_at'))
+    op.drop_table('pending_throws')
+
+    _rebuild('graduation_queue', [*_queue_columns(), sa.PrimaryKeyConstraint('user_id', 'id')],
+             lambda old: sa.select(old.c.user_id, old.c.added_at, old.c.id, old.c.created_at, old.c.updated_at))
+
+    _rebuild('tomato_stats', [*_stats_columns(), sa.PrimaryKeyConstraint('user_id', 'id')],
+             lambda old: sa.select(*[old.c[column.name] for column in _stats_columns()]))
+
+    items = sa.Table('tomato_items', sa.MetaData(), autoload_with=bind)
+    _rebuild('tomato_inventory', [
+        sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column('user_id', sa.BigInteger(), nullable=False),
+        sa.Column('item_name', sa.String(), nullable=False),
+        sa.Column('quantity', sa.Integer(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    ], lambda old: (
+        sa.select(old.c.id, old.c.user_id, items.c.name.label('item_name'), old.c.quantity, old.c.created_at, old.c.updated_at)
+        .join_from(old, items, old.c.item_id == items.c.id)
+    ))
+    op.drop_table('tomato_items')
@@ -0,0 +1,37 @@
+"""performance indexes
+
+Adds a composite index for SAM's per-channel warning counts and indexes the
+tomato leaderboard columns.
+
+Revision ID: 0002
+Revises: 0001a
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0002'
+down_revision = '0001a'
+branch_labels = None
+depends_on = None
+
+LEADERBOARD_COLUMNS = ['tomatoes_thrown', 'tomatoes_landed', 'tomatoes_dodged', 'times_hit']
+
+
+def upgrade():
+    with op.batch_alter_table('warnings', schema=None) as batch_op:
+        batch_op.create_index('ix_warnings_guild_channel_created', ['guild_id', 'channel_id', 'created_at'], unique=False)
+
+    with op.batch_alter_table('tomato_stats', schema=None) as batch_op:
+        for column in LEADERBOARD_COLUMNS:
+            batch_op.create_index(batch_op.f(f'ix_tomato_stats_{column}'), [column], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('tomato_stats', schema=None) as batch_op:
+        for column in reversed(LEADERBOARD_COLUMNS):
+            batch_op.drop_index(batch_op.f(f'ix_tomato_stats_{column}'))
+
+    with op.batch_alter_table('warnings', schema=None) as batch_op:
+        batch_op.drop_index('ix_warnings_guild_channel_created')
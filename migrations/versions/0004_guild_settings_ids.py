@@ -0,0 +1,37 @@
+"""guild settings ids
+
+Adds the per-guild role, channel and threshold settings that used to be global
+constants in config.py.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+ID_COLUMNS = ['waiting_room_channel', 'unapproved_role', 'member_role', 'new_in_town_role', 'welcome_wagon_role']
+
+
+def upgrade():
+    with op.batch_alter_table('guild_settings', schema=None) as batch_op:
+        for column in ID_COLUMNS:
+            batch_op.add_column(sa.Column(column, sa.BigInteger(), nullable=True))
+        batch_op.add_column(sa.Column('graduation_threshold', sa.Integer(), nullable=True))
+        batch_op.add_column(sa.Column('flag_moderator_roles', sa.Text(), nullable=True))
+        batch_op.add_column(sa.Column('flag_notify_users', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('guild_settings', schema=None) as batch_op:
+        batch_op.drop_column('flag_notify_users')
+        batch_op.drop_column('flag_moderator_roles')
+        batch_op.drop_column('graduation_threshold')
+        for column in reversed(ID_COLUMNS):
+            batch_op.drop_column(column)
@@ -0,0 +1,26 @@
+"""graduation report channel
+
+Adds the per-guild channel for the daily graduation suggestions.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('guild_settings', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('graduation_report_channel', sa.BigInteger(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('guild_settings', schema=None) as batch_op:
+        batch_op.drop_column('graduation_report_channel')
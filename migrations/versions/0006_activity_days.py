@@ -0,0 +1,41 @@
+"""activity days
+
+Adds per-user daily message buckets. Existing activity.message_count values
+become the compacted lifetime totals the buckets are added to, so no data
+needs to move.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('activity_days',
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('day', sa.Integer(), nullable=False),
+    sa.Column('message_count', sa.Integer(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('activity_days', schema=None) as batch_op:
+        batch_op.create_index('ix_activity_days_user_day', ['user_id', 'day'], unique=True)
+        batch_op.create_index(batch_op.f('ix_activity_days_day'), ['day'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('activity_days', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_activity_days_day'))
+        batch_op.drop_index('ix_activity_days_user_day')
+
+    op.drop_table('activity_days')
@@ -0,0 +1,57 @@
+"""retention
+
+Adds monthly warning rollups for archived warnings and the departures used to
+prune the data of users who left every guild.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('warning_rollups',
+    sa.Column('guild_id', sa.BigInteger(), nullable=False),
+    sa.Column('channel_id', sa.BigInteger(), nullable=False),
+    sa.Column('warning_type', sa.String(length=20), nullable=False),
+    sa.Column('month', sa.String(length=7), nullable=False),
+    sa.Column('warning_count', sa.Integer(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('warning_rollups', schema=None) as batch_op:
+        batch_op.create_index('ix_warning_rollups_key', ['guild_id', 'channel_id', 'warning_type', 'month'], unique=True)
+
+    op.create_table('member_departures',
+    sa.Column('user_id', sa.BigInteger(), nullable=False),
+    sa.Column('left_at', sa.DateTime(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.text('(CURRENT_TIMESTAMP)'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('member_departures', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_member_departures_left_at'), ['left_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_member_departures_user_id'), ['user_id'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('member_departures', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_member_departures_user_id'))
+        batch_op.drop_index(batch_op.f('ix_member_departures_left_at'))
+
+    op.drop_table('member_departures')
+    with op.batch_alter_table('warning_rollups', schema=None) as batch_op:
+        batch_op.drop_index('ix_warning_rollups_key')
+
+    op.drop_table('warning_rollups')
@@ -3,13 +3,10 @@ import re
 import discord
 from discord.ext import commands, tasks
 
-from config import (
-    APPROVAL_WAITING_ROOM_CHANNEL_ID,
-    APPROVAL_UNAPPROVED_ROLE_ID,
-    APPROVAL_MEMBER_ROLE_ID,
-    PRONOUN_REGEX,
-    WELCOME_NEW_IN_TOWN_ROLE_ID
-)
+from config import PRONOUN_REGEX, SHARD_TASK_SPREAD_SECONDS
+from utils.database import guild_settings
+from utils.helpers import ensure_chunked
+from utils.shards import staggered_guilds
 
 logger = logging.getLogger(__name__)
 
@@ -94,12 +91,12 @@ class MemberApproval(commands.Cog):
 
     async def _approve_member(self, member: discord.Member):
         """Grants a member full access to the server."""
-        unapproved_role = member.guild.get_role(APPROVAL_UNAPPROVED_ROLE_ID)
-        member_role = member.guild.get_role(APPROVAL_MEMBER_ROLE_ID)
-        new_in_town_role = member.guild.get_role(WELCOME_NEW_IN_TOWN_ROLE_ID)
+        unapproved_role = member.guild.get_role(guild_settings.get(member.guild.id, 'unapproved_role'))
+        member_role = member.guild.get_role(guild_settings.get(member.guild.id, 'member_role'))
+        new_in_town_role = member.guild.get_role(guild_settings.get(member.guild.id, 'new_in_town_role'))
 
         if not unapproved_role or not member_role or not new_in_town_role:
-            logger.error('One or more roles not found (Unapproved, Member, or New In Town). Check config.py.')
+            logger.error('One or more roles not found (Unapproved, Member, or New In Town). Check the guild settings.')
             return
 
         if unapproved_role in member.roles:
@@ -114,11 +111,11 @@ class MemberApproval(commands.Cog):
     @commands.Cog.listener()
     async def on_member_join(self, member: discord.Member):
         """Assigns unapproved role and sends welcome message."""
-        waiting_room = member.guild.get_channel(APPROVAL_WAITING_ROOM_CHANNEL_ID)
-        unapproved_role = member.guild.get_role(APPROVAL_UNAPPROVED_ROLE_ID)
+        waiting_room = member.guild.get_channel(guild_settings.get(member.guild.id, 'waiting_room_channel'))
+        unapproved_role = member.guild.get_role(guild_settings.get(member.guild.id, 'unapproved_role'))
 
         if not waiting_room or not unapproved_role:
-            logger.error('Waiting room or unapproved role not found. Check config.py.')
+            logger.error('Waiting room or unapproved role not found. Check the guild settings.')
             return
 
         await member.add_roles(unapproved_role, reason='New member, awaiting approval.')
@@ -137,7 +134,7 @@ class MemberApproval(commands.Cog):
     @commands.Cog.listener()
     async def on_member_update(self, before: discord.Member, after: discord.Member):
         """Checks for nickname changes to approve members."""
-        unapproved_role = after.guild.get_role(APPROVAL_UNAPPROVED_ROLE_ID)
+        unapproved_role = after.guild.get_role(guild_settings.get(after.guild.id, 'unapproved_role'))
         if unapproved_role not in after.roles or before.nick == after.nick:
             return # Not an unapproved member or nickname didn't change
 
@@ -149,19 +146,24 @@ class MemberApproval(commands.Cog):
     async def enforce_pronouns(self):
         """Periodically check all members for pronoun compliance."""
         logger.info('Running hourly pronoun enforcement check...')
-        for guild in self.bot.guilds:
-            member_role = guild.get_role(APPROVAL_MEMBER_ROLE_ID)
-            unapproved_role = guild.get_role(APPROVAL_UNAPPROVED_ROLE_ID)
+        async for guild in staggered_guilds(self.bot, SHARD_TASK_SPREAD_SECONDS):
+            member_role = guild.get_role(guild_settings.get(guild.id, 'member_role'))
+            unapproved_role = guild.get_role(guild_settings.get(guild.id, 'unapproved_role'))
             if not member_role or not unapproved_role:
                 continue
 
+            await ensure_chunked(guild)
             for member in guild.members:
+                if self.bot.lifecycle.stopping:
+                    return
                 # Check members who have the main role but not the unapproved one
                 if member_role in member.roles and unapproved_role not in member.roles:
                     if not member.nick or not pronoun_regex.search(member.nick):
                         logger.info(f'Member {member.display_name} found without pronouns. Reverting to unapproved.')
-                        await member.remove_roles(member_role, reason='Pronoun policy enforcement.')
-                        await member.add_roles(unapproved_role, reason='Pronoun policy enforcement.')
+                        # Never leave a member with neither role
+                        async with self.bot.lifecycle.work():
+                            await member.remove_roles(member_role, reason='Pronoun policy enforcement.')
+                            await member.add_roles(unapproved_role, reason='Pronoun policy enforcement.')
                         try:
                             await member.send(
                                 f"""Hi there! We noticed your nickname on the **{guild.name}** server no longer includes pronouns.
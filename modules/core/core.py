@@ -1,11 +1,15 @@
 import logging
 import platform
+from collections import Counter
 from datetime import datetime, timezone
 
 import discord
 from discord.ext import commands
 
 from config import BOT_PREFIX
+from utils.memory import cache_stats
+from utils.shards import shard_health
+from utils.tracing import command_stats
 
 class Core(commands.Cog):
     """Core functionality for the WLM Network bot."""
@@ -31,7 +35,15 @@ class Core(commands.Cog):
     async def shutdown(self, ctx):
         """Shut down the bot (Bot owner only)."""
         await ctx.send('👋 Shutting down...')
-        await self.bot.close()
+        # Runs in its own task: shutdown unloads this cog, and waits for background work to finish
+        self.bot.request_shutdown()
+    
+    @commands.hybrid_command()
+    @commands.is_owner()
+    async def sync(self, ctx):
+        """Force a slash command sync (Bot owner only)."""
+        await self.bot.sync_commands(force=True)
+        await ctx.send('✅ Application commands synced.')
     
     @commands.hybrid_command()
     async def about(self, ctx):
@@ -53,6 +65,17 @@ class Core(commands.Cog):
         embed.add_field(name='Python Version', value=platform.python_version(), inline=True)
         embed.add_field(name='discord.py Version', value=discord.__version__, inline=True)
         
+        # Per-shard latency; a single line for an unsharded bot
+        shards = shard_health(self.bot)
+        shard_lines = [
+            f'#{shard["id"]}: ' + (f'{shard["latency_ms"]}ms' if shard["latency_ms"] is not None else 'n/a')
+            + ('' if shard["connected"] else ' (disconnected)') + f', {shard["guilds"]} guilds'
+            for shard in shards[:20]
+        ]
+        if len(shards) > 20:
+            shard_lines.append(f'...and {len(shards) - 20} more')
+        embed.add_field(name='Shards', value='\n'.join(shard_lines), inline=False)
+        
         # Loaded cogs
         loaded_cogs = [f'`{cog}`' for cog in self.bot.cogs]
         if loaded_cogs:
@@ -62,17 +85,60 @@ class Core(commands.Cog):
         
         await ctx.send(embed=embed)
     
+    @commands.hybrid_command()
+    @commands.is_owner()
+    async def cacheinfo(self, ctx):
+        """Show the size of the bot's gateway caches (Bot owner only)."""
+        stats = cache_stats(self.bot)
+        embed = discord.Embed(title='Cache Report', color=discord.Color.blue())
+        embed.add_field(name='Guilds', value=f'{stats["guilds"]} ({stats["guilds_chunked"]} fully loaded)', inline=True)
+        embed.add_field(name='Members', value=str(stats['members']), inline=True)
+        embed.add_field(name='Users', value=str(stats['users']), inline=True)
+        embed.add_field(name='Channels', value=str(stats['channels']), inline=True)
+        embed.add_field(name='Roles', value=str(stats['roles']), inline=True)
+        embed.add_field(name='Messages', value=str(stats['messages']), inline=True)
+        embed.add_field(name='Presence Intent', value='on' if stats['presences'] else 'off', inline=True)
+        if stats['memory_mb'] is not None:
+            embed.add_field(name='Process Memory', value=f'{stats["memory_mb"]} MiB', inline=True)
+        await ctx.send(embed=embed)
+    
+    @commands.hybrid_command()
+    @commands.is_owner()
+    async def commandstats(self, ctx):
+        """Show the slowest slash commands since startup (Bot owner only)."""
+        rows = command_stats.summary()
+        if not rows:
+            return await ctx.send('No slash commands have run yet.')
+        embed = discord.Embed(title='Slowest Commands', description='Recent calls; spans are averages per call.', color=discord.Color.blue())
+        for row in rows:
+            embed.add_field(
+                name=f'/{row["command"]}',
+                value=(
+                    f'p50 {row["p50_ms"]}ms · p95 {row["p95_ms"]}ms · max {row["max_ms"]}ms\n'
+                    f'db {row["db_ms"]}ms · rest {row["rest_ms"]}ms · render {row["render_ms"]}ms\n'
+                    f'{row["calls"]} calls, {row["errors"]} errors, {row["auto_defers"]} auto-deferred'
+                ),
+                inline=False
+            )
+        await ctx.send(embed=embed)
+    
     @commands.hybrid_command()
     @commands.guild_only()
     async def serverinfo(self, ctx):
         """Display information about the server."""
         guild = ctx.guild
         
-        # Count different member statuses
-        online = len([m for m in guild.members if m.status == discord.Status.online])
-        idle = len([m for m in guild.members if m.status == discord.Status.idle])
-        dnd = len([m for m in guild.members if m.status == discord.Status.dnd])
-        offline = len([m for m in guild.members if m.status == discord.Status.offline])
+        # Count member statuses in a single pass; without the presence intent every
+        # cached member is 'offline', so ask Discord for its approximate online count instead
+        if self.bot.intents.presences:
+            statuses = Counter(m.status for m in guild.members)
+            status_line = (
+                f'🟢 {statuses[discord.Status.online]} 🟠 {statuses[discord.Status.idle]} '
+                f'🔴 {statuses[discord.Status.dnd]} ⚪ {statuses[discord.Status.offline]}'
+            )
+        else:
+            counts = await self.bot.fetch_guild(guild.id, with_counts=True)
+            status_line = f'🟢 ~{counts.approximate_presence_count} online'
         
         # Count different channel types
         text_channels = len(guild.text_channels)
@@ -93,14 +159,13 @@ class Core(commands.Cog):
             embed.set_thumbnail(url=guild.icon.url)
         
         # Server info fields
-        embed.add_field(name='Owner', value=guild.owner.mention, inline=True)
-        embed.add_field(name='Region', value=str(guild.region).title(), inline=True)
+        embed.add_field(name='Owner', value=f'<@{guild.owner_id}>', inline=True)
         embed.add_field(name='Members', value=f'👥 {guild.member_count}', inline=True)
         
         # Member status fields
         embed.add_field(
             name='Status',
-            value=f'🟢 {online} 🟠 {idle} 🔴 {dnd} ⚪ {offline}',
+            value=status_line,
             inline=False
         )
         
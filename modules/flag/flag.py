@@ -1,13 +1,19 @@
+import asyncio
 import logging
+from datetime import timezone
 import discord
 from discord import app_commands
 from discord.ext import commands
 
-from config import FLAG_MODERATOR_ROLE_IDS, FLAG_NOTIFY_USER_IDS
-from utils.database import add_channel_warning
+from utils.database import add_channel_warning, get_channel_warnings, count_channel_warnings, guild_settings
+from utils.helpers import format_time
+from utils.paginator import Paginator
+from utils.tracing import respond, run_db
 
 logger = logging.getLogger(__name__)
 
+HISTORY_PAGE_SIZE = 10
+
 class Flag(commands.Cog):
     """A two-tiered channel flagging system for moderation."""
 
@@ -15,10 +21,11 @@ class Flag(commands.Cog):
         self.bot = bot
 
     def _is_moderator(self, user: discord.Member) -> bool:
-        """Checks if a user has one of the configured moderator roles."""
-        return any(role.id in FLAG_MODERATOR_ROLE_IDS for role in user.roles)
+        """Checks if a user has one of the guild's configured moderator roles."""
+        moderator_roles = guild_settings.get(user.guild.id, 'flag_moderator_roles')
+        return any(role.id in moderator_roles for role in user.roles)
 
-    @app_commands.command(name='yellow', description='Issue a gentle warning to de-escalate a tense conversation.')
+    @app_commands.command(name='yellow', description='Issue a gentle warning to de-escalate a tense conversation.', extras={'ephemeral': True})
     async def yellow_flag(self, interaction: discord.Interaction, reason: str):
         """Sends a gentle, non-militant warning to the channel."""
         if not self._is_moderator(interaction.user):
@@ -30,10 +37,10 @@ class Flag(commands.Cog):
             color=discord.Color.yellow()
         )
         await interaction.channel.send(embed=embed)
-        add_channel_warning(interaction.channel.id, interaction.user.id, interaction.guild.id, reason, 'yellow')
-        await interaction.response.send_message('Yellow flag has been raised.', ephemeral=True)
+        await run_db(add_channel_warning, interaction.channel.id, interaction.user.id, interaction.guild.id, reason, 'yellow')
+        await respond(interaction, 'Yellow flag has been raised.', ephemeral=True)
 
-    @app_commands.command(name='red', description='Issue an urgent warning and notify staff.')
+    @app_commands.command(name='red', description='Issue an urgent warning and notify staff.', extras={'ephemeral': True})
     async def red_flag(self, interaction: discord.Interaction, reason: str):
         """Sends a firm warning and DM's staff for immediate attention."""
         if not self._is_moderator(interaction.user):
@@ -48,7 +55,7 @@ class Flag(commands.Cog):
         await interaction.channel.send(embed=embed)
 
         # Log the warning
-        add_channel_warning(interaction.channel.id, interaction.user.id, interaction.guild.id, reason, 'red')
+        await run_db(add_channel_warning, interaction.channel.id, interaction.user.id, interaction.guild.id, reason, 'red')
 
         # Notify staff via DM
         notification_embed = discord.Embed(
@@ -59,16 +66,49 @@ class Flag(commands.Cog):
         notification_embed.add_field(name='Reason', value=reason, inline=False)
         notification_embed.add_field(name='Jump to Channel', value=f'[Click Here]({interaction.channel.jump_url})', inline=False)
 
-        for user_id in FLAG_NOTIFY_USER_IDS:
+        async def notify(user_id: int):
             try:
-                user = await self.bot.fetch_user(user_id)
+                user = self.bot.get_user(user_id) or await self.bot.fetch_user(user_id)
                 await user.send(embed=notification_embed)
             except discord.NotFound:
                 logger.warning(f'Could not find user with ID {user_id} to send red flag notification.')
             except discord.Forbidden:
                 logger.warning(f'Could not DM user with ID {user_id}. They may have DMs disabled.')
 
-        await interaction.response.send_message('Red flag has been raised and staff have been notified.', ephemeral=True)
+        # DM every staff member at once rather than one after another
+        await asyncio.gather(*(notify(user_id) for user_id in guild_settings.get(interaction.guild.id, 'flag_notify_users')))
+
+        await respond(interaction, 'Red flag has been raised and staff have been notified.', ephemeral=True)
+
+    @app_commands.command(name='flaghistory', description='Show the flags raised in this channel.')
+    async def flag_history(self, interaction: discord.Interaction):
+        """Pages through this channel's flags, newest first."""
+        if not self._is_moderator(interaction.user):
+            return await interaction.response.send_message('You do not have permission to use this command.', ephemeral=True)
+
+        guild_id, channel_id = interaction.guild.id, interaction.channel.id
+        total = await run_db(count_channel_warnings, guild_id, channel_id)
+        if not total:
+            return await respond(interaction, 'No flags have been raised in this channel.', ephemeral=True)
+
+        async def render_page(page: int) -> discord.Embed:
+            warnings = await run_db(get_channel_warnings, guild_id, channel_id, limit=HISTORY_PAGE_SIZE, offset=page * HISTORY_PAGE_SIZE)
+            embed = discord.Embed(title=f'Flag History for #{interaction.channel.name}', color=discord.Color.orange())
+            for warning in warnings:
+                emoji = '🟥' if warning.warning_type == 'red' else '🟨'
+                # created_at is stored as naive UTC
+                raised_at = format_time(warning.created_at.replace(tzinfo=timezone.utc))
+                embed.add_field(
+                    name=f'{emoji} {warning.warning_type.title()} flag',
+                    value=f'{raised_at}\nBy <@{warning.moderator_id}>: {warning.reason[:900]}',
+                    inline=False
+                )
+            embed.set_footer(text=f'{total} flags in total')
+            return embed
+
+        page_count = -(-total // HISTORY_PAGE_SIZE)
+        # Flag reasons are for moderators only, like the red flag DMs to staff
+        await Paginator(render_page, page_count).start(interaction, ephemeral=True)
 
 async def setup(bot):
     await bot.add_cog(Flag(bot))
@@ -0,0 +1 @@
+# This file makes the 'maintenance' directory a Python package
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+from datetime import time, timezone
+import discord
+from discord.ext import commands, tasks
+
+from config import (
+    MAINTENANCE_HOUR_UTC,
+    MAINTENANCE_REPORT_CHANNEL_ID,
+    MAINTENANCE_VACUUM_MAX_PAGES,
+    WARNING_RETENTION_DAYS,
+    DEPARTED_USER_GRACE_DAYS,
+    GRADUATION_QUEUE_MAX_AGE_HOURS,
+    ACTIVITY_BUCKET_RETENTION_DAYS,
+    BACKUP_HOUR_UTC
+)
+from utils.activity import activity_window
+from utils.backup import create_backup
+from utils.database import (
+    archive_warnings,
+    compact_activity,
+    prune_departed_users,
+    prune_graduation_queue,
+    optimize_storage,
+    record_departure,
+    clear_departure,
+    get_departed_users
+)
+from utils.members import member_store
+
+logger = logging.getLogger(__name__)
+
+
+def _format_bytes(size: int) -> str:
+    for unit in ('B', 'KiB', 'MiB'):
+        if abs(size) < 1024:
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
+    return f'{size:.1f} GiB'
+
+
+def _seen_in(guild: discord.Guild, user_id: int) -> bool:
+    """Whether the member cache or the member snapshots have the user in a guild."""
+    snapshots = member_store.guilds.get(guild.id)
+    return guild.get_member(user_id) is not None or (snapshots is not None and user_id in snapshots.rows)
+
+
+class Maintenance(commands.Cog):
+    """Daily retention, compaction, storage upkeep and backups for the database."""
+
+    # (report label, blocking job) in the order they run; storage is optimized last
+    # so it can release the pages the other jobs freed
+    JOBS = (
+        ('Warnings archived', lambda: archive_warnings(WARNING_RETENTION_DAYS)),
+        ('Activity buckets compacted', lambda: compact_activity(ACTIVITY_BUCKET_RETENTION_DAYS)),
+        ('Departed users pruned', lambda: prune_departed_users(DEPARTED_USER_GRACE_DAYS)),
+        ('Stale graduation requests dropped', lambda: prune_graduation_queue(GRADUATION_QUEUE_MAX_AGE_HOURS)),
+        ('Bytes reclaimed', lambda: optimize_storage(MAINTENANCE_VACUUM_MAX_PAGES)),
+    )
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.lock = asyncio.Lock()
+        self.run_maintenance.start()
+        if BACKUP_HOUR_UTC is not None:
+            self.run_backup.change_interval(time=time(hour=BACKUP_HOUR_UTC, tzinfo=timezone.utc))
+            self.run_backup.start()
+
+    def cog_unload(self):
+        self.run_maintenance.cancel()
+        self.run_backup.cancel()
+
+    async def _still_member(self, user_id: int, left_guild_id: int) -> bool:
+        """
+        Whether a user who left one guild is still in any of the bot's guilds.
+        Guilds whose member list isn't fully loaded are asked over the API, and an
+        answer that can't be had counts as still present, so data is never pruned on a guess.
+        """
+        for guild in self.bot.guilds:
+            if guild.get_member(user_id):
+                return True  # Also catches a rejoin of the guild they left while this ran
+            if guild.id == left_guild_id:
+                continue
+            if _seen_in(guild, user_id):
+                return True
+            if guild.chunked:
+                continue
+            try:
+                await guild.fetch_member(user_id)
+                return True
+            except discord.NotFound:
+                continue
+            except discord.HTTPException as e:
+                logger.warning(f'Could not check whether user {user_id} is in guild {guild.id}: {e}')
+                return True
+        return False
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        # Per-user data is shared across guilds, so only a user gone from all of them is pruned
+        user_id = payload.user.id
+        if await self._still_member(user_id, payload.guild_id):
+            return
+        try:
+            await asyncio.to_thread(record_departure, user_id)
+        except Exception as e:
+            logger.error(f'Failed to record departure of user {user_id}: {e}')
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        try:
+            await asyncio.to_thread(clear_departure, member.id)
+        except Exception as e:
+            logger.error(f'Failed to clear departure of user {member.id}: {e}')
+
+    async def forget_returned_members(self) -> int:
+        """
+        Clears the departures of users seen in a guild again, including rejoins
+        the bot missed while it was offline. Returns how many were cleared.
+        """
+        departed = await asyncio.to_thread(get_departed_users)
+        returned = [
+            user_id for user_id in departed
+            if any(_seen_in(guild, user_id) for guild in self.bot.guilds)
+        ]
+        if returned:
+            await asyncio.to_thread(clear_departure, *returned)
+            logger.info(f'Cleared the departures of {len(returned)} users who are back in a guild.')
+        return len(returned)
+
+    async def run(self) -> dict:
+        """Runs every job off the event loop and returns {label: result}; a failed job reports None."""
+        results = {}
+        async with self.lock, self.bot.lifecycle.work():
+            activity_window.prune()
+            try:
+                await self.forget_returned_members()
+            except Exception as e:
+                logger.error(f'Could not clear departures of returned members: {e}', exc_info=True)
+            for label, job in self.JOBS:
+                try:
+                    results[label] = await asyncio.to_thread(job)
+                except Exception as e:
+                    logger.error(f'Database maintenance step "{label}" failed: {e}', exc_info=True)
+                    results[label] = None
+        logger.info('Database maintenance finished: ' + ', '.join(f'{label}: {value}' for label, value in results.items()))
+        return results
+
+    def build_report(self, results: dict) -> discord.Embed:
+        embed = discord.Embed(title='🧹 Database Maintenance', color=discord.Color.blue())
+        for label, value in results.items():
+            if value is None:
+                text = 'n/a' if label == 'Bytes reclaimed' else 'failed'
+            elif label == 'Bytes reclaimed':
+                text = _format_bytes(value)
+            else:
+                text = str(value)
+            embed.add_field(name=label, value=text, inline=True)
+        return embed
+
+    @tasks.loop(time=time(hour=MAINTENANCE_HOUR_UTC, tzinfo=timezone.utc))
+    async def run_maintenance(self):
+        """Daily database maintenance at an off-peak hour."""
+        results = await self.run()
+        channel = self.bot.get_channel(MAINTENANCE_REPORT_CHANNEL_ID) if MAINTENANCE_REPORT_CHANNEL_ID else None
+        if channel:
+            try:
+                await channel.send(embed=self.build_report(results))
+            except discord.HTTPException as e:
+                logger.warning(f'Could not post the maintenance report: {e}')
+
+    @run_maintenance.before_loop
+    async def before_run_maintenance(self):
+        await self.bot.wait_until_ready()
+
+    async def backup(self) -> tuple:
+        """Takes a backup off the event loop; maintenance and backups never overlap."""
+        async with self.lock, self.bot.lifecycle.work():
+            return await asyncio.to_thread(create_backup)
+
+    @tasks.loop(hours=24)
+    async def run_backup(self):
+        """Daily online backup of the database."""
+        try:
+            await self.backup()
+        except Exception as e:
+            logger.error(f'Scheduled database backup failed: {e}', exc_info=True)
+
+    @commands.hybrid_command(name='backup')
+    @commands.is_owner()
+    async def backup_command(self, ctx):
+        """Back up the database now (Bot owner only)."""
+        if self.lock.locked():
+            return await ctx.send('Database maintenance or a backup is already running.')
+        await ctx.defer()
+        try:
+            path, size = await self.backup()
+        except Exception as e:
+            logger.error(f'Database backup failed: {e}', exc_info=True)
+            return await ctx.send(f'❌ Backup failed: {e}')
+        await ctx.send(f'💾 Backed up the database to `{path}` ({_format_bytes(size)}).')
+
+    @commands.hybrid_command()
+    @commands.is_owner()
+    async def maintenance(self, ctx):
+        """Run database maintenance now (Bot owner only)."""
+        if self.lock.locked():
+            return await ctx.send('Database maintenance or a backup is already running.')
+        await ctx.defer()
+        await ctx.send(embed=self.build_report(await self.run()))
+
+async def setup(bot):
+    await bot.add_cog(Maintenance(bot))
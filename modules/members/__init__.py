@@ -0,0 +1 @@
+# This file makes the 'members' directory a Python package
@@ -0,0 +1,69 @@
+import asyncio
+import logging
+import discord
+from discord.ext import commands, tasks
+
+from config import MEMBER_SNAPSHOT_SAVE_SECONDS
+from utils.members import member_store, refresh_guild
+
+logger = logging.getLogger(__name__)
+
+class MemberSnapshots(commands.Cog):
+    """Keeps the compact member snapshot store in sync with gateway events."""
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+
+    async def cog_load(self):
+        # Load the previous run's snapshot so reports work before the gateway is ready
+        await asyncio.to_thread(member_store.load)
+        self.save_snapshots.change_interval(seconds=MEMBER_SNAPSHOT_SAVE_SECONDS)
+        self.save_snapshots.start()
+
+    async def cog_unload(self):
+        self.save_snapshots.cancel()
+        await self._save()
+
+    async def _save(self):
+        if not member_store.dirty:
+            return
+        payload = member_store.dumps()
+        try:
+            async with self.bot.lifecycle.work():
+                await asyncio.to_thread(member_store.write, payload)
+        except OSError as e:
+            member_store.dirty = True
+            logger.error(f'Failed to save member snapshots: {e}')
+
+    @tasks.loop(minutes=5)
+    async def save_snapshots(self):
+        await self._save()
+
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild: discord.Guild):
+        # Guilds that aren't chunked yet are rebuilt by ensure_chunked when first needed
+        if guild.chunked:
+            await refresh_guild(member_store, guild)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        member_store.remove_guild(guild.id)
+
+    @commands.Cog.listener()
+    async def on_member_join(self, member: discord.Member):
+        member_store.upsert(member)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        member_store.upsert(after)
+
+    @commands.Cog.listener()
+    async def on_user_update(self, before: discord.User, after: discord.User):
+        member_store.update_user(after)
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        member_store.remove(payload.guild_id, payload.user.id)
+
+async def setup(bot):
+    await bot.add_cog(MemberSnapshots(bot))
@@ -1,10 +1,13 @@
+import asyncio
 import logging
 import discord
 from discord.ext import commands, tasks
 from datetime import datetime, timedelta, timezone
 
-from utils.sheets_client import gsheet_client
+from utils.sheets_client import gsheet_client, init_gsheet_client
+from config import SHARD_TASK_SPREAD_SECONDS
 from utils.database import session_scope, Warning
+from utils.shards import staggered_guilds
 
 logger = logging.getLogger(__name__)
 
@@ -13,12 +16,23 @@ class SAMModule(commands.Cog):
 
     def __init__(self, bot):
         self.bot = bot
+        self.connect_task = None
+
+    async def cog_load(self):
+        # Connecting to Google Sheets is slow, blocking I/O; do it in the background
+        self.connect_task = asyncio.create_task(self._connect_sheets())
+
+    async def _connect_sheets(self):
+        if not gsheet_client.worksheet:
+            await asyncio.to_thread(init_gsheet_client)
         if gsheet_client.worksheet:
             self.update_channel_scores.start()
         else:
             logger.error('Google Sheet not available. SAM module task will not start.')
 
     def cog_unload(self):
+        if self.connect_task:
+            self.connect_task.cancel()
         self.update_channel_scores.cancel()
 
     @tasks.loop(hours=24)
@@ -29,12 +43,16 @@ class SAMModule(commands.Cog):
             logger.error('Aborting channel score update, Google Sheet is not available.')
             return
 
-        for guild in self.bot.guilds:
+        async for guild in staggered_guilds(self.bot, SHARD_TASK_SPREAD_SECONDS):
             logger.info(f'Processing channels for guild: {guild.name}')
             for channel in guild.text_channels:
+                if self.bot.lifecycle.stopping:
+                    logger.info('Stopping channel score update for shutdown.')
+                    return
                 try:
-                    data = await self._calculate_channel_metrics(channel)
-                    gsheet_client.update_channel_data(channel.id, data)
+                    async with self.bot.lifecycle.work():
+                        data = await self._calculate_channel_metrics(channel)
+                        gsheet_client.update_channel_data(channel.id, data)
                 except discord.errors.Forbidden:
                     logger.warning(f'No permission to view channel {channel.name} in {guild.name}')
                 except Exception as e:
@@ -1,45 +1,237 @@
 import logging
 import discord
 from discord import app_commands
-from discord.ext import commands
+from discord.ext import commands, tasks
 
+import heapq
 import random
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from config import TOMATO_ITEMS, TOMATO_ACTIVITY_CACHE_SIZE, TOMATO_ACTIVITY_FLUSH_SECONDS, TOMATO_RATE_LIMITS
+from utils.cache import LRUCache
+from utils.loot import LootEngine
+from utils.paginator import Paginator
+from utils.ratelimit import RateLimiter
+from utils.tracing import respond, run_db
 from utils.database import (
     increment_tomato_stat,
     get_leaderboard,
+    count_tomato_players,
     get_inventory,
-    remove_from_inventory,
     claim_starter_tomatoes,
     process_daily_claim,
     get_or_create_tomato_stats,
-    add_to_inventory
+    add_to_inventory,
+    tomato_transaction,
+    item_catalog,
+    get_activity_milestone,
+    flush_activity_milestones,
+    set_pending_throw_message,
+    get_pending_throws,
+    resolve_pending_throws
 )
 
 logger = logging.getLogger(__name__)
 
 
-class DodgeView(discord.ui.View):
-    def __init__(self, thrower: discord.Member, target: discord.Member):
-        super().__init__(timeout=8.0)  # 8-second window to dodge
-        self.thrower = thrower
-        self.target = target
-        self.dodged = False
+DODGE_WINDOW = timedelta(seconds=8)  # How long a target has to dodge
+GOLDEN_TOMATO_BONUS = 25             # Coins for landing a Golden Tomato
+LEADERBOARD_PAGE_SIZE = 10
 
-    @discord.ui.button(label='Dodge!', style=discord.ButtonStyle.primary, emoji='🏃')
-    async def dodge_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if interaction.user != self.target:
+
+class DodgeButton(discord.ui.DynamicItem[discord.ui.Button], template=r'tomato_dodge:(?P<throw_id>[0-9]+):(?P<target_id>[0-9]+)'):
+    """
+    The Dodge! button on a throw announcement.
+
+    The throw ID and target live in the custom_id, so the button keeps working across
+    restarts and no View object has to stay alive while the dodge window is open.
+    """
+
+    def __init__(self, throw_id: int, target_id: int):
+        super().__init__(
+            discord.ui.Button(
+                label='Dodge!',
+                style=discord.ButtonStyle.primary,
+                emoji='🏃',
+                custom_id=f'tomato_dodge:{throw_id}:{target_id}',
+            )
+        )
+        self.throw_id = throw_id
+        self.target_id = target_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match['throw_id']), int(match['target_id']))
+
+    async def callback(self, interaction: discord.Interaction):
+        if interaction.user.id != self.target_id:
             await interaction.response.send_message("This isn't for you to dodge!", ephemeral=True)
             return
 
-        self.dodged = True
-        # The view's only job is to report that the dodge was successful.
-        # The command will handle stat updates.
-        self.clear_items()
-        await interaction.response.edit_message(content=f"💨 Whoosh! **{self.target.display_name}** dodged the tomato from **{self.thrower.display_name}**!", view=None)
-        self.stop()
+        cog = interaction.client.get_cog('TomatoGame')
+        throw = cog.throws.dodge(self.throw_id) if cog else None
+        if throw is None:
+            await interaction.response.send_message("Too late, that tomato already landed!", ephemeral=True)
+            return
+
+        thrower_name = _display_name(interaction.guild, throw.thrower_id)
+        await interaction.response.edit_message(content=f"💨 Whoosh! **{interaction.user.display_name}** dodged the tomato from **{thrower_name}**!", view=None)
+
+
+def _display_name(guild, user_id: int) -> str:
+    member = guild.get_member(user_id) if guild else None
+    return member.display_name if member else f'<@{user_id}>'
 
-    async def on_timeout(self):
-        self.stop()
+
+class ThrowScheduler:
+    """
+    Resolves pending tomato throws from a single expiry heap.
+
+    Throws are persisted as PendingThrow rows, so they survive a restart. Once a
+    second, resolve_due() settles every throw whose window has closed, together with
+    any dodges since the last tick, in one stat transaction.
+    """
+
+    def __init__(self, bot: commands.Bot):
+        self.bot = bot
+        self.pending = {}  # {throw_id: PendingThrow}
+        self.heap = []     # [(expires_at, throw_id)]
+        self.dodged = []   # Dodged throws whose stats have not been written yet
+
+    def load(self):
+        """Reloads throws that were still pending when the bot last stopped."""
+        for throw in get_pending_throws():
+            self.schedule(throw)
+        if self.pending:
+            logger.info(f'Restored {len(self.pending)} pending tomato throws.')
+
+    def schedule(self, throw):
+        self.pending[throw.id] = throw
+        heapq.heappush(self.heap, (throw.expires_at, throw.id))
+
+    def dodge(self, throw_id: int):
+        """
+        Marks a throw as dodged. Returns the throw, or None if it was already
+        resolved or its dodge window has closed (the next tick resolves it as a hit).
+        """
+        throw = self.pending.get(throw_id)
+        if throw is None or throw.expires_at <= datetime.utcnow():
+            return None
+        del self.pending[throw_id]
+        self.dodged.append(throw)
+        return throw
+
+    async def resolve_due(self, now: datetime):
+        hits = []
+        while self.heap and self.heap[0][0] <= now:
+            _, throw_id = heapq.heappop(self.heap)
+            throw = self.pending.pop(throw_id, None)
+            if throw is not None:  # Dodged throws were already removed
+                hits.append(throw)
+
+        dodged, self.dodged = self.dodged, []
+        if not hits and not dodged:
+            return
+
+        stat_deltas = defaultdict(Counter)
+        for throw in dodged:
+            stat_deltas[throw.target_id]['tomatoes_dodged'] += 1
+        for throw in hits:
+            stat_deltas[throw.thrower_id]['tomatoes_landed'] += 1
+            stat_deltas[throw.target_id]['times_hit'] += 1
+            if throw.item_name == 'Golden Tomato':
+                stat_deltas[throw.thrower_id]['coins'] += GOLDEN_TOMATO_BONUS
+
+        try:
+            resolve_pending_throws([throw.id for throw in hits + dodged], stat_deltas)
+        except Exception:
+            # Put the batch back so the next tick retries it; a lost dodge would be reloaded as a hit
+            for throw in hits:
+                self.schedule(throw)
+            self.dodged = dodged + self.dodged
+            raise
+
+        for throw in hits:
+            await self._announce_hit(throw)
+
+    async def _announce_hit(self, throw):
+        channel = self.bot.get_channel(throw.channel_id)
+        if channel is None or throw.message_id is None:
+            return
+        guild = getattr(channel, 'guild', None)
+        thrower_name = _display_name(guild, throw.thrower_id)
+        hit_message = f"Splat! 🍅 **{_display_name(guild, throw.target_id)}** wasn't fast enough and got hit by **{thrower_name}**'s {throw.item_name}!"
+
+        # Special hit effects
+        if throw.item_name == 'Rotten Tomato':
+            hit_message += f"\nUgh, the smell! That's gonna leave a stain."
+        elif throw.item_name == 'Golden Tomato':
+            hit_message += f"\n✨ Shiny! **{thrower_name}** earned {GOLDEN_TOMATO_BONUS} Tomato Coins for the successful hit!"
+
+        try:
+            await channel.get_partial_message(throw.message_id).edit(content=hit_message, view=None)
+        except discord.HTTPException as e:
+            logger.warning(f'Could not announce hit for throw {throw.id}: {e}')
+
+
+class ActivityTracker:
+    """
+    Tracks message counts and reward milestones for the activity rewards.
+
+    Recently active users are kept in a bounded LRU and loaded from TomatoStats on
+    a miss. Message counts and new milestones are buffered and written in batches
+    by flush(), so a cached user's messages never touch the database.
+    """
+
+    def __init__(self, capacity: int):
+        # {user_id: [message_count, next_reward_at]}
+        self.entries = LRUCache(capacity)
+        self.pending_counts = {}
+        self.pending_milestones = {}
+
+    async def _load(self, user_id: int) -> list:
+        message_count, next_reward_at = await run_db(get_activity_milestone, user_id)
+        cached = self.entries.get(user_id)
+        if cached is not None:  # Loaded by another message while this one waited
+            return cached
+        # Buffered writes may not have reached the database yet if the entry was evicted
+        message_count += self.pending_counts.get(user_id, 0)
+        next_reward_at = self.pending_milestones.get(user_id, next_reward_at)
+        entry = [message_count, next_reward_at]
+        if next_reward_at is None:
+            self._schedule_next(user_id, entry)
+        self.entries[user_id] = entry
+        return entry
+
+    def _schedule_next(self, user_id: int, entry: list):
+        entry[1] = entry[0] + random.randint(15, 30)
+        self.pending_milestones[user_id] = entry[1]
+
+    async def record_message(self, user_id: int) -> bool:
+        """Counts a message. Returns True if it reached the user's reward milestone."""
+        entry = self.entries.get(user_id) or await self._load(user_id)
+        entry[0] += 1
+        self.pending_counts[user_id] = self.pending_counts.get(user_id, 0) + 1
+        if entry[0] < entry[1]:
+            return False
+        self._schedule_next(user_id, entry)
+        return True
+
+    async def flush(self):
+        """Writes buffered counts and milestones to the database."""
+        if not self.pending_counts and not self.pending_milestones:
+            return
+        counts, milestones = self.pending_counts, self.pending_milestones
+        self.pending_counts, self.pending_milestones = {}, {}
+        try:
+            await run_db(flush_activity_milestones, counts, milestones)
+        except Exception:
+            # Keep the buffered activity so the next flush can retry it
+            for user_id, delta in counts.items():
+                self.pending_counts[user_id] = self.pending_counts.get(user_id, 0) + delta
+            for user_id, next_reward_at in milestones.items():
+                self.pending_milestones.setdefault(user_id, next_reward_at)
+            raise
 
 
 class TomatoGame(commands.Cog):
@@ -48,61 +240,107 @@ class TomatoGame(commands.Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
         self.lootbox_cost = 100
-        self.loot_table = {
-            'Regular Tomato': 0.70,
-            'Rotten Tomato': 0.25,
-            'Golden Tomato': 0.05,
-        }
-        # In-memory cache for message-based reward milestones
-        # {user_id: message_milestone}
-        self.user_milestones = {}
-
-    @app_commands.command(name='claim', description='Claim your starter pack of tomatoes!')
+        item_catalog.load()
+        self.loot = LootEngine()
+        self.loot.register('lootbox', item_catalog.loot_table())
+        self.loot.register('activity_reward', {'coins': 0.8, 'lootbox': 0.2})
+        self.activity = ActivityTracker(TOMATO_ACTIVITY_CACHE_SIZE)
+        self.limiter = RateLimiter(TOMATO_RATE_LIMITS)
+        self.throws = ThrowScheduler(bot)
+        self.throws.load()
+        self.bot.add_dynamic_items(DodgeButton)
+        self.resolve_throws.start()
+        self.flush_activity.change_interval(seconds=TOMATO_ACTIVITY_FLUSH_SECONDS)
+        self.flush_activity.start()
+
+    async def cog_unload(self):
+        self.flush_activity.cancel()
+        self.resolve_throws.cancel()
+        self.bot.remove_dynamic_items(DodgeButton)
+        # Write dodges and expired throws now; throws still in their window stay in the database
+        try:
+            await self.throws.resolve_due(datetime.utcnow())
+        except Exception as e:
+            logger.error(f'Failed to resolve tomato throws on unload: {e}', exc_info=True)
+        await self.activity.flush()
+
+    @tasks.loop(seconds=1)
+    async def resolve_throws(self):
+        """Settles every throw whose dodge window has closed."""
+        try:
+            async with self.bot.lifecycle.work():
+                await self.throws.resolve_due(datetime.utcnow())
+        except Exception as e:
+            logger.error(f'Failed to resolve tomato throws: {e}', exc_info=True)
+
+    @resolve_throws.before_loop
+    async def before_resolve_throws(self):
+        await self.bot.wait_until_ready()
+
+    @tasks.loop(seconds=60)
+    async def flush_activity(self):
+        """Periodically writes buffered message counts and milestones."""
+        try:
+            await self.activity.flush()
+        except Exception as e:
+            logger.error(f'Failed to flush tomato activity: {e}')
+
+    @app_commands.command(name='claim', description='Claim your starter pack of tomatoes!', extras={'ephemeral': True})
     async def claim(self, interaction: discord.Interaction):
-        if claim_starter_tomatoes(interaction.user.id):
-            await interaction.response.send_message("You received 5 Regular Tomatoes! Use `/inventory` to see them.", ephemeral=True)
+        if await run_db(claim_starter_tomatoes, interaction.user.id):
+            await respond(interaction, "You received 5 Regular Tomatoes! Use `/inventory` to see them.", ephemeral=True)
         else:
-            await interaction.response.send_message("You have already claimed your starter pack.", ephemeral=True)
+            await respond(interaction, "You have already claimed your starter pack.", ephemeral=True)
 
-    @app_commands.command(name='daily', description='Claim your daily Tomato Coins!')
+    @app_commands.command(name='daily', description='Claim your daily Tomato Coins!', extras={'ephemeral': True})
     async def daily(self, interaction: discord.Interaction):
-        success, result = process_daily_claim(interaction.user.id)
+        success, result = await run_db(process_daily_claim, interaction.user.id)
         if success:
-            stats = get_or_create_tomato_stats(interaction.user.id)
-            await interaction.response.send_message(f"🎉 You received {result} Tomato Coins! Your new balance is {stats.coins} coins.", ephemeral=True)
+            stats = await run_db(get_or_create_tomato_stats, interaction.user.id)
+            await respond(interaction, f"🎉 You received {result} Tomato Coins! Your new balance is {stats.coins} coins.", ephemeral=True)
         else:
-            await interaction.response.send_message(f"⏳ {result}", ephemeral=True)
+            await respond(interaction, f"⏳ {result}", ephemeral=True)
 
-    @app_commands.command(name='balance', description='Check your Tomato Coin balance.')
+    @app_commands.command(name='balance', description='Check your Tomato Coin balance.', extras={'ephemeral': True})
     async def balance(self, interaction: discord.Interaction):
-        stats = get_or_create_tomato_stats(interaction.user.id)
-        await interaction.response.send_message(f"💰 You have {stats.coins} Tomato Coins.", ephemeral=True)
-
-    @app_commands.command(name='lootbox', description='Buy a lootbox for 100 coins!')
-    async def lootbox(self, interaction: discord.Interaction):
-        stats = get_or_create_tomato_stats(interaction.user.id)
-        
-        if stats.coins < self.lootbox_cost:
-            return await interaction.response.send_message(f"You don't have enough coins! A lootbox costs {self.lootbox_cost} coins.", ephemeral=True)
-
-        # Deduct coins
-        increment_tomato_stat(interaction.user.id, 'coins', -self.lootbox_cost)
-
-        # Roll for loot
-        items = list(self.loot_table.keys())
-        weights = list(self.loot_table.values())
-        chosen_item = random.choices(items, weights=weights, k=1)[0]
-
-        # Add to inventory
-        add_to_inventory(interaction.user.id, chosen_item)
+        stats = await run_db(get_or_create_tomato_stats, interaction.user.id)
+        await respond(interaction, f"💰 You have {stats.coins} Tomato Coins.", ephemeral=True)
+
+    @app_commands.command(name='lootbox', description='Buy lootboxes for 100 coins each!')
+    @app_commands.describe(count='How many lootboxes to open (1-10)')
+    async def lootbox(self, interaction: discord.Interaction, count: app_commands.Range[int, 1, 10] = 1):
+        retry_after = self.limiter.hit('lootbox', interaction.user.id)
+        if retry_after:
+            return await interaction.response.send_message(f"Slow down! You can open another lootbox in {retry_after:.0f}s.", ephemeral=True)
+
+        # Roll for loot in a single pass
+        found = Counter(self.loot.draw_many('lootbox', count))
+        cost = self.lootbox_cost * count
+
+        # Deduct coins and grant the items in one transaction
+        def buy():
+            with tomato_transaction() as tx:
+                paid = tx.spend_coins(interaction.user.id, cost)
+                if paid:
+                    for item_name, quantity in found.items():
+                        tx.give_item(interaction.user.id, item_name, quantity)
+                return paid
+
+        if not await run_db(buy):
+            return await respond(interaction, f"You don't have enough coins! {count} lootbox(es) cost {cost} coins.", ephemeral=True)
 
         # Announce result
-        await interaction.response.send_message(f"You open the lootbox and find... a **{chosen_item}**! It has been added to your inventory.")
+        if count == 1:
+            chosen_item = next(iter(found))
+            return await respond(interaction, f"You open the lootbox and find... a **{chosen_item}**! It has been added to your inventory.")
+
+        loot_lines = "\n".join(f"- **{item_name}** x{quantity}" for item_name, quantity in found.most_common())
+        await respond(interaction, f"You open {count} lootboxes and find:\n{loot_lines}\nEverything has been added to your inventory.")
 
     @app_commands.command(name='inventory', description='Check your tomato inventory.')
     async def inventory(self, interaction: discord.Interaction):
         await interaction.response.defer(ephemeral=True)
-        inv = get_inventory(interaction.user.id)
+        inv = await run_db(get_inventory, interaction.user.id)
         embed = discord.Embed(title=f"{interaction.user.display_name}'s Inventory", color=discord.Color.green())
         if not inv:
             embed.description = "Your inventory is empty. Use `/claim` to get some starter tomatoes!"
@@ -112,89 +350,91 @@ class TomatoGame(commands.Cog):
 
     @app_commands.command(name='tomato', description='Pelt another member with a tomato from your inventory!')
     @app_commands.describe(item='Which tomato to throw? (Defaults to Regular Tomato)')
-    @app_commands.choices(item=[
-        app_commands.Choice(name='Regular Tomato', value='Regular Tomato'),
-        app_commands.Choice(name='Rotten Tomato', value='Rotten Tomato'),
-        app_commands.Choice(name='Golden Tomato', value='Golden Tomato'),
-    ])
+    @app_commands.choices(item=[app_commands.Choice(name=name, value=name) for name in TOMATO_ITEMS])
     async def tomato(self, interaction: discord.Interaction, target: discord.Member, item: app_commands.Choice[str] = None):
         if target == interaction.user:
             return await interaction.response.send_message("You can't throw a tomato at yourself!", ephemeral=True)
         if target == self.bot.user:
             return await interaction.response.send_message("You wouldn't dare throw a tomato at me!", ephemeral=True)
 
-        item_to_throw = item.value if item else 'Regular Tomato'
-
-        if not remove_from_inventory(interaction.user.id, item_to_throw):
-            return await interaction.response.send_message(f"You don't have any '{item_to_throw}'s to throw!", ephemeral=True)
+        retry_after = self.limiter.hit('tomato', interaction.user.id)
+        if retry_after:
+            return await interaction.response.send_message(f"Your arm needs a rest! You can throw again in {retry_after:.0f}s.", ephemeral=True)
 
-        increment_tomato_stat(interaction.user.id, 'tomatoes_thrown')
+        item_to_throw = item.value if item else 'Regular Tomato'
 
-        # Announce the throw
-        throw_announcement = f"🍅 **{interaction.user.display_name}** is throwing a **{item_to_throw}** at **{target.display_name}**! Quick, dodge it!"
-        
         # Special pre-throw effect for Rotten Tomato
-        if item_to_throw == 'Rotten Tomato' and random.random() < 0.1: # 10% chance to backfire
-            await interaction.response.send_message(f"🤢 Oh no! Your {item_to_throw} was so rotten it fell apart in your hand! You've made a mess of yourself.")
-            return
-
-        view = DodgeView(interaction.user, target)
-        await interaction.response.send_message(throw_announcement, view=view)
-        await view.wait()
-
-        # Post-throw logic
-        if view.dodged:
-            increment_tomato_stat(target.id, 'tomatoes_dodged')
-            # The dodge message is already handled in the view
-        else: # Hit
-            increment_tomato_stat(interaction.user.id, 'tomatoes_landed')
-            increment_tomato_stat(target.id, 'times_hit')
-            
-            hit_message = f"Splat! 🍅 **{target.display_name}** wasn't fast enough and got hit by **{interaction.user.display_name}**'s {item_to_throw}!"
-            
-            # Special hit effects
-            if item_to_throw == 'Rotten Tomato':
-                hit_message += f"\nUgh, the smell! That's gonna leave a stain."
-            elif item_to_throw == 'Golden Tomato':
-                bonus_coins = 25
-                increment_tomato_stat(interaction.user.id, 'coins', bonus_coins)
-                hit_message += f"\n✨ Shiny! **{interaction.user.display_name}** earned {bonus_coins} Tomato Coins for the successful hit!"
-
-            await interaction.edit_original_response(content=hit_message, view=None)
+        backfired = item_to_throw == 'Rotten Tomato' and random.random() < 0.1 # 10% chance to backfire
+
+        def take_and_throw():
+            throw = None
+            with tomato_transaction() as tx:
+                has_item = tx.take_item(interaction.user.id, item_to_throw)
+                if has_item:
+                    tx.add_stats(interaction.user.id, tomatoes_thrown=1)
+                    if not backfired:
+                        throw = tx.add_pending_throw(
+                            interaction.user.id, target.id, item_to_throw,
+                            interaction.channel_id, datetime.utcnow() + DODGE_WINDOW
+                        )
+            return has_item, throw
+
+        has_item, throw = await run_db(take_and_throw)
+
+        if not has_item:
+            return await respond(interaction, f"You don't have any '{item_to_throw}'s to throw!", ephemeral=True)
+
+        if backfired:
+            return await respond(interaction, f"🤢 Oh no! Your {item_to_throw} was so rotten it fell apart in your hand! You've made a mess of yourself.")
+
+        # Announce the throw; the scheduler resolves it once the dodge window closes
+        throw_announcement = f"🍅 **{interaction.user.display_name}** is throwing a **{item_to_throw}** at **{target.display_name}**! Quick, dodge it!"
+        # The view only renders the button: clicks are routed to DodgeButton by its
+        # template, and a stopped view isn't kept in the client's view store
+        view = discord.ui.View(timeout=None)
+        view.add_item(DodgeButton(throw.id, target.id))
+        view.stop()
+        self.throws.schedule(throw)
+        throw.message_id = await respond(interaction, throw_announcement, view=view)
+        await run_db(set_pending_throw_message, throw.id, throw.message_id)
 
     leaderboard = app_commands.Group(name="tomatoleaderboard", description="View the tomato game leaderboards.")
 
     async def _send_leaderboard(self, interaction: discord.Interaction, stat_name: str, title: str):
         await interaction.response.defer()
-        board_data = get_leaderboard(stat_name, limit=10)
-        embed = discord.Embed(title=f"🍅 {title} 🍅", color=discord.Color.red())
-
-        if not board_data:
-            embed.description = "The leaderboard is empty! Start throwing tomatoes!"
-        else:
+        page_count = -(-await run_db(count_tomato_players) // LEADERBOARD_PAGE_SIZE)
+
+        async def render_page(page: int) -> discord.Embed:
+            offset = page * LEADERBOARD_PAGE_SIZE
+            board_data = await run_db(get_leaderboard, stat_name, limit=LEADERBOARD_PAGE_SIZE, offset=offset)
+            embed = discord.Embed(title=f"🍅 {title} 🍅", color=discord.Color.red())
+            if not board_data:
+                embed.description = "The leaderboard is empty! Start throwing tomatoes!"
+                return embed
             lines = []
-            for i, stats in enumerate(board_data):
+            for i, stats in enumerate(board_data, start=offset + 1):
                 user = self.bot.get_user(stats.user_id)
                 user_name = user.display_name if user else f"User ID: {stats.user_id}"
                 value = getattr(stats, stat_name)
-                lines.append(f"**{i+1}.** {user_name} - {value}")
+                lines.append(f"**{i}.** {user_name} - {value}")
             embed.description = "\n".join(lines)
+            return embed
 
-        await interaction.followup.send(embed=embed)
+        await Paginator(render_page, page_count).start(interaction)
 
-    @leaderboard.command(name="thrown", description="Top 10 tomato throwers.")
+    @leaderboard.command(name="thrown", description="Top tomato throwers.")
     async def leaderboard_thrown(self, interaction: discord.Interaction):
         await self._send_leaderboard(interaction, 'tomatoes_thrown', "Most Tomatoes Thrown")
 
-    @leaderboard.command(name="landed", description="Top 10 most accurate throwers.")
+    @leaderboard.command(name="landed", description="Most accurate throwers.")
     async def leaderboard_landed(self, interaction: discord.Interaction):
         await self._send_leaderboard(interaction, 'tomatoes_landed', "Most Tomatoes Landed")
 
-    @leaderboard.command(name="hit", description="Top 10 most pelted members.")
+    @leaderboard.command(name="hit", description="Most pelted members.")
     async def leaderboard_hit(self, interaction: discord.Interaction):
         await self._send_leaderboard(interaction, 'times_hit', "Most Times Hit")
 
-    @leaderboard.command(name="dodged", description="Top 10 best dodgers.")
+    @leaderboard.command(name="dodged", description="Best dodgers.")
     async def leaderboard_dodged(self, interaction: discord.Interaction):
         await self._send_leaderboard(interaction, 'tomatoes_dodged', "Most Tomatoes Dodged")
 
@@ -206,41 +446,36 @@ class TomatoGame(commands.Cog):
             return
 
         user_id = message.author.id
-        increment_tomato_stat(user_id, 'message_count')
-        stats = get_or_create_tomato_stats(user_id)
 
-        # Check if user has a milestone set
-        if user_id not in self.user_milestones:
-            self.user_milestones[user_id] = stats.message_count + random.randint(15, 30)
+        # Messages past the rate limit don't count toward rewards
+        if self.limiter.hit('activity', user_id):
+            return
 
         # Check if milestone is reached
-        if stats.message_count >= self.user_milestones[user_id]:
+        if await self.activity.record_message(user_id):
             # Decide on the reward type (80% chance for coins, 20% for a lootbox)
-            reward_type = random.choices(['coins', 'lootbox'], weights=[0.8, 0.2], k=1)[0]
+            reward_type = self.loot.draw('activity_reward')
             notification_message = ""
 
             if reward_type == 'coins':
                 reward_amount = random.randint(5, 25)
-                increment_tomato_stat(user_id, 'coins', reward_amount)
+                await run_db(increment_tomato_stat, user_id, 'coins', reward_amount)
                 logger.info(f"User {user_id} reached activity milestone, granting {reward_amount} coins.")
                 notification_message = f"🎉 **{message.author.display_name}**, your activity has earned you {reward_amount} Tomato Coins!"
             else:  # Free lootbox
-                items = list(self.loot_table.keys())
-                weights = list(self.loot_table.values())
-                chosen_item = random.choices(items, weights=weights, k=1)[0]
-                add_to_inventory(user_id, chosen_item)
+                chosen_item = self.loot.draw('lootbox')
+                await run_db(add_to_inventory, user_id, chosen_item)
                 logger.info(f"User {user_id} reached activity milestone, granting a free lootbox containing a {chosen_item}.")
                 notification_message = f"🎁 **{message.author.display_name}**, your activity has earned you a free lootbox! You found a **{chosen_item}** inside!"
 
             # Announce reward and make it disappear after 10s to reduce spam
+            if self.limiter.hit('activity_announce', message.channel.id):
+                return
             try:
                 await message.channel.send(notification_message, delete_after=10)
             except discord.errors.Forbidden:
                 logger.warning(f"Could not send activity reward message in channel {message.channel.id}")
 
-            # Set a new milestone
-            self.user_milestones[user_id] = stats.message_count + random.randint(15, 30)
-
 
 async def setup(bot):
     await bot.add_cog(TomatoGame(bot))
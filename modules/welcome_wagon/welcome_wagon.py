@@ -1,108 +1,313 @@
+import asyncio
 import logging
+from collections import Counter
+from datetime import time, timezone
 import discord
 from discord.ext import commands, tasks
 
 from config import (
-    WELCOME_WAGON_ROLE_ID,
-    WELCOME_NEW_IN_TOWN_ROLE_ID,
-    WELCOME_GRADUATION_THRESHOLD
+    SHARD_TASK_SPREAD_SECONDS,
+    WELCOME_REPORT_HOUR_UTC,
+    WELCOME_GRADUATE_ALL_BUTTON,
+    WELCOME_ACTIVITY_FLUSH_SECONDS,
+    ACTIVITY_RECENT_DAYS,
+    ACTIVITY_REPORT_WINDOW_DAYS
 )
-from utils.database import get_or_create_activity, increment_message_count, get_and_clear_graduation_queue
+from utils.activity import activity_window
+from utils.database import (
+    increment_message_counts, get_activity_buckets, get_and_clear_graduation_queue, guild_settings
+)
+from utils.helpers import has_configured_role, ensure_chunked, send_report
+from utils.members import member_store
+from utils.paginator import Paginator
+from utils.shards import staggered_guilds
 
 logger = logging.getLogger(__name__)
 
+REPORT_PAGE_SIZE = 20
+
+
+def describe_activity(member: dict) -> str:
+    recent = activity_window.messages_in(member['id'], ACTIVITY_REPORT_WINDOW_DAYS)
+    return f'**{member["display_name"]}**: {member["message_count"]} messages ({recent} in the last {ACTIVITY_REPORT_WINDOW_DAYS} days)'
+
+
+class GraduationEngine:
+    """
+    Keeps the set of "New In Town" members who have reached their guild's
+    graduation threshold, so the daily report only reads eligible members.
+
+    A guild's set is built once from the member snapshot, then updated for the
+    users whose message counts are flushed and for members whose roles change.
+    It is built again once the guild's role or threshold setting changes.
+    """
+
+    def __init__(self):
+        # {guild_id: {user_id}}
+        self.eligible = {}
+        # {guild_id: (new_in_town_role, graduation_threshold)} each set was built with
+        self.built_with = {}
+
+    @staticmethod
+    def _settings(guild_id: int) -> tuple:
+        return guild_settings.get(guild_id, 'new_in_town_role'), guild_settings.get(guild_id, 'graduation_threshold')
+
+    def is_current(self, guild_id: int) -> bool:
+        """Whether the guild's set exists and was built with its current settings."""
+        return guild_id in self.eligible and self.built_with.get(guild_id) == self._settings(guild_id)
+
+    def rebuild(self, guild_id: int):
+        role_id, threshold = self._settings(guild_id)
+        try:
+            members = member_store.members_with_role(guild_id, role_id)
+        except LookupError:
+            members = []
+        self.eligible[guild_id] = {m['id'] for m in members if m['message_count'] >= threshold}
+        self.built_with[guild_id] = (role_id, threshold)
+
+    def update(self, guild_id: int, user_id: int, has_role: bool = None):
+        """Re-checks one member; has_role overrides the snapshot when the caller already knows it."""
+        if not self.is_current(guild_id):
+            # Built in full the first time the guild is reported on after a settings change
+            self.eligible.pop(guild_id, None)
+            return
+        snapshots = member_store.guilds.get(guild_id)
+        if snapshots is None:
+            return
+        if has_role is None:
+            has_role = snapshots.has_role(user_id, guild_settings.get(guild_id, 'new_in_town_role'))
+        if has_role and snapshots.activity_of(user_id) >= guild_settings.get(guild_id, 'graduation_threshold'):
+            self.eligible[guild_id].add(user_id)
+        else:
+            self.eligible[guild_id].discard(user_id)
+
+    def discard(self, guild_id: int, user_id: int):
+        self.eligible.get(guild_id, set()).discard(user_id)
+
+    def eligible_members(self, guild_id: int) -> list:
+        """Eligible members as snapshot dicts, most active first."""
+        members = (member_store.member(guild_id, user_id) for user_id in self.eligible.get(guild_id, ()))
+        return sorted((m for m in members if m), key=lambda m: m['message_count'], reverse=True)
+
+
+class GraduateAllButton(discord.ui.DynamicItem[discord.ui.Button], template=r'welcome_graduate_all:(?P<guild_id>[0-9]+)'):
+    """
+    The "Graduate all" button on the daily suggestions. The guild lives in the
+    custom_id, so the button keeps working across restarts.
+    """
+
+    def __init__(self, guild_id: int):
+        super().__init__(
+            discord.ui.Button(
+                label='Graduate all',
+                style=discord.ButtonStyle.success,
+                emoji='🎓',
+                custom_id=f'welcome_graduate_all:{guild_id}',
+            )
+        )
+        self.guild_id = guild_id
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match):
+        return cls(int(match['guild_id']))
+
+    async def callback(self, interaction: discord.Interaction):
+        role_id = guild_settings.get(self.guild_id, 'welcome_wagon_role')
+        if interaction.guild is None or interaction.guild.id != self.guild_id or not role_id or not interaction.user.get_role(role_id):
+            await interaction.response.send_message('Only the Welcome Wagon team can graduate members.', ephemeral=True)
+            return
+
+        cog = interaction.client.get_cog('WelcomeWagon')
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        if not cog.graduation.is_current(self.guild_id):
+            cog.graduation.rebuild(self.guild_id)
+        user_ids = list(cog.graduation.eligible[self.guild_id])
+        graduated = await cog.graduate_members(
+            interaction.guild, user_ids, f'Graduated in bulk by {interaction.user.display_name}.'
+        )
+        await interaction.message.edit(view=None)
+        await interaction.followup.send(f'🎓 Graduated {graduated} of {len(user_ids)} eligible members.', ephemeral=True)
+
+
 class WelcomeWagon(commands.Cog):
     """Tools for the Welcome Wagon team to manage new members."""
 
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.graduation = GraduationEngine()
+        # {(guild_id, user_id): messages} not yet written to the database
+        self.pending_counts = Counter()
+        self.bot.add_dynamic_items(GraduateAllButton)
         self.suggest_graduates.start()
         self.process_graduation_queue.start()
+        self.flush_activity.change_interval(seconds=WELCOME_ACTIVITY_FLUSH_SECONDS)
+        self.flush_activity.start()
+
+    async def cog_load(self):
+        activity_window.load(await asyncio.to_thread(get_activity_buckets, ACTIVITY_RECENT_DAYS))
 
-    def cog_unload(self):
+    async def cog_unload(self):
         self.suggest_graduates.cancel()
         self.process_graduation_queue.cancel()
+        self.flush_activity.cancel()
+        self.bot.remove_dynamic_items(GraduateAllButton)
+        await self._flush()
 
     @commands.Cog.listener()
     async def on_message(self, message: discord.Message):
         """Tracks message activity for all non-bot users."""
-        if message.author.bot:
+        if message.author.bot or not message.guild:
             return
-        increment_message_count(message.author.id)
+        self.pending_counts[message.guild.id, message.author.id] += 1
+        member_store.add_activity(message.guild.id, message.author.id)
+        activity_window.record(message.author.id)
+
+    @commands.Cog.listener()
+    async def on_member_update(self, before: discord.Member, after: discord.Member):
+        role_id = guild_settings.get(after.guild.id, 'new_in_town_role')
+        if not role_id:
+            return
+        had_role, has_role = before.get_role(role_id) is not None, after.get_role(role_id) is not None
+        if had_role != has_role:
+            self.graduation.update(after.guild.id, after.id, has_role=has_role)
+
+    @commands.Cog.listener()
+    async def on_raw_member_remove(self, payload: discord.RawMemberRemoveEvent):
+        self.graduation.discard(payload.guild_id, payload.user.id)
+
+    async def _flush(self):
+        if not self.pending_counts:
+            return
+        pending, self.pending_counts = self.pending_counts, Counter()
+        user_counts = Counter()
+        for (_, user_id), count in pending.items():
+            user_counts[user_id] += count
+        async with self.bot.lifecycle.work():
+            try:
+                await asyncio.to_thread(increment_message_counts, user_counts)
+            except Exception:
+                # Keep the buffered counts so the next flush can retry them
+                self.pending_counts.update(pending)
+                raise
+        for guild_id, user_id in pending:
+            self.graduation.update(guild_id, user_id)
+
+    @tasks.loop(seconds=60)
+    async def flush_activity(self):
+        """Periodically writes buffered message counts and updates graduation eligibility."""
+        try:
+            await self._flush()
+        except Exception as e:
+            logger.error(f'Failed to flush Welcome Wagon activity: {e}')
+
+    async def graduate_members(self, guild: discord.Guild, user_ids: list, reason: str) -> int:
+        """Removes the 'New In Town' role from each member that has it. Returns how many were graduated."""
+        new_in_town_role = guild.get_role(guild_settings.get(guild.id, 'new_in_town_role'))
+        if not new_in_town_role:
+            logger.warning(f'Could not find \'New In Town\' role in guild {guild.name} to graduate members.')
+            return 0
+
+        await ensure_chunked(guild)
+        async with self.bot.lifecycle.work():
+            return await self._graduate(guild, new_in_town_role, user_ids, reason)
+
+    async def _graduate(self, guild: discord.Guild, new_in_town_role: discord.Role, user_ids: list, reason: str) -> int:
+        graduated = 0
+        for user_id in user_ids:
+            member = guild.get_member(user_id)
+            if not member:
+                continue
+            if new_in_town_role not in member.roles:
+                logger.warning(f'User {user_id} was not graduated because they do not have the \'New In Town\' role.')
+                continue
+            try:
+                await member.remove_roles(new_in_town_role, reason=reason)
+            except discord.Forbidden:
+                logger.error(f'Bot lacks permissions to graduate {member.display_name} in {guild.name}.')
+                break  # Every other member would fail the same way
+            except discord.HTTPException as e:
+                logger.error(f'HTTP error while graduating {member.display_name}: {e}')
+                continue
+            self.graduation.discard(guild.id, user_id)
+            graduated += 1
+        if graduated:
+            logger.info(f'Graduated {graduated} of {len(user_ids)} members in {guild.name}: {reason}')
+        return graduated
 
     @commands.command(name='newmembers', help='Lists all new members and their activity.')
-    @commands.has_role(WELCOME_WAGON_ROLE_ID)
+    @has_configured_role('welcome_wagon_role')
     async def list_new_members(self, ctx: commands.Context):
         """Shows a list of all members with the 'New In Town' role."""
-        new_in_town_role = ctx.guild.get_role(WELCOME_NEW_IN_TOWN_ROLE_ID)
+        new_in_town_role = ctx.guild.get_role(guild_settings.get(ctx.guild.id, 'new_in_town_role'))
         if not new_in_town_role:
-            return await ctx.send('"New In Town" role not found. Check config.')
+            return await ctx.send('"New In Town" role not found. Check the guild settings.')
 
-        new_members = [m for m in ctx.guild.members if new_in_town_role in m.roles]
+        await ensure_chunked(ctx.guild)
+        new_members = member_store.members_with_role(ctx.guild.id, new_in_town_role.id)
 
         if not new_members:
             return await ctx.send('No members are currently "New In Town".')
 
-        embed = discord.Embed(
-            title='New Members Activity Report',
-            color=discord.Color.green()
-        )
+        def render_page(page: int) -> discord.Embed:
+            rows = new_members[page * REPORT_PAGE_SIZE:(page + 1) * REPORT_PAGE_SIZE]
+            return discord.Embed(
+                title='New Members Activity Report',
+                description='\n'.join(describe_activity(m) for m in rows),
+                color=discord.Color.green()
+            )
 
-        member_lines = []
-        for member in new_members:
-            activity = get_or_create_activity(member.id)
-            member_lines.append(f'**{member.display_name}**: {activity.message_count} messages')
-        
-        embed.description = '\n'.join(member_lines)
-        await ctx.send(embed=embed)
+        page_count = -(-len(new_members) // REPORT_PAGE_SIZE)
+        await Paginator(render_page, page_count).start(ctx)
 
     @commands.command(name='graduate', help='Graduates a member, removing the New In Town role.')
-    @commands.has_role(WELCOME_WAGON_ROLE_ID)
+    @has_configured_role('welcome_wagon_role')
     async def graduate_member(self, ctx: commands.Context, member: discord.Member):
         """Manually graduates a member from the 'New In Town' program."""
-        new_in_town_role = ctx.guild.get_role(WELCOME_NEW_IN_TOWN_ROLE_ID)
+        new_in_town_role = ctx.guild.get_role(guild_settings.get(ctx.guild.id, 'new_in_town_role'))
         if not new_in_town_role or new_in_town_role not in member.roles:
             return await ctx.send(f'{member.display_name} is not in the "New In Town" program.')
 
-        await member.remove_roles(new_in_town_role, reason='Graduated by Welcome Wagon.')
-        logger.info(f'{member.display_name} was graduated by {ctx.author.display_name}.')
+        if not await self.graduate_members(ctx.guild, [member.id], f'Graduated by {ctx.author.display_name}.'):
+            return await ctx.send(f'❌ Could not graduate **{member.display_name}**. Check that I can manage the "New In Town" role.')
         await ctx.send(f'🎓 **{member.display_name}** has been successfully graduated!')
 
-    @tasks.loop(hours=24)
+    @tasks.loop(time=time(hour=WELCOME_REPORT_HOUR_UTC, tzinfo=timezone.utc))
     async def suggest_graduates(self):
         """Daily task to suggest active new members for graduation."""
         logger.info('Running daily check for graduation suggestions.')
-        for guild in self.bot.guilds:
-            welcome_wagon_role = guild.get_role(WELCOME_WAGON_ROLE_ID)
-            new_in_town_role = guild.get_role(WELCOME_NEW_IN_TOWN_ROLE_ID)
-
-            if not welcome_wagon_role or not new_in_town_role:
-                continue
-
-            # Find a channel the Welcome Wagon team can see
-            # This is a simple approach; a dedicated channel ID in config is better
-            report_channel = discord.utils.find(lambda c: welcome_wagon_role in c.changed_roles, guild.text_channels)
+        async for guild in staggered_guilds(self.bot, SHARD_TASK_SPREAD_SECONDS):
+            if self.bot.lifecycle.stopping:
+                return
+            report_channel = guild.get_channel(guild_settings.get(guild.id, 'graduation_report_channel'))
             if not report_channel:
-                logger.warning(f'No suitable channel found in guild {guild.name} to post graduation suggestions.')
+                logger.warning(f'No graduation report channel configured for guild {guild.name}.')
                 continue
 
-            new_members = [m for m in guild.members if new_in_town_role in m.roles]
-            suggestions = []
-            for member in new_members:
-                activity = get_or_create_activity(member.id)
-                if activity.message_count >= WELCOME_GRADUATION_THRESHOLD:
-                    suggestions.append(member)
-            
+            if not self.graduation.is_current(guild.id):
+                await ensure_chunked(guild)
+                self.graduation.rebuild(guild.id)
+            suggestions = self.graduation.eligible_members(guild.id)
+
             if suggestions:
-                embed = discord.Embed(
-                    title='🎓 Graduation Suggestions',
-                    description='The following members have been highly active and could be ready for graduation:',
-                    color=discord.Color.gold()
+                lines = ['The following members have been highly active and could be ready for graduation:']
+                lines += [describe_activity(m) for m in suggestions]
+                view = None
+                if WELCOME_GRADUATE_ALL_BUTTON:
+                    view = discord.ui.View(timeout=None)
+                    view.add_item(GraduateAllButton(guild.id))
+                await send_report(
+                    report_channel,
+                    '🎓 Graduation Suggestions',
+                    lines,
+                    color=discord.Color.gold(),
+                    csv_header=['user_id', 'display_name', 'message_count', f'messages_{ACTIVITY_REPORT_WINDOW_DAYS}d'],
+                    csv_rows=[
+                        (m['id'], m['display_name'], m['message_count'],
+                         activity_window.messages_in(m['id'], ACTIVITY_REPORT_WINDOW_DAYS))
+                        for m in suggestions
+                    ],
+                    view=view,
                 )
-                for member in suggestions:
-                    embed.add_field(name=member.display_name, value=f'{get_or_create_activity(member.id).message_count} messages', inline=False)
-                
-                await report_channel.send(embed=embed)
 
     @suggest_graduates.before_loop
     async def before_suggest_graduates(self):
@@ -111,29 +316,16 @@ class WelcomeWagon(commands.Cog):
     @tasks.loop(seconds=30)
     async def process_graduation_queue(self):
         """Processes graduation requests from the web dashboard queue."""
-        user_ids = get_and_clear_graduation_queue()
-        if not user_ids:
-            return
-
-        logger.info(f'Processing {len(user_ids)} graduations from the web dashboard.')
-        for guild in self.bot.guilds:
-            new_in_town_role = guild.get_role(WELCOME_NEW_IN_TOWN_ROLE_ID)
-            if not new_in_town_role:
-                logger.warning(f'Could not find \'New In Town\' role in guild {guild.name} to process queue.')
-                continue
+        if self.bot.lifecycle.stopping:
+            return  # Leave them queued for the next start
+        async with self.bot.lifecycle.work():
+            user_ids = get_and_clear_graduation_queue()
+            if not user_ids:
+                return
 
-            for user_id in user_ids:
-                member = guild.get_member(user_id)
-                if member and new_in_town_role in member.roles:
-                    try:
-                        await member.remove_roles(new_in_town_role, reason='Graduated via Web Dashboard.')
-                        logger.info(f'Graduated {member.display_name} ({user_id}) via web dashboard.')
-                    except discord.Forbidden:
-                        logger.error(f'Bot lacks permissions to graduate {member.display_name} in {guild.name}.')
-                    except discord.HTTPException as e:
-                        logger.error(f'HTTP error while graduating {member.display_name}: {e}')
-                elif member:
-                    logger.warning(f'User {user_id} from queue was found but did not have the \'New In Town\' role.')
+            logger.info(f'Processing {len(user_ids)} graduations from the web dashboard.')
+            for guild in self.bot.guilds:
+                await self.graduate_members(guild, user_ids, 'Graduated via Web Dashboard.')
 
     @process_graduation_queue.before_loop
     async def before_process_graduation_queue(self):
@@ -0,0 +1,74 @@
+from array import array
+from typing import Dict, Iterable, Optional, Tuple
+
+from config import ACTIVITY_RECENT_DAYS
+from utils.database import activity_day
+
+
+class ActivityWindow:
+    """
+    Per-user message counts for the most recent days, so rolling-window questions
+    ("messages in the last 7 days") are answered without a query.
+
+    Each user has a fixed ring of daily counts indexed by day modulo the ring
+    size. Slots for days a user was quiet are zeroed lazily, the next time the
+    user's ring is written or read.
+    """
+
+    def __init__(self, days: int):
+        self.days = days
+        self.rings: Dict[int, array] = {}
+        # Newest day each user's ring holds
+        self.last_day: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.rings)
+
+    def _ring(self, user_id: int, day: int) -> array:
+        ring = self.rings.get(user_id)
+        if ring is None:
+            ring = self.rings[user_id] = array('I', bytes(4 * self.days))
+            self.last_day[user_id] = day
+            return ring
+        last = self.last_day[user_id]
+        if day > last:
+            for skipped in range(last + 1, min(day, last + self.days) + 1):
+                ring[skipped % self.days] = 0
+            self.last_day[user_id] = day
+        return ring
+
+    def record(self, user_id: int, count: int = 1, day: Optional[int] = None):
+        day = activity_day() if day is None else day
+        ring = self._ring(user_id, day)
+        if day > self.last_day[user_id] - self.days:
+            ring[day % self.days] += count
+
+    def messages_in(self, user_id: int, days: int, today: Optional[int] = None) -> int:
+        """Messages over the last `days` days, today included; at most the ring size."""
+        ring = self.rings.get(user_id)
+        if ring is None:
+            return 0
+        today = activity_day() if today is None else today
+        last = self.last_day[user_id]
+        first = max(today - min(days, self.days) + 1, last - self.days + 1)
+        return sum(ring[day % self.days] for day in range(first, min(today, last) + 1))
+
+    def load(self, buckets: Iterable[Tuple[int, int, int]]):
+        """Replaces the window with (user_id, day, message_count) rows from the database."""
+        self.rings.clear()
+        self.last_day.clear()
+        for user_id, day, count in sorted(buckets, key=lambda bucket: bucket[1]):
+            self.record(user_id, count, day)
+
+    def prune(self, today: Optional[int] = None) -> int:
+        """Drops users with no messages inside the window. Returns how many were dropped."""
+        today = activity_day() if today is None else today
+        idle = [user_id for user_id, last in self.last_day.items() if last <= today - self.days]
+        for user_id in idle:
+            del self.rings[user_id]
+            del self.last_day[user_id]
+        return len(idle)
+
+
+# Singleton instance of the recent activity window
+activity_window = ActivityWindow(ACTIVITY_RECENT_DAYS)
@@ -0,0 +1,252 @@
+"""
+Online backups of the bot's database, and restoring them on this or another host.
+
+SQLite databases are copied with the online backup API a few pages at a time,
+so the bot keeps writing while a backup runs, then gzipped to BACKUP_DIR.
+Other backends are exported table by table inside one REPEATABLE READ
+transaction as gzipped JSON lines. Only the newest BACKUP_KEEP backups are kept.
+
+Either kind of backup can be restored into any backend; restoring a SQLite
+backup into a SQLite database just swaps the file in. Restore with the bot stopped.
+
+Usage (from the repository root):
+    python -m utils.backup create
+    python -m utils.backup restore data/backups/bot-20261019-040000-000000.db.gz
+"""
+import argparse
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from typing import Iterator, List, Tuple
+
+from sqlalchemy import DateTime, create_engine, delete, select, text
+
+from config import BACKUP_DIR, BACKUP_KEEP
+
+logger = logging.getLogger(__name__)
+
+SQLITE_SUFFIX = '.db.gz'
+EXPORT_SUFFIX = '.jsonl.gz'
+_PAGES_PER_STEP = 1024  # Pages copied between chances for writers to commit
+_INSERT_BATCH = 5000
+
+
+def _sqlite_path(engine) -> str:
+    return os.path.abspath(engine.url.database)
+
+
+def _backup_name(suffix: str) -> str:
+    # Microseconds keep two backups taken in the same second apart; the fixed width keeps names sorted by time
+    return f'bot-{datetime.utcnow().strftime("%Y%m%d-%H%M%S-%f")}{suffix}'
+
+
+def _gzip_file(source: str, destination: str):
+    # Compress to a temporary name first so a crash never leaves a truncated backup
+    with open(source, 'rb') as src, gzip.open(f'{destination}.tmp', 'wb', compresslevel=6) as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(f'{destination}.tmp', destination)
+
+
+def _backup_sqlite(engine, destination: str):
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(destination)) as tmp_dir:
+        copy_path = os.path.join(tmp_dir, 'snapshot.db')
+        source = sqlite3.connect(_sqlite_path(engine))
+        copy = sqlite3.connect(copy_path)
+        try:
+            source.backup(copy, pages=_PAGES_PER_STEP, sleep=0.01)
+        finally:
+            copy.close()
+            source.close()
+        _gzip_file(copy_path, destination)
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f'Cannot export {type(value).__name__}')
+
+
+def _export_tables(engine, destination: str, revision: str):
+    from utils.database import Base
+
+    with engine.connect().execution_options(isolation_level='REPEATABLE READ') as conn, \
+            gzip.open(f'{destination}.tmp', 'wt', encoding='utf-8') as out:
+        out.write(json.dumps({'revision': revision, 'created_at': datetime.utcnow().isoformat()}) + '\n')
+        for table in Base.metadata.sorted_tables:
+            out.write(json.dumps({'table': table.name, 'columns': [c.name for c in table.columns]}) + '\n')
+            for row in conn.execution_options(yield_per=_INSERT_BATCH).execute(select(table)):
+                out.write(json.dumps(list(row), default=_json_default) + '\n')
+    os.replace(f'{destination}.tmp', destination)
+
+
+def _current_revision(conn) -> str:
+    return conn.execute(text('SELECT version_num FROM alembic_version')).scalar()
+
+
+def rotate_backups(directory: str, keep: int) -> List[str]:
+    """Deletes all but the newest `keep` backups. Returns the deleted paths."""
+    backups = sorted(glob.glob(os.path.join(directory, f'bot-*{SQLITE_SUFFIX}'))
+                     + glob.glob(os.path.join(directory, f'bot-*{EXPORT_SUFFIX}')))
+    removed = backups[:-keep] if keep > 0 else []
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def create_backup(directory: str = BACKUP_DIR, keep: int = BACKUP_KEEP) -> Tuple[str, int]:
+    """Takes a consistent backup without blocking writers. Returns (path, compressed size in bytes)."""
+    from utils.database import engine
+
+    os.makedirs(directory, exist_ok=True)
+    if engine.dialect.name == 'sqlite':
+        path = os.path.join(directory, _backup_name(SQLITE_SUFFIX))
+        _backup_sqlite(engine, path)
+    else:
+        path = os.path.join(directory, _backup_name(EXPORT_SUFFIX))
+        with engine.connect() as conn:
+            revision = _current_revision(conn)
+        _export_tables(engine, path, revision)
+    size = os.path.getsize(path)
+    rotate_backups(directory, keep)
+    logger.info(f'Database backed up to {path} ({size} bytes).')
+    return path, size
+
+
+def _read_sqlite_backup(path: str, tmp_dir: str) -> Tuple[str, Iterator[Tuple[str, List[dict]]]]:
+    from utils.database import Base
+
+    copy_path = os.path.join(tmp_dir, 'restore.db')
+    with gzip.open(path, 'rb') as src, open(copy_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    source = create_engine(f'sqlite:///{copy_path}')
+    with source.connect() as conn:
+        revision = _current_revision(conn)
+
+    def batches():
+        try:
+            with source.connect() as conn:
+                for table in Base.metadata.sorted_tables:
+                    result = conn.execution_options(yield_per=_INSERT_BATCH).execute(select(table)).mappings()
+                    for batch in result.partitions():
+                        yield table.name, [dict(row) for row in batch]
+        finally:
+            source.dispose()
+
+    return revision, batches()
+
+
+def _read_export(path: str) -> Tuple[str, Iterator[Tuple[str, List[dict]]]]:
+    from utils.database import Base
+
+    source = gzip.open(path, 'rt', encoding='utf-8')
+    revision = json.loads(source.readline())['revision']
+
+    def batches():
+        table = columns = None
+        batch = []
+        with source:
+            for line in source:
+                record = json.loads(line)
+                if isinstance(record, dict):
+                    if batch:
+                        yield table.name, batch
+                    table, batch = Base.metadata.tables[record['table']], []
+                    columns = [table.c[name] for name in record['columns']]
+                    continue
+                batch.append({
+                    column.name: datetime.fromisoformat(value) if value is not None and isinstance(column.type, DateTime) else value
+                    for column, value in zip(columns, record)
+                })
+                if len(batch) >= _INSERT_BATCH:
+                    yield table.name, batch
+                    batch = []
+            if batch:
+                yield table.name, batch
+
+    return revision, batches()
+
+
+def _restore_sqlite_file(engine, path: str):
+    target = _sqlite_path(engine)
+    engine.dispose()
+    with gzip.open(path, 'rb') as src, open(f'{target}.restore', 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    os.replace(f'{target}.restore', target)
+
+
+def _bulk_load(engine, revision: str, batches: Iterator[Tuple[str, List[dict]]]) -> int:
+    from utils.database import Base
+
+    with engine.begin() as conn:
+        head = _current_revision(conn)
+        if revision != head:
+            raise RuntimeError(
+                f'Backup is at schema revision {revision} but this database is at {head}; '
+                'restore it with the matching version of the bot.'
+            )
+        for table in reversed(Base.metadata.sorted_tables):
+            conn.execute(delete(table))
+        rows = 0
+        for table_name, batch in batches:
+            conn.execute(Base.metadata.tables[table_name].insert(), batch)
+            rows += len(batch)
+        if engine.dialect.name == 'postgresql':
+            # Move id sequences past the restored rows
+            for table in Base.metadata.sorted_tables:
+                if 'id' in table.c:
+                    conn.execute(text(
+                        f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), COALESCE(MAX(id), 1)) FROM {table.name}"
+                    ))
+    return rows
+
+
+def restore_backup(path: str) -> int:
+    """
+    Replaces the configured database's contents with a backup and migrates it to
+    the latest schema. Returns the number of rows loaded, or 0 when a SQLite file
+    was swapped in whole.
+    """
+    from utils.database import engine, init_database
+
+    if path.endswith(SQLITE_SUFFIX) and engine.dialect.name == 'sqlite':
+        os.makedirs(os.path.dirname(_sqlite_path(engine)), exist_ok=True)
+        _restore_sqlite_file(engine, path)
+        init_database()
+        return 0
+
+    init_database()
+    if path.endswith(SQLITE_SUFFIX):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            revision, batches = _read_sqlite_backup(path, tmp_dir)
+            return _bulk_load(engine, revision, batches)
+    if path.endswith(EXPORT_SUFFIX):
+        revision, batches = _read_export(path)
+        return _bulk_load(engine, revision, batches)
+    raise ValueError(f'Not a backup file: {path}')
+
+
+def main():
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Back up or restore the bot database.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('create', help='take a backup now')
+    restore = commands.add_parser('restore', help='replace the database with a backup (stop the bot first)')
+    restore.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'create':
+        path, size = create_backup()
+        print(f'Backed up to {path} ({size} bytes).')
+    else:
+        rows = restore_backup(args.path)
+        print(f'Restored {args.path}' + (f' ({rows} rows).' if rows else '.'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+from collections import OrderedDict
+
+
+class LRUCache:
+    """A mapping that evicts the least recently used key once it is full."""
+
+    def __init__(self, capacity: int):
+        if capacity < 1:
+            raise ValueError('LRUCache capacity must be at least 1.')
+        self.capacity = capacity
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        """Return the value for key and mark it as recently used."""
+        if key not in self._data:
+            return default
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def __setitem__(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        if len(self._data) > self.capacity:
+            self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def pop(self, key, default=None):
+        return self._data.pop(key, default)
+
+    def clear(self):
+        self._data.clear()
@@ -1,18 +1,48 @@
-from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, func, BigInteger, Text
+from sqlalchemy import create_engine, Column, Integer, String, Boolean, DateTime, ForeignKey, func, BigInteger, Text, Float, Index, select, insert, update, delete, union_all, or_
+from sqlalchemy.dialects.postgresql import insert as postgresql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime, timedelta
 import random
 from sqlalchemy.orm import sessionmaker, relationship, scoped_session
 from contextlib import contextmanager
+import json
 import logging
 
-from config import DATABASE_URL
+from config import (
+    DATABASE_URL, DATABASE_AUTO_MIGRATE, DATABASE_POOL_SIZE, DATABASE_MAX_OVERFLOW,
+    DATABASE_POOL_RECYCLE, DATABASE_STATEMENT_TIMEOUT_MS, TOMATO_ITEMS, GUILD_ID,
+    APPROVAL_WAITING_ROOM_CHANNEL_ID, APPROVAL_UNAPPROVED_ROLE_ID, APPROVAL_MEMBER_ROLE_ID,
+    WELCOME_WAGON_ROLE_ID, WELCOME_NEW_IN_TOWN_ROLE_ID, WELCOME_GRADUATION_THRESHOLD, WELCOME_REPORT_CHANNEL_ID,
+    FLAG_MODERATOR_ROLE_IDS, FLAG_NOTIFY_USER_IDS
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+def _create_engine(url):
+    """Create the engine for the configured backend."""
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite':
+        # Wait for the write lock instead of failing while another connection holds it
+        return create_engine(url, echo=False, connect_args={'timeout': DATABASE_STATEMENT_TIMEOUT_MS / 1000})
+
+    connect_args = {}
+    if backend == 'postgresql':
+        connect_args['options'] = f'-c statement_timeout={DATABASE_STATEMENT_TIMEOUT_MS}'
+    return create_engine(
+        url,
+        echo=False,
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=DATABASE_MAX_OVERFLOW,
+        pool_recycle=DATABASE_POOL_RECYCLE,
+        pool_pre_ping=True,
+        connect_args=connect_args,
+    )
+
 # Create database engine and session factory
-engine = create_engine(DATABASE_URL, echo=False)
+engine = _create_engine(DATABASE_URL)
 SessionFactory = sessionmaker(bind=engine, expire_on_commit=False)
 Session = scoped_session(SessionFactory)
 Base = declarative_base()
@@ -32,6 +62,43 @@ def session_scope():
     finally:
         session.close()
 
+# Backends with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_INSERTS = {
+    'sqlite': sqlite_insert,
+    'postgresql': postgresql_insert,
+}
+
+def _upsert_counters(session, model, keys, deltas):
+    """
+    Adds deltas to counter columns of the row matching keys, inserting it if missing.
+    keys must be covered by a unique index on model.
+    """
+    upsert_insert = _UPSERT_INSERTS.get(engine.dialect.name)
+    if upsert_insert is not None:
+        stmt = upsert_insert(model).values(**keys, **deltas)
+        set_ = {name: getattr(model, name) + getattr(stmt.excluded, name) for name in deltas}
+        set_['updated_at'] = func.now()
+        session.execute(stmt.on_conflict_do_update(index_elements=list(keys), set_=set_))
+        return
+
+    # Portable fallback for other backends
+    result = session.execute(
+        update(model)
+        .filter_by(**keys)
+        .values({getattr(model, name): getattr(model, name) + delta for name, delta in deltas.items()})
+    )
+    if result.rowcount == 0:
+        session.execute(insert(model).values(**keys, **deltas))
+
+def _insert_missing(session, model, keys):
+    """Inserts a row with just keys unless one exists. keys must be covered by a unique index on model."""
+    upsert_insert = _UPSERT_INSERTS.get(engine.dialect.name)
+    if upsert_insert is not None:
+        session.execute(upsert_insert(model).values(**keys).on_conflict_do_nothing(index_elements=list(keys)))
+    elif session.execute(select(model.id).filter_by(**keys)).first() is None:
+        # Portable fallback for other backends
+        session.execute(insert(model).values(**keys))
+
 class BaseModel(Base):
     """Base model with common functionality."""
     __abstract__ = True
@@ -63,20 +130,78 @@ class User(BaseModel):
         return f'<User {self.user_id} in guild {self.guild_id}>'
 
 class Activity(BaseModel):
-    """User activity information."""
+    """A user's lifetime message count from daily buckets that have been compacted."""
     __tablename__ = 'activity'
     
     user_id = Column(BigInteger, unique=True, nullable=False, index=True)
     message_count = Column(Integer, default=0)
 
-def get_or_create_activity(user_id):
-    with Session() as session:
-        activity = session.query(Activity).filter_by(user_id=user_id).first()
-        if not activity:
-            activity = Activity(user_id=user_id)
-            session.add(activity)
-            session.commit()
-        return activity
+class ActivityDay(BaseModel):
+    """Messages a user sent on one UTC day, counted in days since the epoch."""
+    __tablename__ = 'activity_days'
+    __table_args__ = (
+        Index('ix_activity_days_user_day', 'user_id', 'day', unique=True),
+    )
+
+    user_id = Column(BigInteger, nullable=False)
+    day = Column(Integer, nullable=False, index=True)
+    message_count = Column(Integer, default=0)
+
+def activity_day(when=None):
+    """The bucket number for a UTC datetime, or for today."""
+    when = when or datetime.utcnow()
+    return (when - datetime(1970, 1, 1)).days
+
+def _lifetime_counts():
+    """Compacted totals plus the daily buckets not yet compacted, as (user_id, message_count) rows."""
+    rows = union_all(
+        select(Activity.user_id, Activity.message_count),
+        select(ActivityDay.user_id, ActivityDay.message_count),
+    ).subquery()
+    return select(rows.c.user_id, func.sum(rows.c.message_count)).group_by(rows.c.user_id)
+
+def get_message_counts():
+    """Returns {user_id: lifetime message count} for every user with recorded activity, in one query."""
+    with session_scope() as session:
+        return dict(session.execute(_lifetime_counts()).all())
+
+def get_window_counts(days, today=None):
+    """Returns {user_id: messages} over the last `days` days, today included."""
+    today = activity_day() if today is None else today
+    with session_scope() as session:
+        return dict(session.execute(
+            select(ActivityDay.user_id, func.sum(ActivityDay.message_count))
+            .where(ActivityDay.day > today - days)
+            .group_by(ActivityDay.user_id)
+        ).all())
+
+def get_activity_buckets(days, today=None):
+    """Returns (user_id, day, message_count) rows for the last `days` days, today included."""
+    today = activity_day() if today is None else today
+    with session_scope() as session:
+        return session.execute(
+            select(ActivityDay.user_id, ActivityDay.day, ActivityDay.message_count)
+            .where(ActivityDay.day > today - days)
+        ).all()
+
+def compact_activity(retention_days, today=None):
+    """
+    Folds daily buckets older than retention_days into each user's lifetime total
+    and deletes them, in one transaction. Returns how many buckets were removed.
+    """
+    cutoff = (activity_day() if today is None else today) - retention_days
+    with session_scope() as session:
+        totals = session.execute(
+            select(ActivityDay.user_id, func.sum(ActivityDay.message_count))
+            .where(ActivityDay.day <= cutoff)
+            .group_by(ActivityDay.user_id)
+        ).all()
+        for user_id, total in totals:
+            _upsert_counters(session, Activity, {'user_id': user_id}, {'message_count': total})
+        removed = session.execute(delete(ActivityDay).where(ActivityDay.day <= cutoff)).rowcount
+    if removed:
+        logger.info(f'Compacted {removed} activity buckets for {len(totals)} users.')
+    return removed
 
 def add_channel_warning(channel_id, moderator_id, guild_id, reason, warning_type):
     """Adds a warning associated with a channel rather than a user."""
@@ -92,15 +217,41 @@ def add_channel_warning(channel_id, moderator_id, guild_id, reason, warning_type
         session.add(warning)
         logger.info(f'Logged a {warning_type} flag for channel {channel_id}.')
 
-def increment_message_count(user_id):
-    with Session() as session:
-        activity = get_or_create_activity(user_id)
-        activity.message_count += 1
-        session.commit()
+def get_channel_warnings(guild_id, channel_id, limit=10, offset=0):
+    """Gets one page of a channel's flag history, newest first."""
+    with session_scope() as session:
+        return (
+            session.query(Warning)
+            .filter_by(guild_id=guild_id, channel_id=channel_id)
+            .order_by(Warning.created_at.desc(), Warning.id.desc())
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+
+def count_channel_warnings(guild_id, channel_id):
+    with session_scope() as session:
+        return session.query(func.count(Warning.id)).filter_by(guild_id=guild_id, channel_id=channel_id).scalar()
+
+def increment_message_count(user_id, day=None):
+    day = activity_day() if day is None else day
+    with session_scope() as session:
+        _upsert_counters(session, ActivityDay, {'user_id': user_id, 'day': day}, {'message_count': 1})
+
+def increment_message_counts(message_counts, day=None):
+    """Adds buffered {user_id: messages} counts to a day's buckets in one transaction."""
+    day = activity_day() if day is None else day
+    with session_scope() as session:
+        for user_id, delta in message_counts.items():
+            _upsert_counters(session, ActivityDay, {'user_id': user_id, 'day': day}, {'message_count': delta})
 
 class Warning(BaseModel):
     """Warning information for users."""
     __tablename__ = 'warnings'
+    __table_args__ = (
+        # Covers SAM's per-channel moderation count for a time window
+        Index('ix_warnings_guild_channel_created', 'guild_id', 'channel_id', 'created_at'),
+    )
     
     user_id = Column(BigInteger, ForeignKey('users.id'), nullable=True) # Can be null for channel warnings
     guild_id = Column(BigInteger, nullable=False, index=True)
@@ -116,36 +267,132 @@ class Warning(BaseModel):
     def __repr__(self):
         return f'<{self.warning_type.capitalize()} warning for user {self.user_id} in guild {self.guild_id}>'
 
+class WarningRollup(BaseModel):
+    """Monthly warning counts kept after the individual warnings are archived."""
+    __tablename__ = 'warning_rollups'
+    __table_args__ = (
+        Index('ix_warning_rollups_key', 'guild_id', 'channel_id', 'warning_type', 'month', unique=True),
+    )
+
+    guild_id = Column(BigInteger, nullable=False)
+    channel_id = Column(BigInteger, nullable=False, default=0)  # 0 for warnings not tied to a channel
+    warning_type = Column(String(20), nullable=False)
+    month = Column(String(7), nullable=False)  # 'YYYY-MM'
+    warning_count = Column(Integer, default=0)
+
+class MemberDeparture(BaseModel):
+    """A user who is no longer in any of the bot's guilds, and since when."""
+    __tablename__ = 'member_departures'
+
+    user_id = Column(BigInteger, unique=True, nullable=False, index=True)
+    left_at = Column(DateTime, nullable=False, index=True)
+
 class GraduationQueue(BaseModel):
     """A queue of users to be graduated by the bot."""
     __tablename__ = 'graduation_queue'
     
-    user_id = Column(BigInteger, primary_key=True)
+    user_id = Column(BigInteger, unique=True, nullable=False, index=True)
     added_at = Column(DateTime, default=datetime.utcnow)
 
 class TomatoStats(BaseModel):
     """Statistics for the tomato throwing game."""
     __tablename__ = 'tomato_stats'
 
-    user_id = Column(BigInteger, primary_key=True)
-    tomatoes_thrown = Column(Integer, default=0)
-    tomatoes_landed = Column(Integer, default=0)
-    tomatoes_dodged = Column(Integer, default=0)
-    times_hit = Column(Integer, default=0)
+    user_id = Column(BigInteger, unique=True, nullable=False, index=True)
+    # Leaderboard columns are indexed so top-N queries don't sort the whole table
+    tomatoes_thrown = Column(Integer, default=0, index=True)
+    tomatoes_landed = Column(Integer, default=0, index=True)
+    tomatoes_dodged = Column(Integer, default=0, index=True)
+    times_hit = Column(Integer, default=0, index=True)
     claimed_starter = Column(Boolean, default=False)
     coins = Column(Integer, default=0)
     last_daily_claim = Column(DateTime, nullable=True)
     message_count = Column(Integer, default=0)
+    next_reward_at = Column(Integer, nullable=True)  # message_count that triggers the next activity reward
+
+class TomatoItem(BaseModel):
+    """Catalog of tomato game items."""
+    __tablename__ = 'tomato_items'
+
+    name = Column(String(50), unique=True, nullable=False)
+    loot_weight = Column(Float, default=0.0)
+
+    def __repr__(self):
+        return f'<TomatoItem {self.id}: {self.name}>'
 
 class TomatoInventory(BaseModel):
     """Inventory for the tomato throwing game."""
     __tablename__ = 'tomato_inventory'
+    __table_args__ = (
+        Index('ix_tomato_inventory_user_item', 'user_id', 'item_id', unique=True),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(BigInteger, nullable=False)
-    item_name = Column(String, nullable=False)
+    item_id = Column(Integer, ForeignKey('tomato_items.id'), nullable=False)
     quantity = Column(Integer, default=1)
 
+    @property
+    def item_name(self):
+        return item_catalog.name_for(self.item_id)
+
+class PendingThrow(BaseModel):
+    """A thrown tomato waiting for its dodge window to close."""
+    __tablename__ = 'pending_throws'
+
+    thrower_id = Column(BigInteger, nullable=False)
+    target_id = Column(BigInteger, nullable=False)
+    item_name = Column(String(50), nullable=False)
+    channel_id = Column(BigInteger, nullable=False)
+    message_id = Column(BigInteger, nullable=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+class ItemCatalog:
+    """In-memory copy of the tomato_items table, loaded once at startup."""
+
+    def __init__(self):
+        self.ids = {}
+        self.names = {}
+        self.loot_weights = {}
+        self.loaded = False
+
+    def load(self):
+        """Load the catalog, seeding any items from config.TOMATO_ITEMS that are missing."""
+        with session_scope() as session:
+            known = {name for (name,) in session.query(TomatoItem.name)}
+            for name, weight in TOMATO_ITEMS.items():
+                if name not in known:
+                    session.add(TomatoItem(name=name, loot_weight=weight))
+            session.flush()
+            items = session.query(TomatoItem).order_by(TomatoItem.id).all()
+
+        self.ids = {item.name: item.id for item in items}
+        self.names = {item.id: item.name for item in items}
+        self.loot_weights = {item.name: item.loot_weight for item in items if item.loot_weight > 0}
+        self.loaded = True
+        logger.info(f'Loaded {len(items)} items into the tomato item catalog.')
+
+    def _ensure_loaded(self):
+        if not self.loaded:
+            self.load()
+
+    def id_for(self, item_name):
+        """Returns the catalog ID for an item name, or None if it is unknown."""
+        self._ensure_loaded()
+        return self.ids.get(item_name)
+
+    def name_for(self, item_id):
+        self._ensure_loaded()
+        return self.names.get(item_id)
+
+    def loot_table(self):
+        """Returns {item_name: weight} for every item that can drop from a lootbox."""
+        self._ensure_loaded()
+        return dict(self.loot_weights)
+
+# Singleton instance of the catalog
+item_catalog = ItemCatalog()
+
 
 class GuildSettings(BaseModel):
     """Guild-specific settings."""
@@ -157,10 +404,158 @@ class GuildSettings(BaseModel):
     welcome_message = Column(Text, default='Welcome {user.mention} to {guild.name}!')
     mod_role = Column(BigInteger, nullable=True)
     admin_role = Column(BigInteger, nullable=True)
+    waiting_room_channel = Column(BigInteger, nullable=True)
+    unapproved_role = Column(BigInteger, nullable=True)
+    member_role = Column(BigInteger, nullable=True)
+    new_in_town_role = Column(BigInteger, nullable=True)
+    welcome_wagon_role = Column(BigInteger, nullable=True)
+    graduation_threshold = Column(Integer, nullable=True)
+    graduation_report_channel = Column(BigInteger, nullable=True)
+    flag_moderator_roles = Column(Text, nullable=True)  # JSON list of role IDs
+    flag_notify_users = Column(Text, nullable=True)  # JSON list of user IDs
     
     def __repr__(self):
         return f'<GuildSettings for guild {self.guild_id}>'
 
+# Settings that can be changed per guild; JSON-encoded list columns are decoded in the cache
+GUILD_SETTING_FIELDS = (
+    'mod_log_channel', 'welcome_channel', 'welcome_message', 'mod_role', 'admin_role',
+    'waiting_room_channel', 'unapproved_role', 'member_role', 'new_in_town_role',
+    'welcome_wagon_role', 'graduation_threshold', 'graduation_report_channel',
+    'flag_moderator_roles', 'flag_notify_users',
+)
+_LIST_SETTINGS = {'flag_moderator_roles', 'flag_notify_users'}
+
+# Unset settings fall back to these for every guild...
+_GUILD_DEFAULTS = {
+    'graduation_threshold': WELCOME_GRADUATION_THRESHOLD,
+}
+# ...and, for GUILD_ID only, to the IDs in config.py so single-guild setups keep working
+_HOME_GUILD_DEFAULTS = {
+    **_GUILD_DEFAULTS,
+    'waiting_room_channel': APPROVAL_WAITING_ROOM_CHANNEL_ID,
+    'unapproved_role': APPROVAL_UNAPPROVED_ROLE_ID,
+    'member_role': APPROVAL_MEMBER_ROLE_ID,
+    'new_in_town_role': WELCOME_NEW_IN_TOWN_ROLE_ID,
+    'welcome_wagon_role': WELCOME_WAGON_ROLE_ID,
+    'graduation_report_channel': WELCOME_REPORT_CHANNEL_ID,
+    'flag_moderator_roles': FLAG_MODERATOR_ROLE_IDS,
+    'flag_notify_users': FLAG_NOTIFY_USER_IDS,
+}
+
+class GuildSettingsCache:
+    """
+    In-memory copy of the guild_settings table, so cogs can resolve per-guild
+    IDs on every event without a query. Writes go through update(), which saves
+    the row and refreshes the cached copy.
+    """
+
+    def __init__(self):
+        self.settings = {}
+        self.last_updated = None
+        self.loaded = False
+
+    def load(self):
+        """Load every guild's settings; later calls only read rows changed since the last load."""
+        with session_scope() as session:
+            query = session.query(GuildSettings)
+            if self.last_updated is not None:
+                query = query.filter(GuildSettings.updated_at >= self.last_updated)
+            rows = query.all()
+            for row in rows:
+                self._store(row)
+        if not self.loaded:
+            logger.info(f'Loaded settings for {len(rows)} guilds.')
+        self.loaded = True
+
+    def _store(self, row):
+        values = {}
+        for field in GUILD_SETTING_FIELDS:
+            value = getattr(row, field)
+            if field in _LIST_SETTINGS and value is not None:
+                value = json.loads(value)
+            values[field] = value
+        self.settings[row.guild_id] = values
+        if row.updated_at and (self.last_updated is None or row.updated_at > self.last_updated):
+            self.last_updated = row.updated_at
+
+    def get(self, guild_id, field):
+        """Returns a guild's setting, its default if unset, or None (an empty list for list settings)."""
+        if not self.loaded:
+            self.load()
+        value = self.settings.get(guild_id, {}).get(field)
+        if value is None:
+            defaults = _HOME_GUILD_DEFAULTS if guild_id == GUILD_ID else _GUILD_DEFAULTS
+            value = defaults.get(field)
+        if value is None and field in _LIST_SETTINGS:
+            return []
+        return value
+
+    def all(self, guild_id):
+        """Returns every setting for a guild, with defaults applied."""
+        return {field: self.get(guild_id, field) for field in GUILD_SETTING_FIELDS}
+
+    def update(self, guild_id, **values):
+        """
+        Saves settings for a guild and updates the cache. Pass None to clear a
+        setting back to its default. Raises ValueError for unknown settings.
+        """
+        unknown = set(values) - set(GUILD_SETTING_FIELDS)
+        if unknown:
+            raise ValueError(f'Unknown guild settings: {", ".join(sorted(unknown))}')
+
+        columns = {
+            field: json.dumps(value) if field in _LIST_SETTINGS and value is not None else value
+            for field, value in values.items()
+        }
+        with session_scope() as session:
+            row = session.query(GuildSettings).filter_by(guild_id=guild_id).first()
+            if row is None:
+                row = GuildSettings(guild_id=guild_id)
+                session.add(row)
+            for field, value in columns.items():
+                setattr(row, field, value)
+            session.flush()
+            session.refresh(row)
+        # Only cache the row once it is committed
+        self._store(row)
+        return self.all(guild_id)
+
+# Singleton instance of the guild settings cache
+guild_settings = GuildSettingsCache()
+
+class SharedState(BaseModel):
+    """JSON snapshots the bot publishes for a dashboard running in another process."""
+    __tablename__ = 'shared_state'
+
+    key = Column(String(100), unique=True, nullable=False)
+    payload = Column(Text, nullable=False)
+
+def set_shared_state(snapshots):
+    """Writes {key: JSON-serializable value} snapshots in one transaction."""
+    upsert_insert = _UPSERT_INSERTS.get(engine.dialect.name)
+    with session_scope() as session:
+        for key, value in snapshots.items():
+            payload = json.dumps(value)
+            if upsert_insert is not None:
+                stmt = upsert_insert(SharedState).values(key=key, payload=payload)
+                session.execute(stmt.on_conflict_do_update(
+                    index_elements=['key'],
+                    set_={'payload': stmt.excluded.payload, 'updated_at': func.now()},
+                ))
+            elif session.execute(
+                update(SharedState).where(SharedState.key == key).values(payload=payload, updated_at=func.now())
+            ).rowcount == 0:
+                session.execute(insert(SharedState).values(key=key, payload=payload))
+
+def get_shared_state(key):
+    """Returns (value, updated_at) for a snapshot, or (None, None) if it was never published."""
+    with session_scope() as session:
+        row = session.execute(
+            select(SharedState.payload, SharedState.updated_at).where(SharedState.key == key)
+        ).first()
+        return (json.loads(row.payload), row.updated_at) if row else (None, None)
+
 def add_to_graduation_queue(user_id):
     """Adds a user to the graduation queue."""
     with session_scope() as session:
@@ -173,95 +568,269 @@ def add_to_graduation_queue(user_id):
             return True
         return False
 
+class TomatoTransaction:
+    """
+    A unit of work for a tomato game action.
+
+    Every method runs a single conditional statement against the shared session,
+    so a whole action (balance check, debit and grant) commits or rolls back
+    together. Checks happen in the WHERE clause rather than in Python, which keeps
+    a double-clicked command from spending the same coins or items twice.
+    """
+
+    def __init__(self, session):
+        self.session = session
+
+    def _stats_exist(self, user_id):
+        return self.session.execute(
+            select(TomatoStats.id).where(TomatoStats.user_id == user_id)
+        ).first() is not None
+
+    def add_stats(self, user_id, **deltas):
+        """Adds to one or more stat counters, creating the user's row if needed."""
+        for stat_name in deltas:
+            if stat_name not in TomatoStats.__table__.columns:
+                raise ValueError(f'Unknown tomato stat: {stat_name}')
+
+        _upsert_counters(self.session, TomatoStats, {'user_id': user_id}, deltas)
+
+    def claim_daily(self, user_id, coins, cooldown):
+        """Credits the daily coins only if the last claim was at least cooldown ago. Returns False otherwise."""
+        now = datetime.utcnow()
+        _insert_missing(self.session, TomatoStats, {'user_id': user_id})
+        result = self.session.execute(
+            update(TomatoStats)
+            .where(
+                TomatoStats.user_id == user_id,
+                or_(TomatoStats.last_daily_claim.is_(None), TomatoStats.last_daily_claim <= now - cooldown),
+            )
+            .values(coins=TomatoStats.coins + coins, last_daily_claim=now)
+        )
+        return result.rowcount == 1
+
+    def spend_coins(self, user_id, amount):
+        """Debits coins only if the balance covers it. Returns False otherwise."""
+        result = self.session.execute(
+            update(TomatoStats)
+            .where(TomatoStats.user_id == user_id, TomatoStats.coins >= amount)
+            .values(coins=TomatoStats.coins - amount)
+        )
+        return result.rowcount == 1
+
+    def claim_starter(self, user_id):
+        """Marks the starter pack as claimed. Returns False if it already was."""
+        result = self.session.execute(
+            update(TomatoStats)
+            .where(TomatoStats.user_id == user_id, TomatoStats.claimed_starter.is_(False))
+            .values(claimed_starter=True)
+        )
+        if result.rowcount == 1:
+            return True
+        if self._stats_exist(user_id):
+            return False
+        self.session.execute(insert(TomatoStats).values(user_id=user_id, claimed_starter=True))
+        return True
+
+    def take_item(self, user_id, item_name, quantity=1):
+        """Removes items only if the user holds enough. Returns False otherwise."""
+        item_id = item_catalog.id_for(item_name)
+        if item_id is None:
+            return False
+        remaining = self.session.execute(
+            update(TomatoInventory)
+            .where(
+                TomatoInventory.user_id == user_id,
+                TomatoInventory.item_id == item_id,
+                TomatoInventory.quantity >= quantity,
+            )
+            .values(quantity=TomatoInventory.quantity - quantity)
+            .returning(TomatoInventory.quantity)
+        ).scalar()
+        if remaining is None:
+            return False
+        if remaining == 0:
+            self.session.execute(
+                delete(TomatoInventory).where(
+                    TomatoInventory.user_id == user_id,
+                    TomatoInventory.item_id == item_id,
+                    TomatoInventory.quantity <= 0,
+                )
+            )
+        return True
+
+    def give_item(self, user_id, item_name, quantity=1):
+        """Adds items to a user's inventory with a single upsert."""
+        item_id = item_catalog.id_for(item_name)
+        if item_id is None:
+            raise ValueError(f'Unknown tomato item: {item_name}')
+        _upsert_counters(self.session, TomatoInventory, {'user_id': user_id, 'item_id': item_id}, {'quantity': quantity})
+
+    def add_pending_throw(self, thrower_id, target_id, item_name, channel_id, expires_at):
+        """Records a throw awaiting resolution and returns it with its ID assigned."""
+        throw = PendingThrow(
+            thrower_id=thrower_id,
+            target_id=target_id,
+            item_name=item_name,
+            channel_id=channel_id,
+            expires_at=expires_at,
+        )
+        self.session.add(throw)
+        self.session.flush()
+        return throw
+
+@contextmanager
+def tomato_transaction():
+    """Run a tomato game action as a single transaction."""
+    with session_scope() as session:
+        yield TomatoTransaction(session)
+
 def claim_starter_tomatoes(user_id):
     """Gives a user their starter tomatoes if they haven't claimed them yet."""
-    with session_scope() as session:
-        stats = get_or_create_tomato_stats(user_id)
-        if not stats.claimed_starter:
-            stats.claimed_starter = True
-            add_to_inventory(user_id, 'Regular Tomato', 5)
-            logger.info(f'User {user_id} claimed their starter tomatoes.')
-            return True
-        return False
+    with tomato_transaction() as tx:
+        if not tx.claim_starter(user_id):
+            return False
+        tx.give_item(user_id, 'Regular Tomato', 5)
+        logger.info(f'User {user_id} claimed their starter tomatoes.')
+        return True
+
+# Using 22 hours to give a bit of leeway
+DAILY_CLAIM_COOLDOWN = timedelta(hours=22)
 
 def process_daily_claim(user_id):
     """Processes a daily claim for a user. Returns (success, message_or_coins)."""
-    with session_scope() as session:
-        stats = get_or_create_tomato_stats(user_id)
-        now = datetime.utcnow()
-        # Using 22 hours to give a bit of leeway
-        if stats.last_daily_claim and (now - stats.last_daily_claim) < timedelta(hours=22):
-            time_left = timedelta(hours=22) - (now - stats.last_daily_claim)
-            # Format the timedelta to be more readable
-            hours, remainder = divmod(time_left.seconds, 3600)
-            minutes, _ = divmod(remainder, 60)
-            return (False, f"You can claim again in {hours}h {minutes}m.")
-
-        # Grant reward
-        daily_coins = random.randint(50, 150)
-        stats.coins += daily_coins
-        stats.last_daily_claim = now
-        logger.info(f"User {user_id} claimed daily reward of {daily_coins} coins.")
-        return (True, daily_coins)
+    daily_coins = random.randint(50, 150)
+    with tomato_transaction() as tx:
+        if tx.claim_daily(user_id, daily_coins, DAILY_CLAIM_COOLDOWN):
+            logger.info(f"User {user_id} claimed daily reward of {daily_coins} coins.")
+            return (True, daily_coins)
+        last_claim = tx.session.execute(
+            select(TomatoStats.last_daily_claim).where(TomatoStats.user_id == user_id)
+        ).scalar()
+
+    time_left = max(DAILY_CLAIM_COOLDOWN - (datetime.utcnow() - last_claim), timedelta(0))
+    # Format the timedelta to be more readable
+    hours, remainder = divmod(time_left.seconds, 3600)
+    minutes, _ = divmod(remainder, 60)
+    return (False, f"You can claim again in {hours}h {minutes}m.")
+
+def _get_or_create_tomato_stats(session, user_id):
+    stats = session.query(TomatoStats).filter_by(user_id=user_id).first()
+    if stats:
+        return stats
+    # Another thread may create the row first; then the insert is a no-op and the row is read instead
+    upsert_insert = _UPSERT_INSERTS.get(engine.dialect.name)
+    if upsert_insert is not None:
+        stats = session.execute(
+            upsert_insert(TomatoStats).values(user_id=user_id)
+            .on_conflict_do_nothing(index_elements=['user_id'])
+            .returning(TomatoStats)
+        ).scalar()
+    else:
+        _insert_missing(session, TomatoStats, {'user_id': user_id})
+    return stats or session.query(TomatoStats).filter_by(user_id=user_id).one()
 
 def get_or_create_tomato_stats(user_id):
     """Gets or creates a user's tomato stats entry."""
     with session_scope() as session:
-        stats = session.query(TomatoStats).filter_by(user_id=user_id).first()
-        if not stats:
-            stats = TomatoStats(user_id=user_id)
-            session.add(stats)
-            session.commit()
-        return stats
+        return _get_or_create_tomato_stats(session, user_id)
 
 def increment_tomato_stat(user_id, stat_name, value=1):
     """Increments a specific tomato stat for a user."""
+    if stat_name not in TomatoStats.__table__.columns:
+        logger.error(f'Stat {stat_name} not found for user {user_id}.')
+        return
+    with tomato_transaction() as tx:
+        tx.add_stats(user_id, **{stat_name: value})
+        logger.info(f'Incremented {stat_name} for user {user_id} by {value}.')
+
+def get_activity_milestone(user_id):
+    """Returns (message_count, next_reward_at) for a user, or (0, None) if they have no stats yet."""
     with session_scope() as session:
-        stats = get_or_create_tomato_stats(user_id)
-        if hasattr(stats, stat_name):
-            setattr(stats, stat_name, getattr(stats, stat_name) + value)
-            logger.info(f'Incremented {stat_name} for user {user_id} by {value}.')
-        else:
-            logger.error(f'Stat {stat_name} not found for user {user_id}.')
+        row = session.execute(
+            select(TomatoStats.message_count, TomatoStats.next_reward_at).where(TomatoStats.user_id == user_id)
+        ).first()
+        return (row.message_count or 0, row.next_reward_at) if row else (0, None)
+
+def flush_activity_milestones(message_counts, milestones):
+    """
+    Writes buffered activity in one transaction.
+    message_counts maps user_id to messages to add; milestones maps user_id to their next_reward_at.
+    """
+    with tomato_transaction() as tx:
+        for user_id, delta in message_counts.items():
+            tx.add_stats(user_id, message_count=delta)
+        for user_id, next_reward_at in milestones.items():
+            tx.session.execute(
+                update(TomatoStats)
+                .where(TomatoStats.user_id == user_id)
+                .values(next_reward_at=next_reward_at)
+            )
+    logger.info(f'Flushed activity for {len(message_counts)} users.')
+
+def set_pending_throw_message(throw_id, message_id):
+    """Records which message announced a pending throw."""
+    with session_scope() as session:
+        session.execute(update(PendingThrow).where(PendingThrow.id == throw_id).values(message_id=message_id))
 
-def get_leaderboard(stat_name, limit=10):
-    """Gets the leaderboard for a specific stat."""
+def get_pending_throws():
+    """Gets every unresolved throw, soonest expiry first."""
+    with session_scope() as session:
+        return session.query(PendingThrow).order_by(PendingThrow.expires_at).all()
+
+def resolve_pending_throws(throw_ids, stat_deltas):
+    """
+    Resolves a batch of throws in one transaction.
+    stat_deltas maps user_id to {stat_name: delta} for every user affected by the batch.
+    """
+    with tomato_transaction() as tx:
+        for user_id, deltas in stat_deltas.items():
+            tx.add_stats(user_id, **deltas)
+        tx.session.execute(delete(PendingThrow).where(PendingThrow.id.in_(throw_ids)))
+    logger.info(f'Resolved {len(throw_ids)} tomato throws.')
+
+def get_leaderboard(stat_name, limit=10, offset=0):
+    """Gets one page of the leaderboard for a specific stat."""
     with session_scope() as session:
         if not hasattr(TomatoStats, stat_name):
             return []
-        return session.query(TomatoStats).order_by(getattr(TomatoStats, stat_name).desc()).limit(limit).all()
+        return (
+            session.query(TomatoStats)
+            .order_by(getattr(TomatoStats, stat_name).desc(), TomatoStats.user_id)
+            .offset(offset)
+            .limit(limit)
+            .all()
+        )
+
+def count_tomato_players():
+    """Number of users with tomato stats, i.e. leaderboard entries."""
+    with session_scope() as session:
+        return session.query(func.count(TomatoStats.id)).scalar()
 
 def get_inventory(user_id):
     """Gets a user's entire inventory."""
     with session_scope() as session:
-        return session.query(TomatoInventory).filter_by(user_id=user_id).all()
+        return session.query(TomatoInventory).filter_by(user_id=user_id).order_by(TomatoInventory.item_id).all()
 
 def get_item_from_inventory(user_id, item_name):
     """Gets a specific item from a user's inventory."""
+    item_id = item_catalog.id_for(item_name)
+    if item_id is None:
+        return None
     with session_scope() as session:
-        return session.query(TomatoInventory).filter_by(user_id=user_id, item_name=item_name).first()
+        return session.query(TomatoInventory).filter_by(user_id=user_id, item_id=item_id).first()
 
 def remove_from_inventory(user_id, item_name, quantity=1):
     """Removes an item from a user's inventory. Returns False if not enough items."""
-    with session_scope() as session:
-        item = session.query(TomatoInventory).filter_by(user_id=user_id, item_name=item_name).first()
-        if item and item.quantity >= quantity:
-            item.quantity -= quantity
-            if item.quantity == 0:
-                session.delete(item)
-            logger.info(f'Removed {quantity} {item_name}(s) from inventory for user {user_id}.')
-            return True
-        return False
+    with tomato_transaction() as tx:
+        if not tx.take_item(user_id, item_name, quantity):
+            return False
+        logger.info(f'Removed {quantity} {item_name}(s) from inventory for user {user_id}.')
+        return True
 
 def add_to_inventory(user_id, item_name, quantity=1):
     """Adds an item to a user's inventory."""
-    with session_scope() as session:
-        item = session.query(TomatoInventory).filter_by(user_id=user_id, item_name=item_name).first()
-        if item:
-            item.quantity += quantity
-        else:
-            item = TomatoInventory(user_id=user_id, item_name=item_name, quantity=quantity)
-            session.add(item)
+    with tomato_transaction() as tx:
+        tx.give_item(user_id, item_name, quantity)
         logger.info(f'Added {quantity} {item_name}(s) to inventory for user {user_id}.')
 
 def get_and_clear_graduation_queue():
@@ -279,12 +848,173 @@ def get_and_clear_graduation_queue():
         logger.info(f'Cleared {len(user_ids)} users from the graduation queue.')
         return user_ids
 
-def init_database():
-    """Initialize the database and create tables."""
+def record_departure(user_id):
+    """Marks a user as gone from every guild as of now."""
+    with session_scope() as session:
+        now = datetime.utcnow()
+        if session.execute(
+            update(MemberDeparture).where(MemberDeparture.user_id == user_id).values(left_at=now)
+        ).rowcount == 0:
+            session.execute(insert(MemberDeparture).values(user_id=user_id, left_at=now))
+
+def clear_departure(*user_ids):
+    """Forgets the departure of users who are back in a guild."""
+    with session_scope() as session:
+        session.execute(delete(MemberDeparture).where(MemberDeparture.user_id.in_(user_ids)))
+
+def get_departed_users():
+    """User IDs of everyone currently recorded as gone from every guild."""
+    with session_scope() as session:
+        return session.execute(select(MemberDeparture.user_id)).scalars().all()
+
+def archive_warnings(retention_days, batch_size=1000):
+    """
+    Folds warnings older than retention_days into monthly WarningRollup counts and
+    deletes them, one batch per transaction. Returns how many warnings were archived.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    archived = 0
+    while True:
+        with session_scope() as session:
+            rows = session.execute(
+                select(Warning.id, Warning.guild_id, Warning.channel_id, Warning.warning_type, Warning.created_at)
+                .where(Warning.created_at < cutoff)
+                .order_by(Warning.id)
+                .limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            counts = {}
+            for row in rows:
+                key = (row.guild_id, row.channel_id or 0, row.warning_type or 'yellow', row.created_at.strftime('%Y-%m'))
+                counts[key] = counts.get(key, 0) + 1
+            for (guild_id, channel_id, warning_type, month), count in counts.items():
+                _upsert_counters(
+                    session,
+                    WarningRollup,
+                    {'guild_id': guild_id, 'channel_id': channel_id, 'warning_type': warning_type, 'month': month},
+                    {'warning_count': count},
+                )
+            session.execute(delete(Warning).where(Warning.id.in_([row.id for row in rows])))
+        archived += len(rows)
+    if archived:
+        logger.info(f'Archived {archived} warnings older than {retention_days} days.')
+    return archived
+
+# Per-user tables cleared once a user has been gone for the grace period. Users and
+# their warnings are kept as the moderation record; old warnings are archived instead.
+_DEPARTED_USER_TABLES = (Activity, ActivityDay, TomatoStats, TomatoInventory, GraduationQueue)
+
+def prune_departed_users(grace_days, batch_size=500):
+    """
+    Deletes the per-user rows of users who left more than grace_days ago, one batch
+    per transaction. Returns how many users were pruned.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=grace_days)
+    pruned = 0
+    while True:
+        with session_scope() as session:
+            user_ids = session.execute(
+                select(MemberDeparture.user_id).where(MemberDeparture.left_at < cutoff).limit(batch_size)
+            ).scalars().all()
+            if not user_ids:
+                break
+            for model in _DEPARTED_USER_TABLES + (MemberDeparture,):
+                session.execute(delete(model).where(model.user_id.in_(user_ids)))
+        pruned += len(user_ids)
+    if pruned:
+        logger.info(f'Pruned data for {pruned} users who left more than {grace_days} days ago.')
+    return pruned
+
+def prune_graduation_queue(max_age_hours):
+    """Drops dashboard graduation requests the bot never picked up. Returns how many were dropped."""
+    cutoff = datetime.utcnow() - timedelta(hours=max_age_hours)
+    with session_scope() as session:
+        return session.execute(delete(GraduationQueue).where(GraduationQueue.added_at < cutoff)).rowcount
+
+def database_size():
+    """Size of the database in bytes, or None for backends it can't be measured on."""
+    with engine.connect() as conn:
+        if engine.dialect.name == 'sqlite':
+            page_count = conn.exec_driver_sql('PRAGMA page_count').scalar()
+            return page_count * conn.exec_driver_sql('PRAGMA page_size').scalar()
+        if engine.dialect.name == 'postgresql':
+            return conn.exec_driver_sql('SELECT pg_database_size(current_database())').scalar()
+    return None
+
+def optimize_storage(max_pages=None):
+    """
+    Returns free pages to the filesystem and refreshes the query planner's statistics.
+
+    SQLite databases are switched to incremental auto-vacuum the first time, which
+    needs one full VACUUM; after that only up to max_pages free pages (all when None)
+    are released per call. PostgreSQL gets VACUUM ANALYZE. Returns the bytes
+    reclaimed, or None when the size can't be measured.
+    """
+    before = database_size()
+    with engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        if engine.dialect.name == 'sqlite':
+            if conn.exec_driver_sql('PRAGMA auto_vacuum').scalar() != 2:
+                logger.info('Switching the database to incremental auto-vacuum; running a full VACUUM once.')
+                conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.exec_driver_sql('VACUUM')
+            else:
+                # sqlite3's execute() steps the pragma once, which frees a single page;
+                # executescript() runs it to completion
+                conn.connection.driver_connection.executescript(f'PRAGMA incremental_vacuum({int(max_pages or 0)});')
+            conn.exec_driver_sql('ANALYZE')
+        elif engine.dialect.name == 'postgresql':
+            conn.exec_driver_sql('VACUUM ANALYZE')
+        else:
+            conn.exec_driver_sql('ANALYZE')
+    after = database_size()
+    return before - after if before is not None and after is not None else None
+
+def _alembic_config():
+    from alembic.config import Config
     import os
-    os.makedirs('data', exist_ok=True)
-    Base.metadata.create_all(engine)
-    logger.info('Database initialized')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    alembic_cfg = Config(os.path.join(root, 'alembic.ini'))
+    alembic_cfg.set_main_option('script_location', os.path.join(root, 'migrations'))
+    return alembic_cfg
 
-# Initialize the database when this module is imported
-init_db()
+def init_database():
+    """
+    Initialize the database and bring the schema up to the latest migration.
+    Called once at startup (WLMBot.setup_hook) rather than on import, so importing
+    this module stays cheap.
+
+    Raises RuntimeError if the schema is behind and DATABASE_AUTO_MIGRATE is off.
+    """
+    import os
+    from alembic import command
+    from alembic.runtime.migration import MigrationContext
+    from alembic.script import ScriptDirectory
+    from sqlalchemy import inspect
+
+    if engine.dialect.name == 'sqlite':
+        os.makedirs('data', exist_ok=True)
+    alembic_cfg = _alembic_config()
+    head = ScriptDirectory.from_config(alembic_cfg).get_current_head()
+
+    with engine.begin() as connection:
+        current = MigrationContext.configure(connection).get_current_revision()
+        alembic_cfg.attributes['connection'] = connection
+
+        if current is None and inspect(connection).has_table(TomatoStats.__tablename__):
+            # Tables made by the old create_all() setup; adopt them as the initial revision,
+            # which is that setup's schema. 0001a then converts the tomato game tables.
+            logger.warning('Existing database has no migration history; stamping it as the initial schema.')
+            command.stamp(alembic_cfg, '0001')
+            current = '0001'
+
+        if current != head:
+            if not DATABASE_AUTO_MIGRATE:
+                raise RuntimeError(
+                    f'Database schema is at revision {current}, expected {head}. '
+                    'Run `alembic upgrade head` or enable DATABASE_AUTO_MIGRATE.'
+                )
+            logger.info(f'Migrating database from revision {current} to {head}.')
+            command.upgrade(alembic_cfg, 'head')
+
+    logger.info(f'Database initialized at schema revision {head}')
@@ -1,8 +1,15 @@
+import csv
+import io
 import discord
 import datetime
-from typing import Union, Optional
+from typing import List, Optional, Sequence, Union
 from discord.ext import commands
 
+# Discord's embed limits
+EMBED_DESCRIPTION_LIMIT = 4096
+EMBED_TOTAL_LIMIT = 6000  # Across every embed in one message
+EMBEDS_PER_MESSAGE = 10
+
 async def get_or_create_user(session, user_id: int, guild_id: int):
     """Get a user from the database or create them if they don't exist."""
     from utils.database import User
@@ -25,6 +32,19 @@ async def get_guild_settings(session, guild_id: int):
         session.commit()
     return settings
 
+async def ensure_chunked(guild: discord.Guild) -> None:
+    """
+    Load a guild's full member list if it hasn't been yet (see MEMBER_CHUNK_AT_STARTUP),
+    and rebuild its member snapshot from it.
+    """
+    from utils.members import member_store, refresh_guild
+    
+    if guild.chunked and guild.id in member_store.synced:
+        return
+    if not guild.chunked:
+        await guild.chunk()
+    await refresh_guild(member_store, guild)
+
 def format_time(dt: datetime.datetime) -> str:
     """Format a datetime object to a human-readable string."""
     return f'<t:{int(dt.timestamp())}:F> (<t:{int(dt.timestamp())}:R>)'
@@ -34,24 +54,27 @@ async def is_moderator(ctx: commands.Context) -> bool:
     if ctx.author.guild_permissions.administrator:
         return True
     
-    from utils.database import GuildSettings, session_scope
+    from utils.database import guild_settings
     
-    with session_scope() as session:
-        settings = await get_guild_settings(session, ctx.guild.id)
-        if not settings:
-            return False
-            
-        mod_role = settings.mod_role
-        admin_role = settings.admin_role
-        
-        if admin_role and any(role.id == admin_role for role in ctx.author.roles):
-            return True
-            
-        if mod_role and any(role.id == mod_role for role in ctx.author.roles):
+    for field in ('admin_role', 'mod_role'):
+        role_id = guild_settings.get(ctx.guild.id, field)
+        if role_id and ctx.author.get_role(role_id):
             return True
     
     return False
 
+def has_configured_role(field: str):
+    """Command check: the invoker must have the role stored in the guild's `field` setting."""
+    async def predicate(ctx: commands.Context) -> bool:
+        if ctx.guild is None:
+            raise commands.NoPrivateMessage()
+        from utils.database import guild_settings
+        role_id = guild_settings.get(ctx.guild.id, field)
+        if not role_id or not ctx.author.get_role(role_id):
+            raise commands.MissingRole(role_id or field)
+        return True
+    return commands.check(predicate)
+
 async def send_embed(
     ctx: commands.Context,
     title: str = None,
@@ -96,56 +119,98 @@ def info_embed(description: str, title: str = 'ℹ️ Info') -> discord.Embed:
         color=discord.Color.blue()
     )
 
+def chunk_lines(lines: Sequence[str], limit: int = EMBED_DESCRIPTION_LIMIT) -> List[str]:
+    """Join lines into as few newline-separated chunks of at most `limit` characters as possible."""
+    chunks, current, size = [], [], 0
+    for line in lines:
+        if len(line) > limit:
+            line = line[:limit - 1] + '…'
+        # +1 for the newline joining it to the previous line
+        if current and size + 1 + len(line) > limit:
+            chunks.append('\n'.join(current))
+            current, size = [], 0
+        size += len(line) + (1 if current else 0)
+        current.append(line)
+    if current:
+        chunks.append('\n'.join(current))
+    return chunks
+
+def build_report_embeds(title: str, lines: Sequence[str], color: Union[discord.Color, int] = None,
+                        limit: int = EMBED_DESCRIPTION_LIMIT) -> List[discord.Embed]:
+    """Split report lines across as many embeds as needed, numbering the titles when there is more than one."""
+    if color is None:
+        color = discord.Color.blue()
+    chunks = chunk_lines(lines, limit) or ['Nothing to report.']
+    if len(chunks) == 1:
+        return [discord.Embed(title=title, description=chunks[0], color=color)]
+    return [
+        discord.Embed(title=f'{title} ({number}/{len(chunks)})', description=chunk, color=color)
+        for number, chunk in enumerate(chunks, start=1)
+    ]
+
+def _group_embeds(embeds: List[discord.Embed]) -> List[List[discord.Embed]]:
+    """Pack embeds into messages within the per-message embed count and character limits."""
+    messages, current, size = [], [], 0
+    for embed in embeds:
+        if current and (len(current) == EMBEDS_PER_MESSAGE or size + len(embed) > EMBED_TOTAL_LIMIT):
+            messages.append(current)
+            current, size = [], 0
+        current.append(embed)
+        size += len(embed)
+    if current:
+        messages.append(current)
+    return messages
+
+async def send_report(
+    destination: discord.abc.Messageable,
+    title: str,
+    lines: Sequence[str],
+    color: Union[discord.Color, int] = None,
+    csv_header: Optional[Sequence[str]] = None,
+    csv_rows: Optional[Sequence[Sequence]] = None,
+    max_messages: int = 3,
+    view: Optional[discord.ui.View] = None,
+) -> List[discord.Message]:
+    """
+    Send a report of any length in a bounded number of messages.
+
+    Lines are packed into correctly sized embeds, several per message. If that
+    would take more than max_messages messages, the first embed is sent as a
+    preview with the full report attached as a CSV of csv_rows (or of the lines
+    themselves when no rows are given). A view is attached to the last message.
+    """
+    embeds = build_report_embeds(title, lines, color)
+    messages = _group_embeds(embeds)
+    if len(messages) <= max_messages:
+        sent = []
+        for number, group in enumerate(messages, start=1):
+            extra = {'view': view} if view is not None and number == len(messages) else {}
+            sent.append(await destination.send(embeds=group, **extra))
+        return sent
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    entries = len(csv_rows) if csv_rows is not None else len(lines)
+    if csv_rows is None:
+        csv_header, csv_rows = [title], [[line] for line in lines]
+    if csv_header:
+        writer.writerow(csv_header)
+    writer.writerows(csv_rows)
+    preview = embeds[0]
+    preview.title = title
+    preview.set_footer(text=f'Showing the first part of {entries} entries; the full report is attached.')
+    attachment = discord.File(io.BytesIO(buffer.getvalue().encode('utf-8')), filename=f'{_slugify(title)}.csv')
+    extra = {'view': view} if view is not None else {}
+    return [await destination.send(embed=preview, file=attachment, **extra)]
+
+def _slugify(text: str) -> str:
+    slug = ''.join(char.lower() if char.isalnum() else '-' for char in text)
+    return '-'.join(part for part in slug.split('-') if part) or 'report'
+
 async def paginate(ctx: commands.Context, pages: list, timeout: int = 60) -> None:
-    """Paginate a list of embeds or strings."""
+    """Paginate a list of embeds or strings with buttons."""
     if not pages:
         return
     
-    current_page = 0
-    message = await ctx.send(embed=pages[0] if isinstance(pages[0], discord.Embed) else pages[0])
-    
-    if len(pages) == 1:
-        return
-    
-    await message.add_reaction('⏮')
-    await message.add_reaction('◀')
-    await message.add_reaction('▶')
-    await message.add_reaction('⏭')
-    
-    def check(reaction, user):
-        return (
-            user == ctx.author
-            and reaction.message.id == message.id
-            and str(reaction.emoji) in ['⏮', '◀', '▶', '⏭']
-        )
-    
-    while True:
-        try:
-            reaction, user = await ctx.bot.wait_for('reaction_add', timeout=timeout, check=check)
-            
-            if str(reaction.emoji) == '⏮' and current_page != 0:
-                current_page = 0
-            elif str(reaction.emoji) == '◀' and current_page > 0:
-                current_page -= 1
-            elif str(reaction.emoji) == '▶' and current_page < len(pages) - 1:
-                current_page += 1
-            elif str(reaction.emoji) == '⏭' and current_page != len(pages) - 1:
-                current_page = len(pages) - 1
-            
-            try:
-                await message.remove_reaction(reaction, user)
-            except discord.Forbidden:
-                pass
-                
-            if isinstance(pages[current_page], discord.Embed):
-                await message.edit(embed=pages[current_page])
-            else:
-                await message.edit(content=pages[current_page])
-                
-        except asyncio.TimeoutError:
-            try:
-                await message.clear_reactions()
-            except discord.Forbidden:
-                for reaction in ['⏮', '◀', '▶', '⏭']:
-                    await message.remove_reaction(reaction, ctx.bot.user)
-            break
+    from utils.paginator import Paginator
+    await Paginator(pages.__getitem__, len(pages), timeout=timeout).start(ctx)
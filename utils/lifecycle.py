@@ -0,0 +1,44 @@
+import asyncio
+import contextlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Lifecycle:
+    """
+    Tracks in-flight background work so shutdown can let it finish.
+
+    Jobs run each unit of work that must not be cut in half (a database flush,
+    a pair of role changes, a Sheets update) inside `async with lifecycle.work():`.
+    Once shutdown starts, `stopping` is set: new commands are refused and long
+    jobs return at their next check, and drain() waits for the work already
+    running, up to a deadline.
+    """
+
+    def __init__(self):
+        self.stopping = False
+        self.active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    @contextlib.asynccontextmanager
+    async def work(self):
+        self.active += 1
+        self._idle.clear()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            if not self.active:
+                self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        """Stops accepting work and waits for running work. Returns False if the deadline passed first."""
+        self.stopping = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning(f'{self.active} background jobs still running after {timeout}s; shutting down anyway.')
+            return False
@@ -0,0 +1,87 @@
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of INFO-and-below records from noisy loggers.
+
+    rates maps a logger name (or package prefix) to the fraction of records to keep.
+    Warnings and errors always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or not self.rates:
+            return True
+        name = record.name
+        while name:
+            if name in self.rates:
+                return random.random() < self.rates[name]
+            name = name.rpartition('.')[0]
+        return True
+
+
+def setup_logging(level: str, log_file: str, fmt: str = 'text',
+                  sampling: Optional[Dict[str, float]] = None) -> logging.handlers.QueueListener:
+    """
+    Route all logging through a queue so the event loop never waits on file I/O.
+
+    Records are put on an in-memory queue by a QueueHandler on the root logger; a
+    QueueListener thread writes them to the rotating log file and stdout. Call
+    stop() on the returned listener at shutdown to flush what is left.
+    """
+    if fmt == 'json':
+        formatter = JsonFormatter()
+    else:
+        dtf = '%Y-%m-%d %H:%M:%S'
+        formatter = logging.Formatter('[{asctime}] [{levelname:<8}] {name}: {message}', dtf, style='{')
+
+    # File handler
+    file_handler = logging.handlers.RotatingFileHandler(
+        filename=log_file,
+        encoding='utf-8',
+        maxBytes=32 * 1024 * 1024,  # 32 MiB
+        backupCount=5,
+    )
+    file_handler.setFormatter(formatter)
+
+    # Console handler
+    console_handler = logging.StreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sampling or {}))
+
+    root = logging.getLogger()
+    root.setLevel(getattr(logging, level))
+    root.addHandler(queue_handler)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    return listener
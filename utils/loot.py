@@ -0,0 +1,63 @@
+import random
+from typing import Dict, List, Optional
+
+
+class AliasSampler:
+    """
+    Weighted sampler using Vose's alias method.
+
+    Building the tables is O(n) and is done once; every draw afterwards is O(1)
+    regardless of how many outcomes the table has.
+    """
+
+    def __init__(self, weights: Dict[str, float]):
+        outcomes = [(item, weight) for item, weight in weights.items() if weight > 0]
+        if not outcomes:
+            raise ValueError('A loot table needs at least one outcome with a positive weight.')
+
+        self.items = [item for item, _ in outcomes]
+        count = len(outcomes)
+        total = sum(weight for _, weight in outcomes)
+        scaled = [weight * count / total for _, weight in outcomes]
+
+        self.probabilities = [1.0] * count
+        self.aliases = list(range(count))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.probabilities[less] = scaled[less]
+            self.aliases[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+
+    def draw(self, rng: random.Random) -> str:
+        column = rng.randrange(len(self.items))
+        if rng.random() < self.probabilities[column]:
+            return self.items[column]
+        return self.items[self.aliases[column]]
+
+    def draw_many(self, rng: random.Random, k: int) -> List[str]:
+        return [self.draw(rng) for _ in range(k)]
+
+
+class LootEngine:
+    """A set of named loot tables compiled once and sampled from a shared RNG."""
+
+    def __init__(self, seed: Optional[int] = None):
+        # Pass a seed for reproducible draws in tests and simulations.
+        self.rng = random.Random(seed)
+        self.tables: Dict[str, AliasSampler] = {}
+
+    def register(self, name: str, weights: Dict[str, float]) -> None:
+        """Compile a loot table, replacing any existing table with the same name."""
+        self.tables[name] = AliasSampler(weights)
+
+    def draw(self, name: str) -> str:
+        """Draw a single outcome from the named table."""
+        return self.tables[name].draw(self.rng)
+
+    def draw_many(self, name: str, k: int) -> List[str]:
+        """Draw k outcomes from the named table in one pass."""
+        return self.tables[name].draw_many(self.rng, k)
@@ -0,0 +1,258 @@
+import asyncio
+import json
+import logging
+import os
+from array import array
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional
+
+import discord
+
+from config import MEMBER_SNAPSHOT_FILE
+
+logger = logging.getLogger(__name__)
+
+
+class GuildMemberSnapshots:
+    """
+    Column-oriented snapshot of one guild's members: the few fields the
+    dashboard and reports use, in typed arrays instead of discord.Member
+    objects. Roles are stored as one integer bitset per member, with bits
+    assigned to role IDs as they are first seen.
+    """
+
+    __slots__ = ('ids', 'joined', 'activity', 'names', 'display_names', 'avatars', 'roles', 'role_bits', 'rows')
+
+    def __init__(self):
+        self.ids = array('Q')
+        self.joined = array('d')  # POSIX timestamps, 0.0 when unknown
+        self.activity = array('L')
+        self.names: List[str] = []
+        self.display_names: List[str] = []
+        self.avatars: List[Optional[str]] = []
+        self.roles: List[int] = []
+        self.role_bits: Dict[int, int] = {}
+        self.rows: Dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _role_mask(self, role_ids) -> int:
+        mask = 0
+        for role_id in role_ids:
+            bit = self.role_bits.get(role_id)
+            if bit is None:
+                bit = self.role_bits[role_id] = len(self.role_bits)
+            mask |= 1 << bit
+        return mask
+
+    def upsert(self, member: discord.Member, activity: Optional[int] = None):
+        joined = member.joined_at.timestamp() if member.joined_at else 0.0
+        avatar = member.avatar.key if member.avatar else None
+        mask = self._role_mask(role.id for role in member.roles if not role.is_default())
+        row = self.rows.get(member.id)
+        if row is None:
+            self.rows[member.id] = len(self.ids)
+            self.ids.append(member.id)
+            self.joined.append(joined)
+            self.activity.append(activity or 0)
+            self.names.append(member.name)
+            self.display_names.append(member.display_name)
+            self.avatars.append(avatar)
+            self.roles.append(mask)
+            return
+        self.joined[row] = joined
+        self.names[row] = member.name
+        self.display_names[row] = member.display_name
+        self.avatars[row] = avatar
+        self.roles[row] = mask
+        if activity is not None:
+            self.activity[row] = activity
+
+    def update_user(self, user: discord.User) -> bool:
+        """Applies a username or avatar change; returns False if the user is not in this guild."""
+        row = self.rows.get(user.id)
+        if row is None:
+            return False
+        self.names[row] = user.name
+        self.avatars[row] = user.avatar.key if user.avatar else None
+        return True
+
+    def remove(self, user_id: int) -> bool:
+        """Removes a member by moving the last row into its place."""
+        row = self.rows.pop(user_id, None)
+        if row is None:
+            return False
+        last = len(self.ids) - 1
+        if row != last:
+            for column in (self.ids, self.joined, self.activity, self.names, self.display_names, self.avatars, self.roles):
+                column[row] = column[last]
+            self.rows[self.ids[row]] = row
+        for column in (self.ids, self.joined, self.activity, self.names, self.display_names, self.avatars, self.roles):
+            column.pop()
+        return True
+
+    def add_activity(self, user_id: int, count: int = 1) -> bool:
+        row = self.rows.get(user_id)
+        if row is None:
+            return False
+        self.activity[row] += count
+        return True
+
+    def has_role(self, user_id: int, role_id: int) -> bool:
+        row = self.rows.get(user_id)
+        bit = self.role_bits.get(role_id)
+        return row is not None and bit is not None and bool(self.roles[row] >> bit & 1)
+
+    def activity_of(self, user_id: int) -> int:
+        row = self.rows.get(user_id)
+        return self.activity[row] if row is not None else 0
+
+    def rows_with_role(self, role_id: int) -> Iterator[int]:
+        bit = self.role_bits.get(role_id)
+        if bit is None:
+            return
+        mask = 1 << bit
+        for row, roles in enumerate(self.roles):
+            if roles & mask:
+                yield row
+
+    def to_dict(self, row: int) -> dict:
+        user_id = self.ids[row]
+        avatar = self.avatars[row]
+        joined = self.joined[row]
+        return {
+            "id": user_id,
+            "name": self.names[row],
+            "display_name": self.display_names[row],
+            "avatar_url": _avatar_url(user_id, avatar) if avatar else None,
+            "joined_at": datetime.fromtimestamp(joined, timezone.utc).isoformat() if joined else None,
+            "message_count": self.activity[row],
+        }
+
+    def dump(self) -> dict:
+        return {
+            "ids": self.ids.tolist(),
+            "joined": self.joined.tolist(),
+            "activity": self.activity.tolist(),
+            "names": self.names,
+            "display_names": self.display_names,
+            "avatars": self.avatars,
+            "roles": self.roles,
+            "role_bits": {str(role_id): bit for role_id, bit in self.role_bits.items()},
+        }
+
+    @classmethod
+    def restore(cls, data: dict) -> 'GuildMemberSnapshots':
+        snapshots = cls()
+        snapshots.ids = array('Q', data['ids'])
+        snapshots.joined = array('d', data['joined'])
+        snapshots.activity = array('L', data['activity'])
+        snapshots.names = data['names']
+        snapshots.display_names = data['display_names']
+        snapshots.avatars = data['avatars']
+        snapshots.roles = data['roles']
+        snapshots.role_bits = {int(role_id): bit for role_id, bit in data['role_bits'].items()}
+        snapshots.rows = {user_id: row for row, user_id in enumerate(snapshots.ids)}
+        return snapshots
+
+
+def _avatar_url(user_id: int, key: str) -> str:
+    extension = 'gif' if key.startswith('a_') else 'png'
+    return f'{discord.Asset.BASE}/avatars/{user_id}/{key}.{extension}?size=1024'
+
+
+class MemberSnapshotStore:
+    """
+    Member snapshots for every guild, kept up to date from gateway events and
+    saved to disk, so reports and the dashboard can be answered without the
+    member cache, including right after a restart before the gateway is ready.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.guilds: Dict[int, GuildMemberSnapshots] = {}
+        # Guilds rebuilt from a full member list since startup, rather than loaded from disk
+        self.synced = set()
+        self.dirty = False
+
+    def sync_guild(self, guild: discord.Guild, activity_counts: Dict[int, int]):
+        """Rebuilds a guild's snapshot from its (fully loaded) member list."""
+        snapshots = GuildMemberSnapshots()
+        for member in guild.members:
+            snapshots.upsert(member, activity_counts.get(member.id, 0))
+        self.guilds[guild.id] = snapshots
+        self.synced.add(guild.id)
+        self.dirty = True
+
+    def upsert(self, member: discord.Member, activity: Optional[int] = None):
+        self.guilds.setdefault(member.guild.id, GuildMemberSnapshots()).upsert(member, activity)
+        self.dirty = True
+
+    def update_user(self, user: discord.User):
+        for snapshots in self.guilds.values():
+            self.dirty |= snapshots.update_user(user)
+
+    def remove(self, guild_id: int, user_id: int):
+        snapshots = self.guilds.get(guild_id)
+        if snapshots is not None:
+            self.dirty |= snapshots.remove(user_id)
+
+    def remove_guild(self, guild_id: int):
+        self.synced.discard(guild_id)
+        if self.guilds.pop(guild_id, None) is not None:
+            self.dirty = True
+
+    def add_activity(self, guild_id: int, user_id: int, count: int = 1):
+        snapshots = self.guilds.get(guild_id)
+        if snapshots is not None:
+            self.dirty |= snapshots.add_activity(user_id, count)
+
+    def member(self, guild_id: int, user_id: int) -> Optional[dict]:
+        snapshots = self.guilds.get(guild_id)
+        row = snapshots.rows.get(user_id) if snapshots is not None else None
+        return snapshots.to_dict(row) if row is not None else None
+
+    def members_with_role(self, guild_id: int, role_id: int) -> List[dict]:
+        """Raises LookupError if there is no snapshot for the guild."""
+        snapshots = self.guilds.get(guild_id)
+        if snapshots is None:
+            raise LookupError(f'No member snapshot for guild {guild_id}.')
+        return [snapshots.to_dict(row) for row in snapshots.rows_with_role(role_id)]
+
+    def dumps(self) -> str:
+        """Serializes the store; cheap enough to call on the event loop before writing in a thread."""
+        self.dirty = False
+        return json.dumps({str(guild_id): snapshots.dump() for guild_id, snapshots in self.guilds.items()})
+
+    def write(self, payload: str):
+        # Write to a temporary file first so a crash never leaves a truncated snapshot
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """Loads the snapshot saved by a previous run, if there is one."""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            logger.warning(f'Ignoring unreadable member snapshot {self.path}: {e}')
+            return
+        self.guilds = {int(guild_id): GuildMemberSnapshots.restore(dump) for guild_id, dump in data.items()}
+        logger.info(f'Loaded member snapshots for {len(self.guilds)} guilds from {self.path}.')
+
+
+
+async def refresh_guild(store: MemberSnapshotStore, guild: discord.Guild):
+    """Rebuilds a guild's snapshot, reading activity counts off the event loop."""
+    from utils.database import get_message_counts
+    counts = await asyncio.to_thread(get_message_counts)
+    store.sync_guild(guild, counts)
+
+
+# Singleton instance of the member snapshot store
+member_store = MemberSnapshotStore(MEMBER_SNAPSHOT_FILE)
@@ -0,0 +1,36 @@
+import os
+from typing import Optional
+
+import discord
+
+
+def process_memory_mb() -> Optional[float]:
+    """Current resident memory of this process in MiB, or None where /proc is unavailable."""
+    try:
+        with open('/proc/self/statm') as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def cache_stats(bot: discord.Client) -> dict:
+    """Sizes of discord.py's in-memory caches, gathered in one pass over the guilds."""
+    members = channels = roles = chunked = 0
+    for guild in bot.guilds:
+        members += len(guild.members)
+        channels += len(guild.channels)
+        roles += len(guild.roles)
+        chunked += guild.chunked
+    memory = process_memory_mb()
+    return {
+        "guilds": len(bot.guilds),
+        "guilds_chunked": chunked,
+        "members": members,
+        "users": len(bot.users),
+        "channels": channels,
+        "roles": roles,
+        "messages": len(bot.cached_messages),
+        "presences": bot.intents.presences,
+        "memory_mb": round(memory, 1) if memory is not None else None,
+    }
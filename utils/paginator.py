@@ -0,0 +1,115 @@
+import inspect
+from typing import Awaitable, Callable, Optional, Union
+
+import discord
+from discord.ext import commands
+
+from utils.cache import LRUCache
+from utils.tracing import span
+
+Page = Union[discord.Embed, str]
+PageSource = Callable[[int], Union[Page, Awaitable[Page]]]
+
+
+class Paginator(discord.ui.View):
+    """
+    Pages through content with buttons, rendering each page only when it is shown.
+
+    source(page) returns the embed or text for a zero-based page number and may be
+    a coroutine function, so a page can come straight from a database query with
+    an OFFSET. Rendered pages are kept in a small LRU cache, and turning a page is
+    a single edit of the original message.
+    """
+
+    def __init__(self, source: PageSource, page_count: int, author_id: Optional[int] = None,
+                 timeout: float = 120, cache_size: int = 16):
+        super().__init__(timeout=timeout)
+        self.source = source
+        self.page_count = max(page_count, 1)
+        self.author_id = author_id
+        self.page = 0
+        self.message: Optional[discord.Message] = None
+        self._rendered = LRUCache(cache_size)
+
+    async def render(self, page: int) -> dict:
+        """Returns the message kwargs for a page, rendering it if it isn't cached."""
+        content = self._rendered.get(page)
+        if content is None:
+            with span('render'):
+                content = self.source(page)
+                if inspect.isawaitable(content):
+                    content = await content
+            self._rendered[page] = content
+        if isinstance(content, discord.Embed):
+            return {'content': None, 'embed': content}
+        return {'content': content, 'embed': None}
+
+    def _update_buttons(self):
+        self.first.disabled = self.previous.disabled = self.page == 0
+        self.next.disabled = self.last.disabled = self.page >= self.page_count - 1
+        self.position.label = f'{self.page + 1}/{self.page_count}'
+
+    async def start(self, target: Union[commands.Context, discord.Interaction], ephemeral: bool = False) -> discord.Message:
+        """Sends the first page in reply to a command or interaction, visible only to its author if ephemeral."""
+        kwargs = await self.render(0)
+        if self.page_count > 1:
+            self._update_buttons()
+            kwargs['view'] = self
+        else:
+            self.stop()
+
+        if isinstance(target, discord.Interaction):
+            if self.author_id is None:
+                self.author_id = target.user.id
+            if target.response.is_done():
+                self.message = await target.followup.send(**kwargs, ephemeral=ephemeral, wait=True)
+            else:
+                await target.response.send_message(**kwargs, ephemeral=ephemeral)
+                self.message = await target.original_response()
+        else:
+            if self.author_id is None:
+                self.author_id = target.author.id
+            self.message = await target.send(**kwargs, ephemeral=ephemeral)
+        return self.message
+
+    async def _show(self, interaction: discord.Interaction, page: int):
+        self.page = min(max(page, 0), self.page_count - 1)
+        kwargs = await self.render(self.page)
+        self._update_buttons()
+        await interaction.response.edit_message(**kwargs, view=self)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.author_id:
+            await interaction.response.send_message('Only the person who ran this command can turn its pages.', ephemeral=True)
+            return False
+        return True
+
+    async def on_timeout(self):
+        if self.message is None:
+            return
+        for item in self.children:
+            item.disabled = True
+        try:
+            await self.message.edit(view=self)
+        except discord.HTTPException:
+            pass  # Message was deleted or is no longer editable
+
+    @discord.ui.button(label='⏮', style=discord.ButtonStyle.secondary)
+    async def first(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, 0)
+
+    @discord.ui.button(label='◀', style=discord.ButtonStyle.primary)
+    async def previous(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page - 1)
+
+    @discord.ui.button(label='1/1', style=discord.ButtonStyle.secondary, disabled=True)
+    async def position(self, interaction: discord.Interaction, button: discord.ui.Button):
+        pass
+
+    @discord.ui.button(label='▶', style=discord.ButtonStyle.primary)
+    async def next(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page + 1)
+
+    @discord.ui.button(label='⏭', style=discord.ButtonStyle.secondary)
+    async def last(self, interaction: discord.Interaction, button: discord.ui.Button):
+        await self._show(interaction, self.page_count - 1)
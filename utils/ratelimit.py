@@ -0,0 +1,49 @@
+import time
+from typing import Callable, Dict, Hashable, Tuple
+
+from utils.cache import LRUCache
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limits for named actions.
+
+    Each action is configured as (uses, per_seconds) and gets one bucket per key,
+    where a key is anything hashable: a user ID, a channel ID, or a tuple of both.
+    Checks are O(1). Buckets live in a bounded LRU, so memory stays flat no matter
+    how many users are seen; an evicted bucket simply starts full again.
+    """
+
+    def __init__(self, limits: Dict[str, Tuple[int, float]], max_keys: int = 10000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.limits = limits
+        self.clock = clock
+        # {(action, key): [tokens, last_refill]}
+        self._buckets = LRUCache(max_keys)
+
+    def hit(self, action: str, key: Hashable) -> float:
+        """
+        Consume one use of an action for a key.
+        Returns 0.0 if allowed, otherwise the seconds until the next use is available.
+        """
+        if action not in self.limits:
+            return 0.0
+        uses, per = self.limits[action]
+        refill_rate = uses / per
+        now = self.clock()
+
+        bucket = self._buckets.get((action, key))
+        if bucket is None:
+            bucket = [float(uses), now]
+            self._buckets[(action, key)] = bucket
+        else:
+            bucket[0] = min(float(uses), bucket[0] + (now - bucket[1]) * refill_rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / refill_rate
+
+    def reset(self, action: str, key: Hashable):
+        self._buckets.pop((action, key))
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import math
+from typing import AsyncIterator, Dict, List
+
+import discord
+
+logger = logging.getLogger(__name__)
+
+
+def shard_ids(bot: discord.Client) -> List[int]:
+    """IDs of the shards this process runs; [0] for an unsharded client."""
+    if isinstance(bot, discord.AutoShardedClient) and bot.shards:
+        return sorted(bot.shards)
+    return [bot.shard_id or 0]
+
+
+def guilds_by_shard(bot: discord.Client) -> Dict[int, List[discord.Guild]]:
+    """Groups the cached guilds by shard in a single pass."""
+    groups = {shard_id: [] for shard_id in shard_ids(bot)}
+    for guild in bot.guilds:
+        groups.setdefault(guild.shard_id, []).append(guild)
+    return groups
+
+
+def _shard_closed(bot: discord.Client, shard_id: int) -> bool:
+    if isinstance(bot, discord.AutoShardedClient):
+        shard = bot.get_shard(shard_id)
+        return shard is None or shard.is_closed()
+    return bot.is_closed()
+
+
+async def staggered_guilds(bot: discord.Client, spread: float) -> AsyncIterator[discord.Guild]:
+    """
+    Yields guilds shard by shard for periodic work, pausing between shards so
+    the run is spread over `spread` seconds instead of hitting every shard at
+    once. Shards that are disconnected are skipped until the next run.
+    With a single shard there is no pause at all.
+    """
+    groups = guilds_by_shard(bot)
+    gap = spread / len(groups)
+    for index, (shard_id, guilds) in enumerate(sorted(groups.items())):
+        if index:
+            await asyncio.sleep(gap)
+        if _shard_closed(bot, shard_id):
+            logger.warning(f'Shard {shard_id} is disconnected; skipping its {len(guilds)} guilds this run.')
+            continue
+        for guild in guilds:
+            yield guild
+
+
+def shard_health(bot: discord.Client) -> List[dict]:
+    """Latency and connection state for each shard, for /about and the dashboard."""
+    groups = guilds_by_shard(bot)
+    health = []
+    for shard_id in shard_ids(bot):
+        if isinstance(bot, discord.AutoShardedClient):
+            shard = bot.get_shard(shard_id)
+            latency = shard.latency if shard else float('nan')
+            rate_limited = shard.is_ws_ratelimited() if shard else False
+        else:
+            latency = bot.latency
+            rate_limited = bot.is_ws_ratelimited()
+        health.append({
+            "id": shard_id,
+            # latency is nan/inf until the first heartbeat is acknowledged
+            "latency_ms": round(latency * 1000) if math.isfinite(latency) else None,
+            "connected": not _shard_closed(bot, shard_id),
+            "rate_limited": rate_limited,
+            "guilds": len(groups.get(shard_id, [])),
+        })
+    return health
@@ -0,0 +1,176 @@
+import asyncio
+import contextvars
+import logging
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import discord
+
+from config import COMMAND_AUTO_DEFER_SECONDS, COMMAND_STATS_WINDOW
+
+logger = logging.getLogger(__name__)
+
+SPAN_KINDS = ('db', 'rest', 'render')
+
+_current_trace = contextvars.ContextVar('command_trace', default=None)
+
+
+class CommandTrace:
+    """Timing of one app command invocation, split into spans by kind."""
+
+    __slots__ = ('name', 'started', 'spans', 'auto_deferred', 'watchdog')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = time.perf_counter()
+        self.spans = Counter()
+        self.auto_deferred = False
+        self.watchdog: Optional[asyncio.Task] = None
+
+
+@contextmanager
+def span(kind: str):
+    """Adds the time spent in the block to the current command's span of this kind, if there is one."""
+    trace = _current_trace.get()
+    if trace is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace.spans[kind] += time.perf_counter() - start
+
+
+async def run_db(func, *args, **kwargs):
+    """Runs a blocking database helper in a thread, timed as a 'db' span."""
+    with span('db'):
+        return await asyncio.to_thread(func, *args, **kwargs)
+
+
+def instrument_http(http):
+    """Times every Discord REST request made on behalf of a command as a 'rest' span."""
+    request = http.request
+
+    async def timed_request(*args, **kwargs):
+        with span('rest'):
+            return await request(*args, **kwargs)
+
+    http.request = timed_request
+
+
+async def respond(interaction: discord.Interaction, content=None, **kwargs) -> Optional[int]:
+    """
+    Sends the reply to an interaction, as a followup if it was already deferred
+    (for example by the auto-defer). Returns the ID of the sent message when known.
+    """
+    if not interaction.response.is_done():
+        try:
+            callback = await interaction.response.send_message(content, **kwargs)
+            return callback.message_id
+        except discord.InteractionResponded:
+            pass
+        except discord.HTTPException as e:
+            if e.code != 40060:  # Acknowledged by the auto-defer while this request was in flight
+                raise
+    message = await interaction.followup.send(content, wait=True, **kwargs)
+    return message.id
+
+
+class _CommandStat:
+    __slots__ = ('count', 'errors', 'auto_defers', 'durations', 'spans', 'slowest')
+
+    def __init__(self, window: int):
+        self.count = 0
+        self.errors = 0
+        self.auto_defers = 0
+        self.durations = deque(maxlen=window)
+        self.spans = Counter()
+        self.slowest = 0.0
+
+
+class CommandStats:
+    """
+    Traces app commands and keeps rolling latency statistics per command.
+
+    start() is called just before a command runs. If the command hasn't replied
+    by COMMAND_AUTO_DEFER_SECONDS after Discord created the interaction, it is
+    deferred so the 3 second deadline is never missed; commands reply through
+    respond() so the reply goes to the right place either way.
+
+    A deferral fixes the visibility of every later reply, so only commands that
+    declare it with extras={'ephemeral': True or False} are auto-deferred.
+    Commands whose replies mix public and ephemeral messages leave it out and
+    must reply in time themselves.
+    """
+
+    def __init__(self, window: int, auto_defer_after: float):
+        self.window = window
+        self.auto_defer_after = auto_defer_after
+        self.commands: Dict[str, _CommandStat] = {}
+
+    def start(self, interaction: discord.Interaction):
+        trace = CommandTrace(interaction.command.qualified_name if interaction.command else 'unknown')
+        interaction.extras['trace'] = trace
+        _current_trace.set(trace)
+
+        ephemeral = interaction.command.extras.get('ephemeral') if interaction.command else None
+        if ephemeral is None:
+            return
+        age = (datetime.now(timezone.utc) - interaction.created_at).total_seconds()
+        delay = min(max(self.auto_defer_after - age, 0), self.auto_defer_after)
+        trace.watchdog = asyncio.create_task(self._defer_after(interaction, trace, delay, ephemeral))
+
+    async def _defer_after(self, interaction: discord.Interaction, trace: CommandTrace, delay: float, ephemeral: bool):
+        await asyncio.sleep(delay)
+        if interaction.response.is_done():
+            return
+        try:
+            await interaction.response.defer(ephemeral=ephemeral, thinking=True)
+        except (discord.InteractionResponded, discord.HTTPException):
+            return  # The command replied first
+        trace.auto_deferred = True
+        logger.info(f'Auto-deferred /{trace.name} after {time.perf_counter() - trace.started:.2f}s.')
+
+    def finish(self, interaction: discord.Interaction, failed: bool = False):
+        trace = interaction.extras.pop('trace', None)
+        if trace is None:
+            return
+        if trace.watchdog:
+            trace.watchdog.cancel()
+        duration = time.perf_counter() - trace.started
+        stat = self.commands.get(trace.name)
+        if stat is None:
+            stat = self.commands[trace.name] = _CommandStat(self.window)
+        stat.count += 1
+        stat.errors += failed
+        stat.auto_defers += trace.auto_deferred
+        stat.durations.append(duration)
+        stat.spans.update(trace.spans)
+        stat.slowest = max(stat.slowest, duration)
+
+    def summary(self, limit: int = 10) -> List[dict]:
+        """The slowest commands by 95th percentile over their recent calls, in milliseconds."""
+        rows = []
+        for name, stat in self.commands.items():
+            recent = sorted(stat.durations)
+            rows.append({
+                "command": name,
+                "calls": stat.count,
+                "errors": stat.errors,
+                "auto_defers": stat.auto_defers,
+                "p50_ms": round(recent[len(recent) // 2] * 1000, 1),
+                "p95_ms": round(recent[int(0.95 * (len(recent) - 1))] * 1000, 1),
+                "max_ms": round(stat.slowest * 1000, 1),
+                # Average time per call in each span, over every call so far
+                **{f"{kind}_ms": round(stat.spans[kind] / stat.count * 1000, 1) for kind in SPAN_KINDS},
+            })
+        rows.sort(key=lambda row: row["p95_ms"], reverse=True)
+        return rows[:limit]
+
+
+# Singleton instance of the app command tracer
+command_stats = CommandStats(COMMAND_STATS_WINDOW, COMMAND_AUTO_DEFER_SECONDS)